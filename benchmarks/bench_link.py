@@ -0,0 +1,134 @@
+"""
+Throughput and latency of LightifyLink against the local GatewaySimulator.
+
+Reports discovery time of LightifyLink() and update(), commands/sec with p50/p99 latency of every set_* path and
+of batches, and memory per discovered device.
+
+    python benchmarks/bench_link.py --devices 1000 --zones 20 --latency 0.002 --window 8 --threads 8
+"""
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyLink import LightifyLink
+import argparse
+import gc
+import threading
+import time
+import tracemalloc
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, count, elapsed, samples):
+    print("{:<24}{:>12.0f}{:>12.3f}{:>12.3f}".format(
+        name, count / elapsed, percentile(samples, 0.50) * 1000, percentile(samples, 0.99) * 1000))
+
+
+def bench_discovery(address, port, window, rounds):
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        link = LightifyLink(address, port, window=window)
+        samples.append(time.perf_counter() - start)
+        link.close()
+    print("{:<24}{:>12.3f}{:>12.3f}".format('LightifyLink()', percentile(samples, 0.5) * 1000,
+                                            max(samples) * 1000))
+    link = LightifyLink(address, port, window=window)
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        link.update()
+        samples.append(time.perf_counter() - start)
+    print("{:<24}{:>12.3f}{:>12.3f}".format('update()', percentile(samples, 0.5) * 1000, max(samples) * 1000))
+    return link
+
+
+def bench_commands(link, commands, threads):
+    devices = list(link.get_devices().values())
+    paths = [
+        ('set_status', lambda d, i: link.set_status(d, i % 2 == 0)),
+        ('set_luminance', lambda d, i: link.set_luminance(d, 0, i % 100 + 1)),
+        ('set_rgb', lambda d, i: link.set_rgb(d, i % 256, 0, 255 - i % 256, 0)),
+        ('set_temperature', lambda d, i: link.set_temperature(d, 2700 + i % 3800, 0)),
+    ]
+    for name, path in paths:
+        samples = []
+
+        def worker(offset):
+            for i in range(offset, commands, threads):
+                start = time.perf_counter()
+                path(devices[i % len(devices)], i)
+                samples.append(time.perf_counter() - start)
+
+        workers = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        report(name, commands, time.perf_counter() - start, samples)
+
+    samples = []
+    size = min(len(devices), 50)
+    start = time.perf_counter()
+    for i in range(0, commands, size):
+        begin = time.perf_counter()
+        with link.batch() as batch:
+            for j in range(size):
+                batch.set_luminance(devices[(i + j) % len(devices)], 0, j % 100 + 1)
+        samples.append(time.perf_counter() - begin)
+    report('batch({})'.format(size), commands, time.perf_counter() - start, samples)
+
+
+def bench_memory(address, port, window):
+    gc.collect()
+    tracemalloc.start()
+    link = LightifyLink(address, port, window=window)
+    devices = link.get_devices()
+    gc.collect()
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<24}{:>12.0f}{:>12.0f}".format('bytes/device', current / max(1, len(devices)),
+                                            peak / max(1, len(devices))))
+    link.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--zones', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every reply')
+    parser.add_argument('--jitter', type=float, default=0.0, help='maximum random seconds added to latency')
+    parser.add_argument('--fragment', type=int, default=None, help='split replies into pieces of this many bytes')
+    parser.add_argument('--window', type=int, default=1, help='requests in flight, 1 disables pipelining')
+    parser.add_argument('--threads', type=int, default=1, help='threads issuing commands concurrently')
+    parser.add_argument('--commands', type=int, default=2000, help='commands per set_* path')
+    parser.add_argument('--rounds', type=int, default=5, help='discovery rounds')
+    parser.add_argument('--metrics', action='store_true', help='enable link metrics while sending commands')
+    args = parser.parse_args()
+
+    with GatewaySimulator(args.devices, args.zones, args.latency, args.jitter, args.fragment) as simulator:
+        (address, port) = simulator.address
+        print("{} devices, {} zones, latency {}s, jitter {}s, window {}, threads {}".format(
+            args.devices, args.zones, args.latency, args.jitter, args.window, args.threads))
+        print("{:<24}{:>12}{:>12}".format('discovery', 'p50 ms', 'max ms'))
+        link = bench_discovery(address, port, args.window, args.rounds)
+        print("{:<24}{:>12}{:>12}{:>12}".format('command', 'cmd/s', 'p50 ms', 'p99 ms'))
+        if args.metrics:
+            link.enable_metrics()
+        bench_commands(link, args.commands, args.threads)
+        if args.metrics:
+            snapshot = link.get_metrics().snapshot()
+            print("{:<24}{:>12}{:>12}{:>12}".format('lock wait', 'count', 'p50 ms', 'p99 ms'))
+            wait = snapshot['lock_wait']
+            print("{:<24}{:>12}{:>12.3f}{:>12.3f}".format('', wait['count'], (wait['p50'] or 0) * 1000,
+                                                          (wait['p99'] or 0) * 1000))
+            print("{:<24}{:>12}{:>12}".format('bytes', snapshot['bytes_sent'], snapshot['bytes_received']))
+        link.close()
+        print("{:<24}{:>12}{:>12}".format('memory', 'current', 'peak'))
+        bench_memory(address, port, args.window)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Packets/sec of PacketBuilder before and after the move to precompiled PacketEncoder layouts.
+
+    python benchmarks/bench_packet_encoder.py [iterations]
+"""
+from lightifypy.Command import Command
+from lightifypy.Errors import LightifyException
+from lightifypy.LightifyLight import LightifyLight
+from lightifypy.PacketBuilder import PacketBuilder
+from lightifypy.PacketEncoder import PacketEncoder
+from lightifypy.StateStore import StateStore
+import struct
+import sys
+import timeit
+
+
+class LegacyPacketBuilder(object):
+    """
+    PacketBuilder as it was before PacketEncoder, kept as the baseline of this benchmark
+    """
+    def __init__(self, lightify_link):
+        self.__lightify_link = lightify_link
+        self.__luminary = None
+        self.__command = None
+        self.__data = bytes()
+        self.__switching = -1
+        self.__rgb = None
+        self.__luminance = None
+        self.__temperature = None
+        self.__millis = 0
+        self.__seq = 1
+        self.__buffer = bytes()
+
+    def with_(self, luminary):
+        self.__luminary = luminary
+        return self
+
+    def on(self, command):
+        self.__command = command
+        return self
+
+    def switching(self, switching):
+        self.__switching = switching
+        return self
+
+    def rgb(self, r, g, b):
+        self.__rgb = [r, g, b]
+        return self
+
+    def luminance(self, luminance):
+        self.__luminance = luminance
+        return self
+
+    def temperature(self, temperature):
+        self.__temperature = temperature
+        return self
+
+    def millis(self, millis):
+        self.__millis = millis
+        return self
+
+    def data(self, data):
+        self.__data = data
+        return self
+
+    def build(self):
+        self.validate()
+        packet_size = self.calculate_packet_size()
+
+        request_id = self.__lightify_link.next_seq()
+        self.put_header(packet_size, request_id)
+        if not self.__luminary:
+            self.put_global()
+        else:
+            self.put_addressable()
+        while len(self.__buffer) < packet_size+2:
+            self.__buffer += struct.pack('<B', 0)
+        return self.__buffer
+
+    def validate(self):
+        command = self.__command
+        if not command:
+            assert LightifyException('command must be set')
+
+        if command.is_broadcast():
+            if not self.__luminary:
+                assert LightifyException("luminary must be set for non-broadcast commands")
+
+        if command == Command.LIGHT_COLOR and not self.__rgb:
+            assert LightifyException("rgb not set for rgb command")
+
+        if command == Command.LIGHT_LUMINANCE and not self.__luminance:
+            assert LightifyException("luminance not set for luminance command")
+
+        if command == Command.LIGHT_TEMPERATURE and not self.__temperature:
+            assert LightifyException("temperature not set for temperature command")
+
+    def calculate_packet_size(self):
+        size = 6 if self.__command.is_broadcast() else 14
+        if self.__luminary:
+            size += 8
+        if self.__switching != -1:
+            size += 1
+        if self.__rgb:
+            size += 6
+        if self.__luminance:
+            size += 3
+        if self.__temperature:
+            size += 4
+        if self.__data:
+            size += len(self.__data)
+        return size
+
+    def put_header(self, packet_size, request_id):
+        broadcast_or_unicast = 0x02 if self.__command.is_broadcast() else self.__luminary.type_flag
+        self.__buffer += struct.pack('<H', packet_size)
+        self.__buffer += struct.pack('<B', broadcast_or_unicast)
+        self.__buffer += struct.pack('<B', self.__command.get_id())
+        self.__buffer += struct.pack('<I', request_id)
+
+    def put_global(self):
+        if self.__command == Command.STATUS_ALL:
+            self.__buffer += self.__data
+
+    def put_addressable(self):
+        self.__buffer += self.__luminary.address()
+        if self.__command == Command.LIGHT_SWITCH:
+            self.__buffer += struct.pack('<B', 0x01 if self.__switching else 0x00)
+        elif self.__command == Command.LIGHT_TEMPERATURE:
+            self.__buffer += struct.pack('<H', self.__temperature if self.__temperature else 0)
+        elif self.__command == Command.LIGHT_LUMINANCE:
+            self.__buffer += struct.pack('<B', self.__luminance if self.__luminance else 0)
+            self.__buffer += struct.pack('<H', self.__millis)
+        elif self.__command == Command.LIGHT_COLOR:
+            r = self.__rgb[0]
+            g = self.__rgb[1]
+            b = self.__rgb[2]
+            self.__buffer += struct.pack('<3B', r, g, b)
+            self.__buffer += struct.pack('<B', 0xff)
+            self.__buffer += struct.pack('<H', self.__millis)
+
+
+class _Link(object):
+    logger = None
+
+    def __init__(self):
+        self.seq = 1
+        self.store = StateStore()
+
+    def get_state_store(self):
+        return self.store
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+
+CASES = [
+    (Command.STATUS_ALL, lambda b, light: b.on(Command.STATUS_ALL).data(b'\x01'), dict(data=b'\x01')),
+    (Command.ZONE_LIST, lambda b, light: b.on(Command.ZONE_LIST), dict()),
+    (Command.STATUS_SINGLE, lambda b, light: b.on(Command.STATUS_SINGLE).with_(light), dict(addressed=True)),
+    (Command.ZONE_INFO, lambda b, light: b.on(Command.ZONE_INFO).with_(light), dict(addressed=True)),
+    (Command.LIGHT_SWITCH, lambda b, light: b.on(Command.LIGHT_SWITCH).with_(light).switching(True),
+     dict(addressed=True, switching=True)),
+    (Command.LIGHT_LUMINANCE, lambda b, light: b.on(Command.LIGHT_LUMINANCE).with_(light).luminance(40).millis(300),
+     dict(addressed=True, luminance=40, millis=300)),
+    (Command.LIGHT_TEMPERATURE, lambda b, light: b.on(Command.LIGHT_TEMPERATURE).with_(light).temperature(2700),
+     dict(addressed=True, temperature=2700)),
+    (Command.LIGHT_COLOR, lambda b, light: b.on(Command.LIGHT_COLOR).with_(light).rgb(255, 128, 0).millis(300),
+     dict(addressed=True, rgb=(255, 128, 0), millis=300)),
+]
+
+
+def main(iterations=20000):
+    link = _Link()
+    light = LightifyLight(link, 'bench', [], 0x1122334455667788)
+    buffer = bytearray(64)
+    columns = ('command', 'legacy pkt/s', 'builder pkt/s', 'encode pkt/s', 'into pkt/s', 'speedup')
+    print("{:<20}{:>14}{:>15}{:>14}{:>14}{:>9}".format(*columns))
+    for command, case, fields in CASES:
+        kwargs = dict(fields)
+        if kwargs.pop('addressed', False):
+            kwargs['luminary'] = light
+        legacy = timeit.timeit(lambda: case(LegacyPacketBuilder(link), light).build(), number=iterations)
+        builder = timeit.timeit(lambda: case(PacketBuilder(link), light).build(), number=iterations)
+        encode = timeit.timeit(lambda: PacketEncoder.encode(link.next_seq(), command, **kwargs), number=iterations)
+        into = timeit.timeit(lambda: PacketEncoder.encode_into(buffer, 0, link.next_seq(), command, **kwargs),
+                             number=iterations)
+        print("{:<20}{:>14.0f}{:>15.0f}{:>14.0f}{:>14.0f}{:>8.2f}x".format(
+            command.name, iterations / legacy, iterations / builder, iterations / encode, iterations / into,
+            legacy / encode))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,78 @@
+"""
+Parsing and state update cost of LightifyLink on recorded traffic.
+
+Replays a capture written with LightifyLink.start_capture() through the real decoders at full speed: discovery
+by LightifyLink() followed by every update() that was recorded. Without --capture, one is recorded from the local
+GatewaySimulator first.
+
+    python benchmarks/bench_replay.py --capture site.cap --rounds 20
+    python benchmarks/bench_replay.py --devices 1000 --zones 20 --updates 10
+"""
+from lightifypy.Command import Command
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyLink import LightifyLink
+from lightifypy.WireCapture import CaptureReader, CaptureWriter, ReplayTransport
+import argparse
+import os
+import tempfile
+import time
+
+
+def record(path, devices, zones, updates):
+    with GatewaySimulator(devices, zones) as simulator:
+        (address, port) = simulator.address
+        link = LightifyLink(address, port, capture=path)
+        for i in range(updates):
+            link.update()
+        link.close()
+
+
+def count_updates(path):
+    reader = CaptureReader(path)
+    searches = sum(1 for record in reader
+                   if record.direction == CaptureWriter.SENT and record.command == Command.STATUS_ALL.get_id())
+    reader.close()
+    return max(0, searches - 1)
+
+
+def replay(path, updates):
+    transport = ReplayTransport(path)
+    start = time.perf_counter()
+    link = LightifyLink(None, transport=transport)
+    discovered = time.perf_counter()
+    for i in range(updates):
+        link.update()
+    finished = time.perf_counter()
+    stats = transport.stats()
+    link.close()
+    return discovered - start, finished - discovered, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capture', help='capture file, recorded from the simulator when missing')
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--zones', type=int, default=10)
+    parser.add_argument('--updates', type=int, default=5, help='update() calls recorded after the discovery')
+    parser.add_argument('--rounds', type=int, default=10, help='replays of the capture')
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        (handle, path) = tempfile.mkstemp(suffix='.cap')
+        os.close(handle)
+        os.unlink(path)
+        record(path, args.devices, args.zones, args.updates)
+    updates = count_updates(path)
+    print("{}: {} bytes, {} updates after discovery".format(path, os.path.getsize(path), updates))
+    print("{:<24}{:>12}{:>12}{:>12}".format('replay', 'discover ms', 'update ms', 'frames'))
+    for i in range(args.rounds):
+        (discovery, update, stats) = replay(path, updates)
+        print("{:<24}{:>12.3f}{:>12.3f}{:>12}".format(i, discovery * 1000, update * 1000 / max(1, updates),
+                                                      stats['frames']))
+    if args.capture is None:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+from lightifypy.Command import Command
+from lightifypy.PacketBuilder import PacketBuilder
+from lightifypy.PacketParser import PacketParser
+from lightifypy.StateStore import StateStore
+from lightifypy.LightifyZone import LightifyZone
+from lightifypy.LightifyLight import LightifyLight
+from lightifypy.DeviceType import DeviceType
+from lightifypy.Errors import LightifyException
+import asyncio
+import logging
+import struct
+
+
+class AsyncLightifyLink:
+    """
+    Lightify connector built on asyncio streams. Awaitable counterpart of LightifyLink.LightifyLink
+    """
+    def __init__(self, address, port=4000, window=8, timeout=None):
+        """
+        Nothing is sent until connect() is awaited.
+        :param address(str): IP Address of Lightify gateway
+        :param port(int): TCP port of Lightify gateway (default 4000)
+        :param window(int): Maximum number of requests in flight on the connection (default 8)
+        :param timeout(float): Seconds to wait for a reply, None waits forever
+        """
+        self.__address = address
+        self.__port = port
+        self.__zones = {}
+        self.__devices = {}
+        self.__state_store = StateStore()
+        self.__seq = 1
+        self.__reader = None
+        self.__writer = None
+        self.__read_task = None
+        self.__pending = {}
+        self.__window = asyncio.Semaphore(window)
+        self.__timeout = timeout
+        # reason requests fail right away, None while the connection is up
+        self.__lost = 'Not connected'
+        self.__logger = logging.getLogger('lightfypy')
+        self.__logger.addHandler(logging.NullHandler())
+        self.logger = self.__logger
+
+    @classmethod
+    async def create(cls, address, port=4000, window=8, timeout=None):
+        """
+        Connect to the gateway and discover all devices and zones
+        :return AsyncLightifyLink:
+        """
+        link = cls(address, port, window, timeout)
+        await link.connect()
+        return link
+
+    async def connect(self):
+        """
+        Open connection to the gateway and run discovery
+        """
+        self.__reader, self.__writer = await asyncio.open_connection(self.__address, self.__port)
+        self.__lost = None
+        self.__read_task = asyncio.ensure_future(self.__read_loop())
+        await self.update()
+
+    async def close(self):
+        self.__lost = 'Connection closed'
+        self.__fail_pending(self.__lost)
+        if self.__read_task:
+            self.__read_task.cancel()
+            self.__read_task = None
+        if self.__writer:
+            self.__writer.close()
+            await self.__writer.wait_closed()
+            self.__writer = None
+            self.__reader = None
+
+    def next_seq(self):
+        """
+        Generation of new sequence for packet ID
+        :return int:
+        """
+        self.__seq = (self.__seq + 1) & 0xFFFFFFFF
+        return self.__seq
+
+    async def __read_packet(self):
+        """
+        Read one length-prefixed packet from the stream
+        :return: bytes readed from stream
+        """
+        (size,) = struct.unpack('<H', await self.__reader.readexactly(2))
+        return await self.__reader.readexactly(size)
+
+    async def __read_loop(self):
+        """
+        Route every reply to the request waiting for its request id
+        """
+        reason = 'Connection closed'
+        try:
+            while True:
+                buff = await self.__read_packet()
+                request_id = PacketParser.reply_request_id(buff)
+                future = self.__pending.pop(request_id, None)
+                if future is None:
+                    self.__logger.warning("Dropping reply with unknown request id {}".format(request_id))
+                elif not future.done():
+                    future.set_result(buff)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            reason = 'Connection lost: {}'.format(e)
+        except Exception as e:
+            self.__logger.exception("Reading replies failed")
+            reason = 'Reading replies failed: {}'.format(e)
+        finally:
+            # however the loop ends, nothing will resolve the requests waiting for replies any more
+            self.__fail_pending(reason)
+
+    def __fail_pending(self, reason):
+        """
+        Mark the connection as unusable and fail all requests waiting for a reply
+        """
+        if self.__lost is None:
+            self.__lost = reason
+        pending, self.__pending = self.__pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(LightifyException(reason))
+
+    async def __do_read(self, packet, command):
+        """
+        Send packet and wait for the reply carrying the same request id. Up to `window` requests share the
+        connection at once
+        :param packet: Bytes to be sent
+        :param command: Command to be send. See Command.Command class to get more info
+        :return: bytes of received data
+        """
+        request_id = PacketParser.packet_request_id(packet)
+        async with self.__window:
+            if self.__lost is not None:
+                raise LightifyException(self.__lost)
+            future = asyncio.get_event_loop().create_future()
+            self.__pending[request_id] = future
+            try:
+                self.__writer.write(packet)
+                await self.__writer.drain()
+                buff = await asyncio.wait_for(future, self.__timeout)
+            except asyncio.TimeoutError:
+                raise LightifyException('No reply within {}s, command: {}'.format(self.__timeout, command.name))
+            except ConnectionError as e:
+                raise LightifyException('Connection lost: {}'.format(e))
+            finally:
+                self.__pending.pop(request_id, None)
+        error = PacketParser.parse_header(packet, buff, command)
+        if error != 0x00:
+            self.__logger.error("Packet content, sent: {}, received: {}".format(packet.upper(), buff.upper()))
+            self.__logger.error("Error code: 0x{:02x}, command: {}".format(error, command.name))
+            raise LightifyException('Error Stacktrace')
+        return buff
+
+    async def __perform_search(self):
+        """
+        Search all devices attached to the Lightify network
+        """
+        command = Command.STATUS_ALL
+        packet = PacketBuilder(self).on(command).data(struct.pack('<B', 0x01)).build()
+        data = await self.__do_read(packet, command)
+        for (device_address, dev_type, zone_id, status, lum, temp, r, g, b,
+             name) in PacketParser.parse_status_all(data):
+            device_type = DeviceType.find_by_type_id(dev_type)
+            if device_type != DeviceType.Bulb:
+                self.__logger.warning("Found unsupported Lightify device, type id: {}. Skipping.".format(dev_type))
+                continue
+            light = LightifyLight(self, name, PacketParser.parse_capabilities(dev_type), device_address)
+            light.update_luminance(lum)
+            light.update_powered(status)
+            light.update_rgb(r, g, b)
+            light.update_temperature(temp)
+            self.__devices[device_address] = light
+
+    async def __fill_zone_list(self):
+        """
+        Filling zones list. ZONE_INFO requests of all zones are issued concurrently
+        """
+        command = Command.ZONE_LIST
+        packet = PacketBuilder(self).on(command).build()
+        buffer = await self.__do_read(packet, command)
+        zones = []
+        for (zone_id, name) in PacketParser.parse_zone_list(buffer):
+            zone = LightifyZone(self, name, zone_id)
+            self.__zones["zone::{}".format(zone_id)] = zone
+            zones.append(zone)
+        await asyncio.gather(*[self.__handle_zone_info(zone) for zone in zones])
+
+    async def __handle_zone_info(self, zone):
+        command = Command.ZONE_INFO
+        packet = PacketBuilder(self).on(command).with_(zone).build()
+        data = await self.__do_read(packet, command)
+        (zone_id, name, addresses) = PacketParser.parse_zone_info(data)
+        self.__logger.debug("Idx %d: '%s' %d", zone_id, name, len(addresses))
+        for addr in addresses:
+            # zones may contain devices other than bulbs, which were skipped by the search
+            light = self.__devices.get(addr)
+            if light is not None:
+                zone.add_device(light)
+
+    def get_state_store(self):
+        """
+        Store holding power, luminance, temperature and rgb of all luminaries of this link
+        :return StateStore.StateStore:
+        """
+        return self.__state_store
+
+    def get_zones(self):
+        """
+        Get all zones
+        :return: dict of zones
+        """
+        return self.__zones
+
+    def get_devices(self):
+        """
+        Get all found devices in network
+        :return: dict of devices
+        """
+        return self.__devices
+
+    async def update(self):
+        for luminary in list(self.__zones.values()) + list(self.__devices.values()):
+            luminary.release()
+        self.__devices = {}
+        self.__zones = {}
+        await self.__perform_search()
+        await self.__fill_zone_list()
+
+    async def update_status(self, target):
+        command = Command.STATUS_SINGLE
+        packet = PacketBuilder(self).on(command).with_(target).build()
+        buffer = await self.__do_read(packet, command)
+        (on, lum, temp, red, green, blue) = PacketParser.parse_status_single(buffer)
+        target.update_powered(on)
+        target.update_luminance(lum)
+        target.update_temperature(temp)
+        target.update_rgb(red, green, blue)
+
+    async def set_status(self, target, powered):
+        if isinstance(target, LightifyZone) and not powered:
+            await self.set_luminance(target, 0, 0)
+        command = Command.LIGHT_SWITCH
+        packet = PacketBuilder(self).on(command).with_(target).switching(powered).build()
+        await self.__do_read(packet, command)
+        target.update_powered(powered)
+
+    async def set_luminance(self, target, millis, lums):
+        command = Command.LIGHT_LUMINANCE
+        packet = PacketBuilder(self).on(command).with_(target).luminance(lums).millis(millis).build()
+        await self.__do_read(packet, command)
+        target.update_luminance(lums)
+        target.update_powered(True)
+
+    async def set_rgb(self, target, r, g, b, millis):
+        command = Command.LIGHT_COLOR
+        packet = PacketBuilder(self).on(command).with_(target).rgb(r, g, b).millis(millis).build()
+        await self.__do_read(packet, command)
+        target.update_rgb(r, g, b)
+        target.update_powered(True)
+
+    async def set_temperature(self, target, temperature, millis):
+        command = Command.LIGHT_TEMPERATURE
+        packet = PacketBuilder(self).on(command).with_(target).temperature(temperature).millis(millis).build()
+        await self.__do_read(packet, command)
+        target.update_temperature(temperature)
+        target.update_powered(True)
@@ -1,15 +1,15 @@
-from enum import Enum
+from enum import IntFlag
 
 
-class Capability(Enum):
+class Capability(IntFlag):
     """
-    Enum of Lightify capabilities
+    Flags of Lightify capabilities. TunableWhite, PureWhite and RGB have the bits of the type byte of a bulb
     """
-    Dimming = 0
-    TunableWhite = 1
-    PureWhite = 2
-    RGB = 3
-    Unk2 = 4
-    MotionSensor = 5
-    Switching = 6
-    Unk3 = 7
+    Dimming = 1 << 0
+    TunableWhite = 1 << 1
+    PureWhite = 1 << 2
+    RGB = 1 << 3
+    Unk2 = 1 << 4
+    MotionSensor = 1 << 5
+    Switching = 1 << 6
+    Unk3 = 1 << 7
@@ -0,0 +1,282 @@
+from lightifypy.Capability import Capability
+import colorsys
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColorConversion(object):
+    """
+    Conversion of HSV, CIE xy and Kelvin into the r, g, b bytes and the temperature word of the protocol, for whole
+    lists of values in one call. With NumPy installed every conversion is vectorized and returns arrays, otherwise it
+    runs in pure Python and returns lists. Hue, saturation and value are in [0, 1], xy colors are normalized to full
+    brightness since luminance is a command of its own
+    """
+    # white temperature range in Kelvin of luminaries with RGB, and of tunable white ones without
+    RGB_TEMPERATURE_RANGE = (2000, 6500)
+    TUNABLE_WHITE_RANGE = (2700, 6500)
+
+    @staticmethod
+    def __use_numpy(use_numpy):
+        if use_numpy is None:
+            return numpy is not None
+        return use_numpy
+
+    @staticmethod
+    def temperature_range(capabilities):
+        """
+        :param capabilities: Capability.Capability flags of a luminary
+        :return: tuple of (lowest, highest) Kelvin, None if the luminary has no white temperature
+        """
+        if capabilities & Capability.RGB:
+            return ColorConversion.RGB_TEMPERATURE_RANGE
+        if capabilities & Capability.TunableWhite:
+            return ColorConversion.TUNABLE_WHITE_RANGE
+        return None
+
+    @staticmethod
+    def hsv_to_rgb(hsv, use_numpy=None):
+        """
+        :param hsv: list of (hue, saturation, value) tuples or array of shape (n, 3)
+        :param use_numpy(bool): Vectorize with NumPy, None uses it when it is installed
+        :return: list of (r, g, b) tuples, or uint8 array of shape (n, 3) with NumPy
+        """
+        if ColorConversion.__use_numpy(use_numpy):
+            values = numpy.asarray(hsv, dtype=float).reshape(-1, 3)
+            h6 = (values[:, 0] % 1.0) * 6.0
+            s = numpy.clip(values[:, 1], 0.0, 1.0)
+            v = numpy.clip(values[:, 2], 0.0, 1.0)
+            sector = numpy.floor(h6)
+            f = h6 - sector
+            sector = sector.astype(int) % 6
+            p = v * (1.0 - s)
+            q = v * (1.0 - s * f)
+            t = v * (1.0 - s * (1.0 - f))
+            rgb = numpy.stack([numpy.choose(sector, [v, q, p, p, t, v]),
+                               numpy.choose(sector, [t, v, v, q, p, p]),
+                               numpy.choose(sector, [p, p, t, v, v, q])], axis=1)
+            return numpy.rint(rgb * 255.0).astype(numpy.uint8)
+        result = []
+        for (h, s, v) in hsv:
+            (r, g, b) = colorsys.hsv_to_rgb(h % 1.0, min(max(s, 0.0), 1.0), min(max(v, 0.0), 1.0))
+            result.append((int(round(r * 255)), int(round(g * 255)), int(round(b * 255))))
+        return result
+
+    @staticmethod
+    def __gamma(c):
+        c = min(max(c, 0.0), 1.0)
+        return 12.92 * c if c <= 0.0031308 else 1.055 * c ** (1 / 2.4) - 0.055
+
+    @staticmethod
+    def __linear(c):
+        return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+    @staticmethod
+    def xy_to_rgb(xy, use_numpy=None):
+        """
+        :param xy: list of (x, y) CIE 1931 chromaticities or array of shape (n, 2)
+        :return: list of (r, g, b) tuples, or uint8 array of shape (n, 3) with NumPy. Colors outside of sRGB are
+        clipped, the brightest channel is always 255, y <= 0 gives black
+        """
+        if ColorConversion.__use_numpy(use_numpy):
+            values = numpy.asarray(xy, dtype=float).reshape(-1, 2)
+            (x, y) = (values[:, 0], values[:, 1])
+            valid = y > 0
+            y_safe = numpy.where(valid, y, 1.0)
+            big_x = x / y_safe
+            big_z = (1.0 - x - y) / y_safe
+            linear = numpy.stack([big_x * 3.2406 - 1.5372 - big_z * 0.4986,
+                                  -big_x * 0.9689 + 1.8758 + big_z * 0.0415,
+                                  big_x * 0.0557 - 0.2040 + big_z * 1.0570], axis=1)
+            linear = numpy.clip(linear, 0.0, None)
+            peak = linear.max(axis=1, keepdims=True)
+            linear = linear / numpy.where(peak > 0, peak, 1.0)
+            srgb = numpy.where(linear <= 0.0031308, 12.92 * linear,
+                               1.055 * numpy.power(linear, 1 / 2.4) - 0.055)
+            rgb = numpy.rint(numpy.clip(srgb, 0.0, 1.0) * 255.0).astype(numpy.uint8)
+            rgb[~valid] = 0
+            return rgb
+        result = []
+        for (x, y) in xy:
+            if y <= 0:
+                result.append((0, 0, 0))
+                continue
+            (big_x, big_z) = (x / y, (1.0 - x - y) / y)
+            linear = [max(0.0, big_x * 3.2406 - 1.5372 - big_z * 0.4986),
+                      max(0.0, -big_x * 0.9689 + 1.8758 + big_z * 0.0415),
+                      max(0.0, big_x * 0.0557 - 0.2040 + big_z * 1.0570)]
+            peak = max(linear) or 1.0
+            result.append(tuple(int(round(ColorConversion.__gamma(c / peak) * 255)) for c in linear))
+        return result
+
+    @staticmethod
+    def kelvin_to_rgb(kelvin, use_numpy=None):
+        """
+        Approximation of the color of a black body, for RGB luminaries without tunable white
+        :param kelvin: list of temperatures
+        :return: list of (r, g, b) tuples, or uint8 array of shape (n, 3) with NumPy
+        """
+        if ColorConversion.__use_numpy(use_numpy):
+            t = numpy.clip(numpy.asarray(kelvin, dtype=float).reshape(-1), 1000.0, 40000.0) / 100.0
+            # both branches of numpy.where are evaluated, the arguments are kept in range for the unused one
+            above = numpy.maximum(t - 60.0, 1e-6)
+            r = numpy.where(t <= 66.0, 255.0, 329.698727446 * numpy.power(above, -0.1332047592))
+            g = numpy.where(t <= 66.0, 99.4708025861 * numpy.log(t) - 161.1195681661,
+                            288.1221695283 * numpy.power(above, -0.0755148492))
+            b = numpy.where(t >= 66.0, 255.0,
+                            numpy.where(t <= 19.0, 0.0,
+                                        138.5177312231 * numpy.log(numpy.maximum(t - 10.0, 1e-6)) - 305.0447927307))
+            rgb = numpy.stack([r, g, b], axis=1)
+            return numpy.rint(numpy.clip(rgb, 0.0, 255.0)).astype(numpy.uint8)
+        result = []
+        for k in kelvin:
+            t = min(max(float(k), 1000.0), 40000.0) / 100.0
+            if t <= 66.0:
+                (r, g) = (255.0, 99.4708025861 * math.log(t) - 161.1195681661)
+            else:
+                (r, g) = (329.698727446 * (t - 60.0) ** -0.1332047592, 288.1221695283 * (t - 60.0) ** -0.0755148492)
+            if t >= 66.0:
+                b = 255.0
+            elif t <= 19.0:
+                b = 0.0
+            else:
+                b = 138.5177312231 * math.log(t - 10.0) - 305.0447927307
+            result.append(tuple(int(round(min(max(c, 0.0), 255.0))) for c in (r, g, b)))
+        return result
+
+    @staticmethod
+    def rgb_to_kelvin(rgb, use_numpy=None):
+        """
+        Correlated color temperature of colors (McCamy), for tunable white luminaries without RGB. Colors far from
+        white give temperatures outside of any luminary's range and have to be clamped
+        :param rgb: list of (r, g, b) tuples or array of shape (n, 3)
+        :return: list of Kelvin, or array with NumPy. Black counts as 6500
+        """
+        if ColorConversion.__use_numpy(use_numpy):
+            c = numpy.asarray(rgb, dtype=float).reshape(-1, 3) / 255.0
+            linear = numpy.where(c <= 0.04045, c / 12.92, numpy.power((c + 0.055) / 1.055, 2.4))
+            xyz = linear.dot(numpy.array([[0.4124, 0.2126, 0.0193],
+                                          [0.3576, 0.7152, 0.1192],
+                                          [0.1805, 0.0722, 0.9505]]))
+            total = xyz.sum(axis=1)
+            black = total <= 0
+            total = numpy.where(black, 1.0, total)
+            (x, y) = (xyz[:, 0] / total, xyz[:, 1] / total)
+            denominator = 0.1858 - y
+            n = (x - 0.3320) / numpy.where(denominator == 0, 1e-9, denominator)
+            cct = 449.0 * n ** 3 + 3525.0 * n ** 2 + 6823.3 * n + 5520.33
+            return numpy.where(black, 6500.0, cct)
+        result = []
+        for (r, g, b) in rgb:
+            (r, g, b) = (ColorConversion.__linear(r / 255.0), ColorConversion.__linear(g / 255.0),
+                         ColorConversion.__linear(b / 255.0))
+            big_x = 0.4124 * r + 0.3576 * g + 0.1805 * b
+            big_y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+            total = big_x + big_y + 0.0193 * r + 0.1192 * g + 0.9505 * b
+            if total <= 0:
+                result.append(6500.0)
+                continue
+            (x, y) = (big_x / total, big_y / total)
+            n = (x - 0.3320) / ((0.1858 - y) or 1e-9)
+            result.append(449.0 * n ** 3 + 3525.0 * n ** 2 + 6823.3 * n + 5520.33)
+        return result
+
+    @staticmethod
+    def convert(targets, hsv=None, xy=None, kelvin=None, use_numpy=None):
+        """
+        Protocol values for every target, according to its capabilities: colors become rgb for RGB luminaries and
+        the nearest white temperature for tunable white ones, temperatures become a temperature clamped to the
+        range of the luminary, or rgb for RGB luminaries without tunable white. Luminaries supporting neither are
+        skipped. Exactly one of hsv, xy and kelvin is given, with one value per target
+        :param targets: list of LightifyLight or LightifyZone
+        :return ColorBatch:
+        """
+        if sum(values is not None for values in (hsv, xy, kelvin)) != 1:
+            raise ValueError('exactly one of hsv, xy and kelvin is needed')
+        values = next(values for values in (hsv, xy, kelvin) if values is not None)
+        if len(values) != len(targets):
+            raise ValueError('{} values for {} targets'.format(len(values), len(targets)))
+        vectorized = ColorConversion.__use_numpy(use_numpy)
+        capabilities = [target.get_capabilities() for target in targets]
+        ranges = [ColorConversion.temperature_range(flags) for flags in capabilities]
+        if kelvin is not None:
+            rgb = None
+            temperature = kelvin
+            if any(flags & Capability.RGB and not flags & Capability.TunableWhite for flags in capabilities):
+                rgb = ColorConversion.kelvin_to_rgb(kelvin, vectorized)
+            kinds = ['temperature' if flags & Capability.TunableWhite else 'rgb' if flags & Capability.RGB else None
+                     for flags in capabilities]
+        else:
+            if hsv is not None:
+                rgb = ColorConversion.hsv_to_rgb(hsv, vectorized)
+            else:
+                rgb = ColorConversion.xy_to_rgb(xy, vectorized)
+            temperature = None
+            if any(not flags & Capability.RGB and flags & Capability.TunableWhite for flags in capabilities):
+                temperature = ColorConversion.rgb_to_kelvin(rgb, vectorized)
+            kinds = ['rgb' if flags & Capability.RGB else 'temperature' if flags & Capability.TunableWhite else None
+                     for flags in capabilities]
+        if temperature is not None:
+            lowest = [limits[0] if limits else 0 for limits in ranges]
+            highest = [limits[1] if limits else 0 for limits in ranges]
+            if vectorized:
+                temperature = numpy.rint(numpy.clip(numpy.asarray(temperature, dtype=float).reshape(-1),
+                                                    lowest, highest)).astype(numpy.uint16)
+            else:
+                temperature = [int(round(min(max(k, low), high)))
+                               for k, low, high in zip(temperature, lowest, highest)]
+        return ColorBatch(targets, kinds, rgb, temperature)
+
+
+class ColorBatch(object):
+    """
+    Converted colors of a list of targets, see ColorConversion.convert()
+    """
+    def __init__(self, targets, kinds, rgb, temperature):
+        """
+        :param kinds: per target 'rgb', 'temperature' or None for a target which is skipped
+        :param rgb: (r, g, b) per target, may be None if no target gets rgb
+        :param temperature: Kelvin per target, may be None if no target gets a temperature
+        """
+        self.targets = targets
+        self.kinds = kinds
+        self.rgb = rgb
+        self.temperature = temperature
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __iter__(self):
+        """
+        :return: iterator of (target, 'rgb', (r, g, b)) or (target, 'temperature', kelvin), skipped targets left out
+        """
+        for i, target in enumerate(self.targets):
+            kind = self.kinds[i]
+            if kind == 'rgb':
+                (r, g, b) = self.rgb[i]
+                yield target, kind, (int(r), int(g), int(b))
+            elif kind == 'temperature':
+                yield target, kind, int(self.temperature[i])
+
+    def skipped(self):
+        """
+        :return list: targets supporting neither rgb nor a white temperature
+        """
+        return [target for target, kind in zip(self.targets, self.kinds) if kind is None]
+
+    def apply(self, sender, millis=0):
+        """
+        :param sender: LightifyLink, LightifyBatch or anything else with set_rgb() and set_temperature()
+        :return int: number of commands handed to sender
+        """
+        count = 0
+        for target, kind, value in self:
+            if kind == 'rgb':
+                sender.set_rgb(target, value[0], value[1], value[2], millis)
+            else:
+                sender.set_temperature(target, value, millis)
+            count += 1
+        return count
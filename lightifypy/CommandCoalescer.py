@@ -0,0 +1,125 @@
+from lightifypy.Errors import LightifyException
+from lightifypy.RateLimiter import TokenBucket
+from collections import OrderedDict
+import logging
+import socket
+import threading
+
+
+class CommandCoalescer(object):
+    """
+    Queue of pending commands keeping only the newest value per (target, command). A worker thread sends them at
+    most `rate` per second, so a flood of slider updates turns into a bounded stream of the latest values
+    """
+    def __init__(self, rate=10.0, burst=None):
+        """
+        :param rate(float): Commands per second sent to the gateway
+        :param burst(float): Commands which may be sent back to back, defaults to one second worth of commands
+        """
+        self.__bucket = TokenBucket(rate, burst)
+        self.__pending = OrderedDict()
+        self.__condition = threading.Condition()
+        self.__logger = logging.getLogger('lightfypy')
+        self.__running = True
+        self.__busy = False
+        self.submitted = 0
+        self.merged = 0
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.__thread = threading.Thread(target=self.__run, name='lightifypy-coalescer', daemon=True)
+        self.__thread.start()
+
+    @staticmethod
+    def key(target, command):
+        """
+        :return: key identifying commands which overwrite each other
+        """
+        return target.type_flag, target.address(), command
+
+    def submit(self, key, send):
+        """
+        Queue a command, replacing a pending one with the same key
+        :param key: See key()
+        :param send: Callable performing the command
+        """
+        with self.__condition:
+            self.submitted += 1
+            if key in self.__pending:
+                self.merged += 1
+                del self.__pending[key]
+            self.__pending[key] = send
+            self.__condition.notify_all()
+
+    def depth(self):
+        """
+        :return int: number of commands waiting to be sent
+        """
+        return len(self.__pending)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while self.__running and not self.__pending:
+                    self.__condition.wait()
+                if not self.__running:
+                    return
+                self.__busy = True
+            try:
+                self.__send_next()
+            finally:
+                # reset even if sending raised, flush() waits for it
+                with self.__condition:
+                    self.__busy = False
+                    self.__condition.notify_all()
+
+    def __send_next(self):
+        self.__bucket.acquire()
+        with self.__condition:
+            if not self.__pending:
+                return
+            (key, send) = self.__pending.popitem(last=False)
+        try:
+            send()
+            self.sent += 1
+        except (LightifyException, socket.error) as e:
+            self.errors += 1
+            self.__logger.warning("Coalesced command {} failed: {}".format(key[2].name, e))
+        except Exception:
+            self.errors += 1
+            self.__logger.exception("Coalesced command {} failed".format(key[2].name))
+
+    def flush(self, timeout=None):
+        """
+        Wait until every pending command was sent
+        :return bool: False if timeout elapsed first
+        """
+        with self.__condition:
+            return self.__condition.wait_for(lambda: not self.__pending and not self.__busy, timeout)
+
+    def close(self, flush=True):
+        """
+        Stop the worker thread
+        :param flush(bool): Send pending commands first, otherwise they are discarded and counted as dropped
+        """
+        if flush:
+            self.flush()
+        with self.__condition:
+            self.__running = False
+            self.dropped += len(self.__pending)
+            self.__pending.clear()
+            self.__condition.notify_all()
+        self.__thread.join()
+
+    def stats(self):
+        """
+        :return dict: queue depth and counters of submitted, merged, sent, failed and dropped commands
+        """
+        return {
+            'depth': len(self.__pending),
+            'submitted': self.submitted,
+            'merged': self.merged,
+            'sent': self.sent,
+            'errors': self.errors,
+            'dropped': self.dropped,
+        }
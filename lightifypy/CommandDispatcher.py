@@ -0,0 +1,162 @@
+from lightifypy.Errors import LightifyException
+from concurrent.futures import Future
+from enum import IntEnum
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+
+class Priority(IntEnum):
+    # commands somebody is waiting for, e.g. switching a light
+    INTERACTIVE = 0
+    NORMAL = 1
+    # polling and discovery
+    BACKGROUND = 2
+
+
+class CommandDispatcher(object):
+    """
+    Worker threads owning the connection to the gateway. Work is taken from a priority queue, lowest Priority
+    first and in submission order within a priority. Callers get a concurrent.futures.Future, work which is
+    cancelled or older than its timeout when its turn comes is dropped without touching the gateway
+    """
+    __local = threading.local()
+
+    def __init__(self, workers=1, timeout=None):
+        """
+        :param workers(int): Number of worker threads, more than one only helps with a pipelined transport
+        :param timeout(float): Default seconds queued work may wait before it is dropped, None keeps it forever
+        """
+        self.__timeout = timeout
+        self.__heap = []
+        self.__order = itertools.count()
+        self.__condition = threading.Condition()
+        self.__running = True
+        self.__threads = []
+        self.__workers = set()
+        self.executed = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.failed = 0
+        for i in range(workers):
+            thread = threading.Thread(target=self.__run, name='lightifypy-dispatcher-{}'.format(i), daemon=True)
+            self.__threads.append(thread)
+            thread.start()
+
+    @classmethod
+    @contextlib.contextmanager
+    def priority(cls, priority):
+        """
+        Context manager setting the priority of requests made by the current thread
+        """
+        previous = getattr(cls.__local, 'priority', None)
+        cls.__local.priority = priority
+        try:
+            yield
+        finally:
+            cls.__local.priority = previous
+
+    @classmethod
+    def current_priority(cls, default=Priority.NORMAL):
+        """
+        :return Priority: priority set with priority() for the current thread, default if there is none
+        """
+        priority = getattr(cls.__local, 'priority', None)
+        return default if priority is None else priority
+
+    def is_worker(self):
+        """
+        :return bool: True if called from one of the worker threads
+        """
+        return threading.get_ident() in self.__workers
+
+    def submit(self, fn, priority=Priority.NORMAL, timeout=-1):
+        """
+        Queue fn
+        :param fn: Callable without arguments, its result or exception completes the future
+        :param timeout(float): Seconds the work may wait in the queue, -1 uses the default of the dispatcher
+        :return concurrent.futures.Future:
+        """
+        if timeout == -1:
+            timeout = self.__timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        future = Future()
+        with self.__condition:
+            if not self.__running:
+                raise LightifyException('Dispatcher is closed')
+            heapq.heappush(self.__heap, (int(priority), next(self.__order), deadline, fn, future))
+            self.__condition.notify()
+        return future
+
+    def call(self, fn, priority=Priority.NORMAL, timeout=-1):
+        """
+        Run fn through the queue and wait for it. Runs it right away when called from a worker thread
+        :return: result of fn
+        """
+        if self.is_worker():
+            return fn()
+        return self.submit(fn, priority, timeout).result()
+
+    def depth(self):
+        """
+        :return dict: number of queued items per Priority name
+        """
+        with self.__condition:
+            depth = dict((priority.name, 0) for priority in Priority)
+            for item in self.__heap:
+                depth[Priority(item[0]).name] += 1
+            return depth
+
+    def __run(self):
+        self.__workers.add(threading.get_ident())
+        while True:
+            with self.__condition:
+                while self.__running and not self.__heap:
+                    self.__condition.wait()
+                if not self.__heap:
+                    return
+                (priority, order, deadline, fn, future) = heapq.heappop(self.__heap)
+            if not future.set_running_or_notify_cancel():
+                self.cancelled += 1
+                continue
+            if deadline is not None and time.monotonic() > deadline:
+                self.expired += 1
+                future.set_exception(LightifyException('Request expired after waiting in the queue'))
+                continue
+            try:
+                future.set_result(fn())
+                self.executed += 1
+            except BaseException as e:
+                self.failed += 1
+                future.set_exception(e)
+
+    def close(self, cancel=True):
+        """
+        Stop the worker threads
+        :param cancel(bool): Cancel queued work, otherwise it is run first
+        """
+        with self.__condition:
+            self.__running = False
+            if cancel:
+                for item in self.__heap:
+                    if item[4].cancel():
+                        self.cancelled += 1
+                self.__heap = []
+            self.__condition.notify_all()
+        for thread in self.__threads:
+            if thread.ident != threading.get_ident():
+                thread.join()
+
+    def stats(self):
+        """
+        :return dict: queue depth per priority and counters of executed, failed, expired and cancelled work
+        """
+        return {
+            'depth': self.depth(),
+            'executed': self.executed,
+            'failed': self.failed,
+            'expired': self.expired,
+            'cancelled': self.cancelled,
+        }
@@ -0,0 +1,74 @@
+from lightifypy import CommandPipeline
+from lightifypy.Errors import LightifyException
+from lightifypy.LightifyLink import LightifyLink
+import argparse
+import io
+import logging
+import socket
+import struct
+import sys
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='lightify', description='Control lights behind an OSRAM Lightify gateway')
+    parser.add_argument('gateway', help='address of the gateway')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--window', type=int, default=1, help='requests in flight on the connection')
+    parser.add_argument('--snapshot', help='topology snapshot file, skips the discovery when it exists')
+    parser.add_argument('--revalidate', action='store_true', help='reconcile a loaded snapshot with the gateway')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    commands.add_parser('list', help='print devices and zones')
+    run = commands.add_parser('run', help='stream commands from a JSONL or CSV file')
+    run.add_argument('input', help="file name, '-' reads stdin")
+    run.add_argument('--format', choices=('jsonl', 'csv'), help='defaults to csv for *.csv files, jsonl otherwise')
+    run.add_argument('--batch', type=int, default=50, help='commands written per batch')
+    run.add_argument('--coalesce', type=int, default=256,
+                     help='keep only the newest command per target and action within this many commands, 0 disables')
+    return parser
+
+
+def print_topology(link, out):
+    for mac, light in sorted(link.get_devices().items()):
+        out.write('0x{:016x}\t{}\t{}\n'.format(mac, light.get_name(), 'on' if light.is_powered() else 'off'))
+    for uid, zone in sorted(link.get_zones().items()):
+        members = ','.join('0x{:016x}'.format(struct.unpack('<Q', light.address())[0]) for light in zone.get_lums())
+        out.write('{}\t{}\t{}\n'.format(uid, zone.get_name(), members))
+
+
+def run_commands(link, args, out):
+    fmt = args.format or ('csv' if args.input.endswith('.csv') else 'jsonl')
+    if args.input == '-':
+        summary = CommandPipeline.run(link, io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline=''), fmt,
+                                      args.batch, args.coalesce)
+    else:
+        with open(args.input, encoding='utf-8', newline='') as stream:
+            summary = CommandPipeline.run(link, stream, fmt, args.batch, args.coalesce)
+    out.write(summary.to_string() + '\n')
+    return 1 if summary.failed or summary.invalid or summary.unresolved else 0
+
+
+def main(argv=None):
+    """
+    Entry point of the lightify command
+    :return int: exit status, 1 if any command was invalid, unresolved or failed
+    """
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s %(message)s')
+    try:
+        link = LightifyLink(args.gateway, args.port, args.window, args.snapshot, args.revalidate)
+    except (LightifyException, socket.error) as e:
+        sys.stderr.write('Cannot connect to {}:{}: {}\n'.format(args.gateway, args.port, e))
+        return 2
+    try:
+        if args.command == 'list':
+            print_topology(link, sys.stdout)
+            return 0
+        return run_commands(link, args, sys.stdout)
+    finally:
+        link.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
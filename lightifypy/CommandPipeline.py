@@ -0,0 +1,305 @@
+from lightifypy.Errors import LightifyException
+from lightifypy.LinkMetrics import Histogram
+from collections import OrderedDict
+import csv
+import json
+import logging
+import socket
+import struct
+import time
+
+
+class PipelineCommand(object):
+    """
+    One command flowing through the pipeline
+    """
+    __slots__ = ('line', 'target', 'action', 'values', 'luminary', 'error')
+
+    ACTIONS = ('status', 'luminance', 'rgb', 'temperature')
+
+    def __init__(self, line, target, action, values):
+        self.line = line
+        self.target = target
+        self.action = action
+        self.values = values
+        self.luminary = None
+        self.error = None
+
+
+class PipelineSummary(object):
+    """
+    Counters and batch latency of a pipeline run, constant in size however long the input is
+    """
+    def __init__(self):
+        self.read = 0
+        self.invalid = 0
+        self.unresolved = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.latency = Histogram()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_string(self):
+        elapsed = self.elapsed()
+        p50 = self.latency.quantile(0.5)
+        p99 = self.latency.quantile(0.99)
+        return ("read {} commands, {} invalid, {} unresolved, {} coalesced\n"
+                "sent {} in {} batches, {} failed, {:.2f}s, {:.0f} cmd/s\n"
+                "batch latency p50 <= {} ms, p99 <= {} ms").format(
+            self.read, self.invalid, self.unresolved, self.coalesced, self.sent, self.batches, self.failed, elapsed,
+            self.sent / elapsed if elapsed > 0 else 0.0,
+            '-' if p50 is None else '{:g}'.format(p50 * 1000), '-' if p99 is None else '{:g}'.format(p99 * 1000))
+
+
+def read_records(stream, fmt='jsonl'):
+    """
+    :param stream: Text stream, read lazily line by line
+    :param fmt(str): 'jsonl' or 'csv', a CSV file needs a header row
+    :return: generator of (line number, dict)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, dict((key, value) for key, value in record.items() if value not in (None, ''))
+        return
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, {'error': 'invalid JSON: {}'.format(e)}
+
+
+def _in_range(key, value, maximum):
+    if not 0 <= value <= maximum:
+        raise ValueError('{} {} out of range 0..{}'.format(key, value, maximum))
+    return value
+
+
+def _number(record, key, default=None, maximum=0xFFFF):
+    value = record.get(key, default)
+    if value is None:
+        raise ValueError('missing {}'.format(key))
+    return _in_range(key, int(value), maximum)
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'on', 'true', 'yes')
+    return bool(value)
+
+
+def parse_record(record):
+    """
+    :param record(dict): target (device name, MAC address, zone name or zone::<id>), action and its values:
+
+        {"target": "Kitchen", "action": "rgb", "rgb": "#ff8000", "millis": 500}
+        {"target": "0x84182600000a0001", "action": "luminance", "luminance": 40}
+        {"target": "zone::2", "action": "status", "on": false}
+
+    :return PipelineCommand: command without luminary
+    :raises ValueError: if the record is incomplete, invalid or has a value the packet cannot hold
+    """
+    try:
+        if 'error' in record:
+            raise ValueError(record['error'])
+        action = record.get('action')
+        if action not in PipelineCommand.ACTIONS:
+            raise ValueError('unknown action {!r}'.format(action))
+        target = record.get('target')
+        if target in (None, ''):
+            raise ValueError('missing target')
+        millis = _number(record, 'millis', 0)
+        if action == 'status':
+            values = (_flag(record.get('on', True)),)
+        elif action == 'luminance':
+            values = (_number(record, 'luminance', maximum=0xFF), millis)
+        elif action == 'temperature':
+            values = (_number(record, 'temperature'), millis)
+        else:
+            rgb = record.get('rgb')
+            if isinstance(rgb, str):
+                rgb = rgb.lstrip('#')
+                rgb = (int(rgb[0:2], 16), int(rgb[2:4], 16), int(rgb[4:6], 16))
+            elif rgb is None:
+                rgb = (_number(record, 'r'), _number(record, 'g'), _number(record, 'b'))
+            if len(rgb) != 3:
+                raise ValueError('rgb needs 3 components')
+            values = (tuple(_in_range('rgb', int(c), 0xFF) for c in rgb), millis)
+    except (TypeError, IndexError, AttributeError) as e:
+        raise ValueError(str(e))
+    return PipelineCommand(None, str(target), action, values)
+
+
+def parse(records, summary):
+    """
+    Turn records into PipelineCommand, see parse_record(). Invalid records are counted and logged, they do not stop
+    the pipeline
+    """
+    logger = logging.getLogger('lightfypy')
+    for number, record in records:
+        summary.read += 1
+        try:
+            command = parse_record(record)
+        except ValueError as e:
+            summary.invalid += 1
+            logger.warning("Line {}: {}".format(number, e))
+            continue
+        command.line = number
+        yield command
+
+
+def zone_names(link):
+    """
+    :return dict: zone name -> list of LightifyZone of link
+    """
+    names = {}
+    for zone in link.get_zones().values():
+        names.setdefault(zone.get_name(), []).append(zone)
+    return names
+
+
+def find_target(link, target, names=None):
+    """
+    :param target(str): MAC address, zone uid, device name or zone name, names have to be unique
+    :param names(dict): Result of zone_names(link), computed when missing
+    :return: LightifyLight or LightifyZone, None if there is no unique match
+    """
+    luminary = link.get_zones().get(target)
+    if luminary is not None:
+        return luminary
+    try:
+        mac = int(target, 0)
+    except ValueError:
+        mac = None
+    if mac is not None:
+        return link.get_registry().device(mac)
+    named = link.get_registry().by_name(target) or (zone_names(link) if names is None else names).get(target, ())
+    return named[0] if len(named) == 1 else None
+
+
+def resolve(commands, link, summary):
+    """
+    Attach the LightifyLight or LightifyZone every command is meant for, see find_target()
+    """
+    logger = logging.getLogger('lightfypy')
+    names = zone_names(link)
+    for command in commands:
+        luminary = find_target(link, command.target, names)
+        if luminary is None:
+            summary.unresolved += 1
+            logger.warning("Line {}: no unique device or zone {!r}".format(command.line, command.target))
+            continue
+        command.luminary = luminary
+        yield command
+
+
+def coalesce(commands, summary, window=256):
+    """
+    Keep only the newest of several commands for the same target and action within `window` consecutive commands.
+    At most `window` commands are held back
+    """
+    pending = OrderedDict()
+    for command in commands:
+        key = (id(command.luminary), command.action)
+        if key in pending:
+            summary.coalesced += 1
+            del pending[key]
+        pending[key] = command
+        if len(pending) > window:
+            yield pending.popitem(last=False)[1]
+    while pending:
+        yield pending.popitem(last=False)[1]
+
+
+def apply(command, sender):
+    """
+    Hand a resolved command to sender
+    :param sender: LightifyLink, LightifyBatch or anything else with their set_* methods
+    :return: result of the set_* method
+    """
+    if command.action == 'status':
+        return sender.set_status(command.luminary, *command.values)
+    if command.action == 'luminance':
+        return sender.set_luminance(command.luminary, command.values[1], command.values[0])
+    if command.action == 'temperature':
+        return sender.set_temperature(command.luminary, *command.values)
+    (r, g, b) = command.values[0]
+    return sender.set_rgb(command.luminary, r, g, b, command.values[1])
+
+
+def send(commands, link, summary, batch_size=50):
+    """
+    Write commands in batches of batch_size
+    :return: generator of sent PipelineCommand, error is set on failed ones
+    """
+    chunk = []
+    for command in commands:
+        chunk.append(command)
+        if len(chunk) >= batch_size:
+            for sent in _send_batch(chunk, link, summary):
+                yield sent
+            chunk = []
+    if chunk:
+        for sent in _send_batch(chunk, link, summary):
+            yield sent
+
+
+def _send_batch(chunk, link, summary):
+    batch = link.batch()
+    # packets per command, switching a zone off is sent as luminance 0 followed by the switch
+    sizes = []
+    for command in chunk:
+        count = len(batch)
+        try:
+            apply(command, batch)
+        except (struct.error, ValueError) as e:
+            # only this command is dropped, not the batch
+            command.error = LightifyException('Cannot encode {} command: {}'.format(command.action, e))
+        sizes.append(len(batch) - count)
+    count = len(batch)
+    errors = []
+    if count:
+        start = time.perf_counter()
+        try:
+            report = batch.send()
+            errors = [result.error for result in report.results]
+        except (LightifyException, socket.error) as e:
+            errors = [e] * count
+        summary.latency.observe(time.perf_counter() - start)
+        summary.batches += 1
+    errors = iter(errors)
+    for command, size in zip(chunk, sizes):
+        outcomes = [next(errors, None) for i in range(size)]
+        error = command.error or next((outcome for outcome in outcomes if outcome is not None), None)
+        summary.sent += 1
+        if error is not None:
+            summary.failed += 1
+            command.error = error
+        yield command
+
+
+def run(link, stream, fmt='jsonl', batch_size=50, window=256):
+    """
+    Stream commands from stream to the gateway: parse, resolve, coalesce, send. Memory use does not grow with the
+    length of the input
+    :return PipelineSummary:
+    """
+    summary = PipelineSummary()
+    stages = read_records(stream, fmt)
+    stages = parse(stages, summary)
+    stages = resolve(stages, link, summary)
+    if window:
+        stages = coalesce(stages, summary, window)
+    for command in send(stages, link, summary, batch_size):
+        pass
+    summary.finished = time.perf_counter()
+    return summary
@@ -0,0 +1,252 @@
+from lightifypy.Command import Command
+from lightifypy.Errors import ConnectionLost, LightifyException
+from lightifypy.LinkMetrics import Histogram
+from lightifypy.Transport import copy_frame
+import logging
+import random
+import socket
+import threading
+import time
+
+
+class Backoff(object):
+    """
+    Exponential backoff with full jitter: the n-th delay is uniform between 0 and min(maximum, initial * factor^n),
+    so gateways dropped at the same time are not reconnected to in lockstep
+    """
+    def __init__(self, initial=0.1, maximum=10.0, factor=2.0, rng=random.random):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.__rng = rng
+        self.__attempt = 0
+
+    def next(self):
+        """
+        :return float: seconds to wait before the next attempt
+        """
+        ceiling = min(self.maximum, self.initial * self.factor ** self.__attempt)
+        self.__attempt += 1
+        return ceiling * self.__rng()
+
+    def reset(self):
+        self.__attempt = 0
+
+
+class ConnectionManager(object):
+    """
+    Transport wrapper rebuilding the connection when the gateway drops it. A request failing with ConnectionLost or
+    a socket error reconnects, with jittered backoff between attempts, and is sent again on the new connection if
+    its command is in RETRY. Requests of other threads wait while the connection is rebuilt. Devices and zones of
+    the link are not touched, only the socket is replaced.
+
+    With start_keepalive(), an idle connection is probed periodically and a probe without reply within its timeout
+    closes the connection, so a silently dead gateway is noticed before the next command
+    """
+    # setting absolute values and reading state can be repeated without changing the outcome
+    RETRY = frozenset(command.get_id() for command in Command)
+
+    def __init__(self, transport, backoff=None, max_attempts=8, retry=None):
+        """
+        :param transport: SocketTransport or PipelinedTransport, reconnected with connect() after close()
+        :param backoff: Backoff between reconnect attempts
+        :param max_attempts(int): Reconnect attempts before a request fails with ConnectionLost
+        :param retry: Command ids resent after a reconnect, defaults to RETRY
+        """
+        self.__transport = transport
+        self.__backoff = backoff or Backoff()
+        self.__max_attempts = max_attempts
+        self.__retry = self.RETRY if retry is None else frozenset(retry)
+        self.__logger = logging.getLogger('lightfypy')
+        self.__lock = threading.Lock()
+        self.__ready = threading.Condition(self.__lock)
+        self.__reconnecting = False
+        self.__generation = 0
+        self.__last_activity = time.monotonic()
+        self.__keepalive = None
+        self.__keepalive_stop = threading.Event()
+        self.__metrics = None
+        self.recovery = Histogram()
+        self.reconnects = 0
+        self.failed_reconnects = 0
+        self.retries = 0
+        self.probes = 0
+        self.last_error = None
+
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self.__metrics = metrics
+        self.__transport.metrics = metrics
+
+    def connect(self):
+        self.__transport.connect()
+        self.__last_activity = time.monotonic()
+
+    def close(self):
+        self.stop_keepalive()
+        self.__transport.close()
+
+    def stats(self):
+        """
+        :return dict: counters of the transport plus reconnects, retried requests, keepalive probes and recovery
+        time
+        """
+        stats = dict(self.__transport.stats())
+        stats.update({
+            'reconnects': self.reconnects,
+            'failed_reconnects': self.failed_reconnects,
+            'retries': self.retries,
+            'probes': self.probes,
+            'last_error': self.last_error,
+            'recovery': self.recovery.snapshot(),
+        })
+        return stats
+
+    def __wait_ready(self):
+        """
+        :return int: generation of the connection requests are sent on
+        """
+        with self.__ready:
+            while self.__reconnecting:
+                self.__ready.wait()
+            return self.__generation
+
+    def __recover(self, generation, error, retried):
+        """
+        Rebuild the connection, unless another thread did so since generation was current
+        :raise ConnectionLost: when all attempts failed
+        """
+        with self.__ready:
+            while self.__reconnecting:
+                self.__ready.wait()
+            if self.__generation != generation:
+                return
+            self.__reconnecting = True
+        self.last_error = str(error)
+        self.__logger.warning("Connection to gateway lost: {}, reconnecting".format(error))
+        start = time.monotonic()
+        connected = False
+        try:
+            self.__transport.close()
+            for attempt in range(self.__max_attempts):
+                try:
+                    self.__transport.connect()
+                    connected = True
+                    break
+                except socket.error as e:
+                    self.failed_reconnects += 1
+                    self.last_error = str(e)
+                    if attempt + 1 < self.__max_attempts:
+                        time.sleep(self.__backoff.next())
+        finally:
+            with self.__ready:
+                self.__reconnecting = False
+                if connected:
+                    self.__generation += 1
+                self.__ready.notify_all()
+        if not connected:
+            raise ConnectionLost('Cannot reconnect to gateway: {}'.format(self.last_error))
+        self.__backoff.reset()
+        self.__last_activity = time.monotonic()
+        elapsed = time.monotonic() - start
+        self.reconnects += 1
+        self.retries += retried
+        self.recovery.observe(elapsed)
+        metrics = self.__metrics
+        if metrics is not None:
+            metrics.recovered(elapsed, retried)
+        self.__logger.info("Reconnected to gateway after %.3fs", elapsed)
+
+    def __retriable(self, packet):
+        return packet[3] in self.__retry
+
+    def request(self, packet, decode=copy_frame):
+        """
+        Send packet and wait for its reply, see SocketTransport.request(). Sent again after a reconnect if retriable
+        """
+        for attempt in range(self.__max_attempts):
+            generation = self.__wait_ready()
+            try:
+                result = self.__transport.request(packet, decode)
+                self.__last_activity = time.monotonic()
+                return result
+            except (ConnectionLost, socket.error) as e:
+                retry = self.__retriable(packet)
+                self.__recover(generation, e, 1 if retry else 0)
+                if not retry:
+                    raise ConnectionLost('Connection lost while waiting for the reply: {}'.format(e))
+        raise ConnectionLost('Connection lost on every of {} attempts'.format(self.__max_attempts))
+
+    def request_many(self, packets, decode=copy_frame):
+        """
+        Send packets at once, see SocketTransport.request_many(). Retriable packets which got no reply because the
+        connection dropped are sent again after a reconnect
+        """
+        results = [None] * len(packets)
+        todo = list(range(len(packets)))
+        for attempt in range(self.__max_attempts):
+            generation = self.__wait_ready()
+            try:
+                replies = self.__transport.request_many([packets[i] for i in todo], decode)
+            except (ConnectionLost, socket.error) as e:
+                replies = [ConnectionLost(str(e))] * len(todo)
+            error = None
+            lost = []
+            for i, reply in zip(todo, replies):
+                results[i] = reply
+                if isinstance(reply, ConnectionLost):
+                    error = reply
+                    if self.__retriable(packets[i]):
+                        lost.append(i)
+            if error is None:
+                self.__last_activity = time.monotonic()
+                break
+            self.__recover(generation, error, len(lost))
+            if not lost:
+                break
+            todo = lost
+        return results
+
+    def idle(self):
+        """
+        :return float: seconds since the last reply
+        """
+        return time.monotonic() - self.__last_activity
+
+    def start_keepalive(self, probe, interval=30.0, timeout=5.0):
+        """
+        :param probe: Callable building a probe packet, every call needs a fresh request id
+        :param interval(float): Idle seconds before a probe is sent
+        :param timeout(float): Seconds a probe may take before the connection is considered dead
+        """
+        self.stop_keepalive()
+        self.__keepalive_stop.clear()
+        self.__keepalive = threading.Thread(target=self.__keepalive_loop, args=(probe, interval, timeout),
+                                            name='lightifypy-keepalive', daemon=True)
+        self.__keepalive.start()
+
+    def stop_keepalive(self):
+        self.__keepalive_stop.set()
+        thread, self.__keepalive = self.__keepalive, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def __keepalive_loop(self, probe, interval, timeout):
+        while not self.__keepalive_stop.wait(max(0.0, interval - self.idle())):
+            if self.idle() < interval:
+                continue
+            # a probe stuck on a dead connection is woken up by closing it, the request then reconnects
+            watchdog = threading.Timer(timeout, self.__transport.close)
+            watchdog.daemon = True
+            watchdog.start()
+            try:
+                self.probes += 1
+                self.request(probe())
+            except LightifyException as e:
+                self.__logger.warning("Keepalive probe failed: {}".format(e))
+            finally:
+                watchdog.cancel()
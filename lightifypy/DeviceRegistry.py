@@ -0,0 +1,281 @@
+from lightifypy.Capability import Capability
+from lightifypy.DeviceType import DeviceType
+from lightifypy.LightifyZone import LightifyZone
+import struct
+import threading
+
+
+class DeviceRegistry(object):
+    """
+    Secondary indexes over the devices and zones of a link: name, device type and capability to devices, zone to
+    members and device to zones. The link keeps them current on every update, so lookups cost O(result). Devices
+    are tracked by MAC address and only turned into LightifyLight objects for the result of a lookup. Plugs, sensors
+    and switches are indexed as well, they have no LightifyLight and are only found by the MAC address lookups
+    """
+    def __init__(self, resolve_device, resolve_zone):
+        """
+        :param resolve_device: Callable returning the LightifyLight of a MAC address, None if it is no light or gone
+        :param resolve_zone: Callable returning the LightifyZone of a zone uid, None if it is gone
+        """
+        self.__resolve_device = resolve_device
+        self.__resolve_zone = resolve_zone
+        self.__lock = threading.RLock()
+        self.__device_names = {}
+        self.__names = {}
+        self.__types = {}
+        self.__capabilities = {}
+        self.__zone_names = {}
+        self.__zones_by_name = {}
+        self.__members = {}
+        self.__device_zones = {}
+
+    @staticmethod
+    def __add(index, key, value):
+        index.setdefault(key, set()).add(value)
+
+    @staticmethod
+    def __discard(index, key, value):
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+    def add_device(self, mac, name, type_id):
+        with self.__lock:
+            self.__device_names[mac] = name
+            self.__add(self.__names, name, mac)
+            self.__add(self.__types, DeviceType.find_by_type_id(type_id), mac)
+            flags = DeviceType.capabilities_of(type_id)
+            for capability in Capability:
+                if flags & capability:
+                    self.__add(self.__capabilities, capability, mac)
+
+    def remove_device(self, mac):
+        with self.__lock:
+            name = self.__device_names.pop(mac, None)
+            if name is None:
+                return
+            self.__discard(self.__names, name, mac)
+            for index in (self.__types, self.__capabilities):
+                for key in list(index):
+                    self.__discard(index, key, mac)
+            for uid in self.__device_zones.pop(mac, ()):
+                self.__discard(self.__members, uid, mac)
+
+    def rename_device(self, mac, name):
+        with self.__lock:
+            old = self.__device_names.get(mac)
+            if old is not None and old != name:
+                self.__discard(self.__names, old, mac)
+                self.__add(self.__names, name, mac)
+                self.__device_names[mac] = name
+
+    def add_zone(self, uid, name):
+        with self.__lock:
+            self.rename_zone(uid, name)
+            self.__members.setdefault(uid, set())
+
+    def remove_zone(self, uid):
+        with self.__lock:
+            name = self.__zone_names.pop(uid, None)
+            if name is not None:
+                self.__discard(self.__zones_by_name, name, uid)
+            for mac in self.__members.pop(uid, ()):
+                self.__discard(self.__device_zones, mac, uid)
+
+    def rename_zone(self, uid, name):
+        with self.__lock:
+            old = self.__zone_names.get(uid)
+            if old is not None:
+                self.__discard(self.__zones_by_name, old, uid)
+            self.__zone_names[uid] = name
+            self.__add(self.__zones_by_name, name, uid)
+
+    def join(self, uid, mac):
+        with self.__lock:
+            self.__add(self.__members, uid, mac)
+            self.__add(self.__device_zones, mac, uid)
+
+    def leave(self, uid, mac):
+        with self.__lock:
+            self.__discard(self.__members, uid, mac)
+            self.__discard(self.__device_zones, mac, uid)
+
+    def __zone_uids(self, zone):
+        """
+        :param zone: zone uid, zone name or LightifyZone
+        """
+        if isinstance(zone, LightifyZone):
+            return ['zone::{}'.format(zone.get_zone_id())]
+        if zone in self.__zone_names:
+            return [zone]
+        return list(self.__zones_by_name.get(zone, ()))
+
+    def macs_all(self):
+        with self.__lock:
+            return set(self.__device_names)
+
+    def macs_named(self, name):
+        with self.__lock:
+            return set(self.__names.get(name, ()))
+
+    def macs_of_type(self, device_type):
+        with self.__lock:
+            return set(self.__types.get(device_type, ()))
+
+    def macs_with(self, capability):
+        with self.__lock:
+            return set(self.__capabilities.get(capability, ()))
+
+    def macs_in(self, zone):
+        """
+        :param zone: zone uid, zone name or LightifyZone
+        """
+        with self.__lock:
+            macs = set()
+            for uid in self.__zone_uids(zone):
+                macs.update(self.__members.get(uid, ()))
+            return macs
+
+    def __index(self, kind, key):
+        if kind == 'name':
+            return self.__names.get(key, ())
+        if kind == 'type':
+            return self.__types.get(key, ())
+        if kind == 'capability':
+            return self.__capabilities.get(key, ())
+        uids = self.__zone_uids(key)
+        if len(uids) == 1:
+            return self.__members.get(uids[0], ())
+        return set().union(*[self.__members.get(uid, ()) for uid in uids])
+
+    def select(self, constraints):
+        """
+        :param constraints: list of (kind, key) with kind one of 'name', 'type', 'capability' or 'zone'
+        :return set: MAC addresses matching all constraints, found by walking the smallest index only
+        """
+        with self.__lock:
+            if not constraints:
+                return set(self.__device_names)
+            indexes = sorted((self.__index(kind, key) for kind, key in constraints), key=len)
+            (smallest, others) = (indexes[0], indexes[1:])
+            return set(mac for mac in smallest if all(mac in index for index in others))
+
+    def device(self, mac):
+        """
+        :param mac(int): MAC address
+        :return: LightifyLight of mac, None if there is no such light, or it was removed meanwhile. Only this one
+        light is created
+        """
+        return self.__resolve_device(mac)
+
+    def __lights(self, macs):
+        lights = [self.__resolve_device(mac) for mac in macs]
+        return [light for light in lights if light is not None]
+
+    def by_name(self, name):
+        """
+        :return list: LightifyLight objects called name, names are not unique
+        """
+        return self.__lights(self.macs_named(name))
+
+    def members(self, zone):
+        """
+        :return list: LightifyLight objects in zone
+        """
+        return self.__lights(self.macs_in(zone))
+
+    def zones_of(self, device):
+        """
+        :param device: LightifyLight or MAC address
+        :return list: LightifyZone objects the device is a member of
+        """
+        mac = device if isinstance(device, int) else struct.unpack('<Q', device.address())[0]
+        with self.__lock:
+            uids = list(self.__device_zones.get(mac, ()))
+        zones = [self.__resolve_zone(uid) for uid in uids]
+        return [zone for zone in zones if zone is not None]
+
+    def query(self):
+        """
+        :return DeviceQuery: query over all devices
+        """
+        return DeviceQuery(self, self.__resolve_device)
+
+    def __len__(self):
+        return len(self.__device_names)
+
+
+class DeviceQuery(object):
+    """
+    Selector combining indexed constraints with filters on state. Filters are only evaluated for the devices the
+    indexes leave:
+
+        link.query().zone('Kitchen').capability(Capability.RGB).powered(True).devices()
+    """
+    def __init__(self, registry, resolve_device):
+        self.__registry = registry
+        self.__resolve_device = resolve_device
+        self.__constraints = []
+        self.__filters = []
+
+    def name(self, name):
+        self.__constraints.append(('name', name))
+        return self
+
+    def zone(self, zone):
+        """
+        :param zone: zone uid, zone name or LightifyZone
+        """
+        self.__constraints.append(('zone', zone))
+        return self
+
+    def capability(self, capability):
+        self.__constraints.append(('capability', capability))
+        return self
+
+    def type(self, device_type):
+        """
+        :param device_type: DeviceType.DeviceType
+        """
+        self.__constraints.append(('type', device_type))
+        return self
+
+    def powered(self, powered=True):
+        self.__filters.append(lambda light: light.is_powered() == powered)
+        return self
+
+    def where(self, predicate):
+        """
+        :param predicate: Callable getting a LightifyLight, True keeps it
+        """
+        self.__filters.append(predicate)
+        return self
+
+    def macs(self):
+        """
+        :return set: MAC addresses matching the indexed constraints, including devices which are no lights. Filters
+        are not applied
+        """
+        return self.__registry.select(self.__constraints)
+
+    def devices(self):
+        """
+        :return list: matching LightifyLight objects
+        """
+        result = []
+        for mac in self.macs():
+            light = self.__resolve_device(mac)
+            if light is not None and all(accept(light) for accept in self.__filters):
+                result.append(light)
+        return result
+
+    def __iter__(self):
+        return iter(self.devices())
+
+    def count(self):
+        """
+        :return int: number of matching devices, only lights are counted once a filter is set
+        """
+        return len(self.devices()) if self.__filters else len(self.macs())
@@ -0,0 +1,132 @@
+from lightifypy.LightifyLight import LightifyLight
+from lightifypy.PacketParser import PacketParser
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class DeviceTable(object):
+    """
+    Columnar view of a STATUS_ALL reply. All records are decoded in one pass, either with struct.iter_unpack or,
+    when NumPy is installed, with a structured dtype laid over the reply buffer. LightifyLight objects are only
+    created by light() when a caller asks for one
+    """
+    RECORD = struct.Struct('<HQB5xH?BH4B24s')
+    if numpy is not None:
+        DTYPE = numpy.dtype([
+            ('device_id', '<u2'), ('address', '<u8'), ('type', 'u1'), ('unknown', 'V5'), ('zone_id', '<u2'),
+            ('powered', '?'), ('luminance', 'u1'), ('temperature', '<u2'), ('r', 'u1'), ('g', 'u1'), ('b', 'u1'),
+            ('w', 'u1'), ('name', 'S24'),
+        ])
+
+    def __init__(self, addresses, types, zone_ids, powered, luminances, temperatures, r, g, b, raw_names):
+        self.addresses = addresses
+        self.types = types
+        self.zone_ids = zone_ids
+        self.powered = powered
+        self.luminances = luminances
+        self.temperatures = temperatures
+        self.r = r
+        self.g = g
+        self.b = b
+        self.__raw_names = raw_names
+        self.__names = None
+        self.__index = None
+
+    @classmethod
+    def from_status_all(cls, buffer, use_numpy=None):
+        """
+        :param buffer: STATUS_ALL reply, bytes or memoryview
+        :param use_numpy(bool): Decode with NumPy, None uses it when it is installed
+        :return DeviceTable:
+        """
+        view = memoryview(buffer)
+        (num,) = struct.unpack_from('<H', view, 7)
+        records = view[9:9 + num * cls.RECORD.size]
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if use_numpy:
+            # copied, the reply may live in a receive buffer which is reused for the next frame
+            rows = numpy.frombuffer(records, dtype=cls.DTYPE, count=num).copy()
+            return cls(rows['address'], rows['type'], rows['zone_id'], rows['powered'], rows['luminance'],
+                       rows['temperature'], rows['r'], rows['g'], rows['b'], rows['name'])
+        if not num:
+            return cls([], [], [], [], [], [], [], [], [], [])
+        columns = list(zip(*cls.RECORD.iter_unpack(records)))
+        return cls(*columns[1:7] + columns[7:10] + columns[11:])
+
+    def to_status_all(self):
+        """
+        Encode the table as STATUS_ALL reply, the inverse of from_status_all(). Device ids are replaced by row numbers
+        :return bytes: reply without the length prefix
+        """
+        header = struct.pack('<BBIBH', 0x01, 0x13, 0, 0, len(self))
+        records = [self.RECORD.pack(i, int(self.addresses[i]), int(self.types[i]), int(self.zone_ids[i]),
+                                    bool(self.powered[i]), int(self.luminances[i]), int(self.temperatures[i]),
+                                    int(self.r[i]), int(self.g[i]), int(self.b[i]), 0xFF, bytes(self.__raw_names[i]))
+                   for i in range(len(self))]
+        return header + b''.join(records)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def names(self):
+        """
+        :return: list of device names, decoded on first access
+        """
+        if self.__names is None:
+            self.__names = [PacketParser.clean_name(bytes(name).decode(PacketParser.CHARSET))
+                            for name in self.__raw_names]
+        return self.__names
+
+    def name(self, i):
+        """
+        :return str: name of device in row i
+        """
+        if self.__names is not None:
+            return self.__names[i]
+        return PacketParser.clean_name(bytes(self.__raw_names[i]).decode(PacketParser.CHARSET))
+
+    def index_of(self, address):
+        """
+        :param address(int): MAC address of device
+        :return int: row of device, None if it is not in the table
+        """
+        if self.__index is None:
+            self.__index = dict((int(address), i) for i, address in enumerate(self.addresses))
+        return self.__index.get(address)
+
+    def select(self, type_ids):
+        """
+        :param type_ids: collection of type bytes
+        :return: list of rows whose device type is one of type_ids
+        """
+        if numpy is not None and isinstance(self.types, numpy.ndarray):
+            return numpy.flatnonzero(numpy.isin(self.types, list(type_ids))).tolist()
+        type_ids = set(type_ids)
+        return [i for i, type_id in enumerate(self.types) if type_id in type_ids]
+
+    def row(self, i):
+        """
+        :return: tuple of (address, type_id, zone_id, powered, luminance, temperature, r, g, b, name)
+        """
+        return (int(self.addresses[i]), int(self.types[i]), int(self.zone_ids[i]), bool(self.powered[i]),
+                int(self.luminances[i]), int(self.temperatures[i]), int(self.r[i]), int(self.g[i]), int(self.b[i]),
+                self.name(i))
+
+    def light(self, link, i):
+        """
+        Create LightifyLight of a row
+        :param link: Link the light sends its commands through
+        :return LightifyLight.LightifyLight:
+        """
+        (address, type_id, zone_id, powered, lum, temp, r, g, b, name) = self.row(i)
+        light = LightifyLight(link, name, PacketParser.parse_capabilities(type_id), address)
+        light.update_luminance(lum)
+        light.update_powered(powered)
+        light.update_rgb(r, g, b)
+        light.update_temperature(temp)
+        return light
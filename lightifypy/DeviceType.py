@@ -1,3 +1,5 @@
+from lightifypy.Capability import Capability
+from lightifypy.Constant import BITMASK_PURE_WHITE, BITMASK_RGB, BITMASK_TUNABLE_WHITE
 from enum import Enum
 
 
@@ -11,7 +13,47 @@ class DeviceType(Enum):
 
     @staticmethod
     def find_by_type_id(type_id):
-        for d in DeviceType:
-            if type_id in d.value:
-                return d
+        """
+        :param type_id(int): Type byte of device as reported in STATUS_ALL
+        :return DeviceType:
+        """
+        if 0 <= type_id < 256:
+            return TYPE_TABLE[type_id][0]
         return DeviceType.Unknown
+
+    @staticmethod
+    def capabilities_of(type_id):
+        """
+        :param type_id(int): Type byte of device as reported in STATUS_ALL
+        :return Capability.Capability: flags of the capabilities of the device
+        """
+        if 0 <= type_id < 256:
+            return TYPE_TABLE[type_id][1]
+        return Capability(0)
+
+
+def _build_table():
+    """
+    (DeviceType, Capability) of every type byte
+    """
+    capabilities = {
+        DeviceType.PlugSocket: Capability.Switching,
+        DeviceType.MotionSensor: Capability.MotionSensor,
+    }
+    table = []
+    for type_id in range(256):
+        device_type = DeviceType.Unknown
+        for candidate in DeviceType:
+            if type_id in candidate.value:
+                device_type = candidate
+                break
+        if device_type == DeviceType.Bulb:
+            flags = Capability(type_id & (BITMASK_RGB | BITMASK_TUNABLE_WHITE | BITMASK_PURE_WHITE))
+        else:
+            flags = capabilities.get(device_type, Capability(0))
+        table.append((device_type, flags))
+    return tuple(table)
+
+
+# type byte -> (DeviceType, Capability), one entry per possible byte
+TYPE_TABLE = _build_table()
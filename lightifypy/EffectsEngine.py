@@ -0,0 +1,334 @@
+from lightifypy.ColorConversion import ColorConversion
+from lightifypy.Errors import LightifyException
+import logging
+import socket
+import threading
+import time
+
+
+class Keyframe(object):
+    """
+    State of an effect at `at` seconds after its start. Fields left None are not touched
+    """
+    __slots__ = ('at', 'rgb', 'luminance', 'temperature')
+
+    def __init__(self, at, rgb=None, luminance=None, temperature=None):
+        self.at = float(at)
+        self.rgb = tuple(rgb) if rgb is not None else None
+        self.luminance = luminance
+        self.temperature = temperature
+
+    def interpolate(self, other, fraction):
+        """
+        :return Keyframe: state between self (fraction 0) and other (fraction 1)
+        """
+        def mix(a, b):
+            if a is None or b is None:
+                return b
+            return int(round(a + (b - a) * fraction))
+        rgb = other.rgb
+        if self.rgb is not None and other.rgb is not None:
+            rgb = tuple(mix(a, b) for a, b in zip(self.rgb, other.rgb))
+        return Keyframe(self.at + (other.at - self.at) * fraction, rgb, mix(self.luminance, other.luminance),
+                        mix(self.temperature, other.temperature))
+
+
+class Effect(object):
+    """
+    Keyframes played on a set of lights or zones. Every target runs the same keyframes, shifted by `phase` seconds
+    per target, so a color loop can chase across a row of lights. Zones are addressed with one packet per frame
+    """
+    def __init__(self, targets, keyframes, loop=False, phase=0.0):
+        """
+        :param targets: list of LightifyLight or LightifyZone
+        :param keyframes: list of Keyframe, the first one is applied right away
+        :param loop(bool): Start over after the last keyframe, the last one should then equal the first one
+        :param phase(float): Seconds the keyframes of every further target are delayed by
+        """
+        if len(keyframes) < 2:
+            raise ValueError('an effect needs at least two keyframes')
+        self.targets = list(targets)
+        self.keyframes = sorted(keyframes, key=lambda keyframe: keyframe.at)
+        self.loop = loop
+        self.phase = phase
+        self.duration = self.keyframes[-1].at - self.keyframes[0].at
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def segment(self, t):
+        """
+        :param t(float): Seconds since the first keyframe
+        :return: tuple of (keyframe the target is heading for, seconds until it is reached), None once done
+        """
+        if t < 0:
+            t = 0.0
+        if self.loop and self.duration > 0:
+            t %= self.duration
+        elif t >= self.duration:
+            return None
+        t += self.keyframes[0].at
+        for previous, keyframe in zip(self.keyframes, self.keyframes[1:]):
+            if t < keyframe.at:
+                return keyframe, keyframe.at - t
+        return None
+
+    def at(self, t):
+        """
+        :return Keyframe: interpolated state t seconds after the first keyframe
+        """
+        if self.loop and self.duration > 0:
+            t %= self.duration
+        t = min(max(t, 0.0), self.duration) + self.keyframes[0].at
+        for previous, keyframe in zip(self.keyframes, self.keyframes[1:]):
+            if t <= keyframe.at:
+                span = keyframe.at - previous.at
+                return previous.interpolate(keyframe, (t - previous.at) / span if span else 1.0)
+        return self.keyframes[-1]
+
+    @classmethod
+    def fade(cls, targets, duration, start, end, temperature=None):
+        """
+        Luminance ramp, e.g. a sunrise
+        :param temperature: tuple of (start, end) white temperature, None leaves temperature alone
+        """
+        (t0, t1) = temperature if temperature else (None, None)
+        return cls(targets, [Keyframe(0, luminance=start, temperature=t0),
+                             Keyframe(duration, luminance=end, temperature=t1)])
+
+    @classmethod
+    def color_loop(cls, targets, period, steps=6, phase=0.0, luminance=None):
+        """
+        Endless loop around the hue circle in `steps` linear segments
+        """
+        colors = ColorConversion.hsv_to_rgb([((i % steps) / float(steps), 1.0, 1.0) for i in range(steps + 1)],
+                                            use_numpy=False)
+        keyframes = [Keyframe(period * i / float(steps), rgb, luminance) for i, rgb in enumerate(colors)]
+        return cls(targets, keyframes, loop=True, phase=phase)
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel. Scheduling and expiring are O(1) per timer no matter how many timers are pending, deadlines
+    are rounded up to whole ticks
+    """
+    def __init__(self, tick, slots=512, start=0.0):
+        """
+        :param tick(float): Resolution in seconds
+        :param slots(int): Number of buckets, timers further away than slots * tick wait for more turns
+        """
+        self.tick = tick
+        self.__slots = [[] for i in range(slots)]
+        self.__current = int(start / tick)
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def schedule(self, at, item):
+        deadline = max(int(-(-at // self.tick)), self.__current + 1)
+        self.__slots[deadline % len(self.__slots)].append((deadline, item))
+        self.__count += 1
+
+    def advance(self, now):
+        """
+        :return: list of items whose deadline passed, in deadline order
+        """
+        target = int(now / self.tick)
+        due = []
+        if target <= self.__current:
+            return due
+        size = len(self.__slots)
+        for index in range(self.__current + 1, min(target, self.__current + size) + 1):
+            bucket = self.__slots[index % size]
+            if not bucket:
+                continue
+            keep = []
+            for entry in bucket:
+                (due if entry[0] <= target else keep).append(entry)
+            self.__slots[index % size] = keep
+        self.__current = target
+        self.__count -= len(due)
+        due.sort(key=lambda entry: entry[0])
+        return [item for (deadline, item) in due]
+
+
+class _Track(object):
+    """
+    One target of a playing effect
+    """
+    __slots__ = ('effect', 'target', 'started', 'primed')
+
+    def __init__(self, effect, target, started):
+        self.effect = effect
+        self.target = target
+        self.started = started
+        self.primed = False
+
+
+class EffectsEngine(object):
+    """
+    Plays effects on a link from a single thread. Every target is a track on one timer wheel, which is due when its
+    current keyframe segment starts. A track sends the state at the end of its segment with the transition time of
+    the segment, the bulb interpolates on its own, so a linear segment costs one command no matter how long it is.
+    All tracks due in a frame are written in one batch. The frame interval adapts to how long the gateway takes
+    for a batch, between 1 / max_fps and 1 / min_fps
+    """
+    # unit of the transition time field
+    MILLIS_PER_SECOND = 1000
+    MAX_TRANSITION = 0xFFFF / float(MILLIS_PER_SECOND)
+
+    def __init__(self, link, max_fps=10.0, min_fps=1.0, clock=time.monotonic):
+        """
+        :param link: LightifyLink.LightifyLink the effects are played on
+        :param max_fps(float): Highest frame rate, also the resolution of the timer wheel
+        :param min_fps(float): Lowest frame rate the engine backs off to when the gateway is slow
+        """
+        self.__link = link
+        self.__clock = clock
+        self.__wheel = TimerWheel(1.0 / max_fps, start=clock())
+        self.__max_stride = max(1, int(round(max_fps / min_fps)))
+        self.__stride = 1
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__logger = logging.getLogger('lightfypy')
+        self.frames = 0
+        self.packets = 0
+        self.errors = 0
+        self.send_time = 0.0
+
+    def frame_interval(self):
+        """
+        :return float: current seconds between two frames
+        """
+        return self.__wheel.tick * self.__stride
+
+    def play(self, effect, delay=0.0):
+        """
+        :param delay(float): Seconds until the effect starts
+        :return Effect: effect, stop it with Effect.stop()
+        """
+        start = self.__clock() + delay
+        with self.__lock:
+            for i, target in enumerate(effect.targets):
+                started = start + i * effect.phase
+                self.__wheel.schedule(started, _Track(effect, target, started))
+        self.__wakeup.set()
+        return effect
+
+    def __render(self, track, now, batch):
+        """
+        Add commands of one track to batch
+        :return float: time the track is due again, None when the effect is over
+        """
+        effect = track.effect
+        if not track.primed:
+            # jump to the first keyframe, the transition towards the next one starts with the next frame
+            track.primed = True
+            self.__add(batch, track.target, effect.keyframes[0], 0)
+            return now + self.__wheel.tick
+        t = now - track.started
+        segment = effect.segment(t)
+        if segment is None:
+            return None
+        (keyframe, remaining) = segment
+        if remaining > self.MAX_TRANSITION:
+            # longer than the transition field holds, head for a point on the way
+            remaining = self.MAX_TRANSITION
+            keyframe = effect.at(t + remaining)
+        self.__add(batch, track.target, keyframe, int(remaining * self.MILLIS_PER_SECOND))
+        return now + remaining
+
+    @staticmethod
+    def __add(batch, target, keyframe, millis):
+        if keyframe.luminance is not None:
+            batch.set_luminance(target, millis, keyframe.luminance)
+        if keyframe.temperature is not None:
+            batch.set_temperature(target, keyframe.temperature, millis)
+        if keyframe.rgb is not None:
+            batch.set_rgb(target, keyframe.rgb[0], keyframe.rgb[1], keyframe.rgb[2], millis)
+
+    def tick(self):
+        """
+        Render one frame: send the commands of every due track in one batch
+        :return int: number of packets sent
+        """
+        now = self.__clock()
+        with self.__lock:
+            due = self.__wheel.advance(now)
+        batch = self.__link.batch()
+        again = []
+        for track in due:
+            if track.effect.stopped:
+                continue
+            at = self.__render(track, now, batch)
+            if at is not None:
+                again.append((at, track))
+        with self.__lock:
+            for at, track in again:
+                self.__wheel.schedule(at, track)
+        count = len(batch)
+        if not count:
+            return 0
+        start = self.__clock()
+        try:
+            report = batch.send()
+            self.errors += len(report.failed())
+        except (LightifyException, socket.error) as e:
+            self.errors += count
+            self.__logger.warning("Effect frame failed: {}".format(e))
+        elapsed = self.__clock() - start
+        self.frames += 1
+        self.packets += count
+        self.send_time += elapsed
+        self.__adapt(elapsed)
+        return count
+
+    def __adapt(self, elapsed):
+        """
+        Keep the time spent on sending within half of the frame interval
+        """
+        interval = self.frame_interval()
+        if elapsed > interval / 2 and self.__stride < self.__max_stride:
+            self.__stride = min(self.__max_stride, self.__stride * 2)
+        elif elapsed < interval / 8 and self.__stride > 1:
+            self.__stride -= 1
+
+    def __run(self):
+        while not self.__stop.is_set():
+            self.tick()
+            with self.__lock:
+                idle = not len(self.__wheel)
+            self.__wakeup.wait(None if idle else self.frame_interval())
+            self.__wakeup.clear()
+
+    def start(self):
+        if self.__thread is None:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, name='lightifypy-effects', daemon=True)
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__stop.set()
+        self.__wakeup.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self):
+        """
+        :return dict: pending tracks, frames and packets sent, failed packets, current frame rate and seconds spent
+        sending
+        """
+        return {
+            'tracks': len(self.__wheel),
+            'frames': self.frames,
+            'packets': self.packets,
+            'errors': self.errors,
+            'fps': 1.0 / self.frame_interval(),
+            'send_time': self.send_time,
+        }
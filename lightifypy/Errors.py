@@ -1,2 +1,9 @@
 class LightifyException(Exception):
     pass
+
+
+class ConnectionLost(LightifyException):
+    """
+    The connection to the gateway broke, the request may or may not have reached it
+    """
+    pass
@@ -0,0 +1,65 @@
+from lightifypy.Errors import ConnectionLost
+import struct
+
+
+class FrameReader(object):
+    """
+    Reader of length-prefixed Lightify frames. Data is received with recv_into into one preallocated buffer which
+    grows when a larger frame arrives, and reads are repeated until the whole frame is there
+    """
+    SIZE = struct.Struct('<H')
+
+    def __init__(self, sock, initial_size=4096):
+        """
+        :param sock: Connected socket
+        :param initial_size(int): Initial capacity of receive buffer in bytes
+        """
+        self.__sock = sock
+        self.__buffer = bytearray(initial_size)
+        self.__view = memoryview(self.__buffer)
+        self.frames = 0
+        self.bytes_received = 0
+        self.partial_reads = 0
+        self.buffer_growths = 0
+
+    def __fill(self, size):
+        view = self.__view
+        received = 0
+        while received < size:
+            count = self.__sock.recv_into(view[received:size], size - received)
+            if count == 0:
+                raise ConnectionLost('Connection closed by gateway')
+            received += count
+            if received < size:
+                self.partial_reads += 1
+        self.bytes_received += size
+
+    def __ensure_capacity(self, size):
+        if size > len(self.__buffer):
+            self.__buffer = bytearray(max(size, 2 * len(self.__buffer)))
+            self.__view = memoryview(self.__buffer)
+            self.buffer_growths += 1
+
+    def read_frame(self):
+        """
+        Read one frame
+        :return: memoryview of the frame without length prefix, valid until the next call of read_frame()
+        """
+        self.__fill(2)
+        (size,) = self.SIZE.unpack_from(self.__buffer)
+        self.__ensure_capacity(size)
+        self.__fill(size)
+        self.frames += 1
+        return self.__view[:size]
+
+    def stats(self):
+        """
+        :return dict: counters of frames, bytes, partial reads and buffer growths plus current buffer capacity
+        """
+        return {
+            'frames': self.frames,
+            'bytes_received': self.bytes_received,
+            'partial_reads': self.partial_reads,
+            'buffer_growths': self.buffer_growths,
+            'capacity': len(self.__buffer),
+        }
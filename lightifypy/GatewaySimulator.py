@@ -0,0 +1,302 @@
+from lightifypy.Command import Command
+import heapq
+import random
+import socket
+import struct
+import threading
+import time
+
+
+class SimulatedDevice(object):
+    """
+    State of one bulb of the simulator
+    """
+    __slots__ = ('device_id', 'address', 'type_id', 'zone_id', 'powered', 'luminance', 'temperature', 'r', 'g', 'b',
+                 'name')
+
+    def __init__(self, device_id, address, type_id, zone_id, name):
+        self.device_id = device_id
+        self.address = address
+        self.type_id = type_id
+        self.zone_id = zone_id
+        self.powered = True
+        self.luminance = 100
+        self.temperature = 2700
+        self.r = 255
+        self.g = 255
+        self.b = 255
+        self.name = name
+
+
+class GatewaySimulator(object):
+    """
+    Lightify gateway speaking the binary protocol on a local TCP port. Meant for tests and benchmarks without
+    hardware. Replies are delayed by `latency` plus a random `jitter` but keep the order of the requests, and can
+    be split into `fragment` byte pieces to exercise reassembly of frames
+    """
+    # STATUS_ALL replies are limited by the 16-bit length prefix
+    MAX_DEVICES = (0xFFFF - 9) // 50
+    MAX_ZONES = (0xFFFF - 9) // 18
+    TYPE_IDS = (2, 4, 10)
+    BASE_ADDRESS = 0x84182600000A0000
+
+    def __init__(self, devices=16, zones=4, latency=0.0, jitter=0.0, fragment=None, host='127.0.0.1', port=0,
+                 seed=None, base_address=BASE_ADDRESS):
+        """
+        :param devices(int): Number of simulated bulbs, at most MAX_DEVICES
+        :param zones(int): Number of zones, bulbs are spread over them round robin
+        :param latency(float): Seconds every reply is delayed by
+        :param jitter(float): Maximum seconds added at random to latency
+        :param fragment(int): Send replies in pieces of this many bytes, None sends every reply at once
+        :param port(int): TCP port to listen on, 0 picks a free one
+        :param base_address(int): MAC address of the first bulb, the others follow it
+        """
+        if devices > self.MAX_DEVICES or zones > self.MAX_ZONES:
+            raise ValueError('at most {} devices and {} zones fit into one reply'.format(
+                self.MAX_DEVICES, self.MAX_ZONES))
+        if zones and (devices + zones - 1) // zones > 255:
+            raise ValueError('at most 255 devices fit into one zone')
+        self.latency = latency
+        self.jitter = jitter
+        self.fragment = fragment
+        self.errors = {}
+        self.requests = dict((command, 0) for command in Command)
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.devices = []
+        self.zones = {}
+        for zone_id in range(1, zones + 1):
+            self.zones[zone_id] = ['Zone {}'.format(zone_id), []]
+        for i in range(devices):
+            zone_id = i % zones + 1 if zones else 0
+            device = SimulatedDevice(i, base_address + i, self.TYPE_IDS[i % len(self.TYPE_IDS)], zone_id,
+                                     'Bulb {}'.format(i))
+            self.devices.append(device)
+            if zones:
+                self.zones[zone_id][1].append(device)
+        self.__by_address = dict((device.address, device) for device in self.devices)
+        self.__commands = dict((command.get_id(), command) for command in Command)
+        self.__server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__server.bind((host, port))
+        self.__connections = []
+        self.__thread = None
+        self.__running = False
+
+    @property
+    def address(self):
+        """
+        :return: tuple of (host, port) the simulator listens on
+        """
+        return self.__server.getsockname()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    def start(self):
+        self.__server.listen(16)
+        # accept() wakes up regularly to notice stop()
+        self.__server.settimeout(0.1)
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__accept, name='lightifypy-simulator', daemon=True)
+        self.__thread.start()
+        return self.address
+
+    def stop(self):
+        self.__running = False
+        self.__thread.join()
+        self.__server.close()
+        for connection in list(self.__connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+                connection.close()
+            except socket.error:
+                pass
+
+    def drop_connections(self):
+        """
+        Close all client connections, like the gateway does from time to time
+        """
+        for connection in list(self.__connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def set_error(self, command, code):
+        """
+        Answer every request of command with error code, 0 clears the error
+        """
+        if code:
+            self.errors[command] = code
+        else:
+            self.errors.pop(command, None)
+
+    def add_device(self, device):
+        """
+        Let a bulb join the network, like it was just paired
+        :param device(SimulatedDevice): Bulb, it joins the zone of its zone_id if that zone exists
+        """
+        with self.__lock:
+            self.devices.append(device)
+            self.__by_address[device.address] = device
+            if device.zone_id in self.zones:
+                self.zones[device.zone_id][1].append(device)
+
+    def remove_device(self, address):
+        """
+        Remove a bulb from the network and from its zones
+        :return SimulatedDevice: removed bulb
+        """
+        with self.__lock:
+            device = self.__by_address.pop(address)
+            self.devices.remove(device)
+            for (name, members) in self.zones.values():
+                if device in members:
+                    members.remove(device)
+            return device
+
+    def __accept(self):
+        while self.__running:
+            try:
+                connection, peer = self.__server.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.__connections.append(connection)
+            outbox = []
+            condition = threading.Condition()
+            threading.Thread(target=self.__serve, args=(connection, outbox, condition), daemon=True).start()
+            threading.Thread(target=self.__send, args=(connection, outbox, condition), daemon=True).start()
+
+    @staticmethod
+    def __recv_exactly(connection, size):
+        data = b''
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise socket.error('connection closed')
+            data += chunk
+        return data
+
+    def __serve(self, connection, outbox, condition):
+        last = 0.0
+        order = 0
+        try:
+            while True:
+                (size,) = struct.unpack('<H', self.__recv_exactly(connection, 2))
+                packet = self.__recv_exactly(connection, size)
+                reply = self.handle(packet)
+                delay = self.latency + (self.__random.uniform(0, self.jitter) if self.jitter else 0.0)
+                last = max(last, time.monotonic() + delay)
+                order += 1
+                with condition:
+                    heapq.heappush(outbox, (last, order, reply))
+                    condition.notify()
+        except (socket.error, struct.error):
+            with condition:
+                heapq.heappush(outbox, (last, order + 1, None))
+                condition.notify()
+        finally:
+            if connection in self.__connections:
+                self.__connections.remove(connection)
+
+    def __send(self, connection, outbox, condition):
+        while True:
+            with condition:
+                while not outbox:
+                    condition.wait()
+                (at, order, reply) = outbox[0]
+                wait = at - time.monotonic()
+                if wait > 0:
+                    condition.wait(wait)
+                    continue
+                heapq.heappop(outbox)
+            if reply is None:
+                connection.close()
+                return
+            try:
+                if self.fragment:
+                    for start in range(0, len(reply), self.fragment):
+                        connection.sendall(reply[start:start + self.fragment])
+                else:
+                    connection.sendall(reply)
+            except socket.error:
+                return
+
+    def __zone_members(self, zone_id):
+        zone = self.zones.get(zone_id)
+        return zone[1] if zone else []
+
+    def handle(self, packet):
+        """
+        Answer one request
+        :param packet: Request without the length prefix
+        :return bytes: reply including the length prefix
+        """
+        (type_flag, command_id, request_id) = struct.unpack_from('<BBI', packet)
+        command = self.__commands.get(command_id)
+        body = packet[6:]
+        with self.__lock:
+            if command is not None:
+                self.requests[command] += 1
+            error = self.errors.get(command, 0)
+            payload = b''
+            if error:
+                pass
+            elif command == Command.STATUS_ALL:
+                payload = struct.pack('<H', len(self.devices)) + b''.join(
+                    struct.pack('<HQB5xH?BH4B24s', d.device_id, d.address, d.type_id, d.zone_id, d.powered,
+                                d.luminance, d.temperature, d.r, d.g, d.b, 0xff, d.name.encode('cp437'))
+                    for d in self.devices)
+            elif command == Command.ZONE_LIST:
+                payload = struct.pack('<H', len(self.zones)) + b''.join(
+                    struct.pack('<H16s', zone_id, name.encode('cp437')) for zone_id, (name, members) in
+                    sorted(self.zones.items()))
+            elif command == Command.ZONE_INFO:
+                (zone_id,) = struct.unpack_from('<Q', body)
+                name, members = self.zones.get(zone_id, ('', []))
+                payload = struct.pack('<H16sB', zone_id, name.encode('cp437'), len(members)) + b''.join(
+                    struct.pack('<Q', d.address) for d in members)
+            elif command == Command.STATUS_SINGLE:
+                (address,) = struct.unpack_from('<Q', body)
+                d = self.__by_address.get(address)
+                if d is None:
+                    error = 0x0B
+                else:
+                    payload = struct.pack('<2x8s10x2BH4B16x', body[:8], d.powered, d.luminance, d.temperature,
+                                          d.r, d.g, d.b, 0xff)
+            elif command is not None:
+                (address,) = struct.unpack_from('<Q', body)
+                if type_flag == 0x02:
+                    targets = self.__zone_members(address)
+                else:
+                    targets = [self.__by_address[address]] if address in self.__by_address else []
+                for d in targets:
+                    self.__apply(d, command, body)
+                payload = struct.pack('<H8sB', 1, body[:8], 0)
+            else:
+                error = 0x01
+        frame = struct.pack('<BBIB', 0x03 if type_flag == 0x02 else 0x01, command_id, request_id, error) + payload
+        return struct.pack('<H', len(frame)) + frame
+
+    @staticmethod
+    def __apply(device, command, body):
+        if command == Command.LIGHT_SWITCH:
+            device.powered = bool(body[8])
+        elif command == Command.LIGHT_LUMINANCE:
+            device.luminance = body[8]
+            device.powered = True
+        elif command == Command.LIGHT_TEMPERATURE:
+            (device.temperature,) = struct.unpack_from('<H', body, 8)
+            device.powered = True
+        elif command == Command.LIGHT_COLOR:
+            (device.r, device.g, device.b) = struct.unpack_from('<3B', body, 8)
+            device.powered = True
@@ -0,0 +1,113 @@
+from lightifypy.Command import Command
+from lightifypy.PacketBuilder import PacketBuilder
+from lightifypy.LightifyZone import LightifyZone
+
+
+class BatchResult(object):
+    """
+    Outcome of one command of a batch
+    """
+    def __init__(self, target, command, error=None):
+        self.target = target
+        self.command = command
+        self.error = error
+
+    def succeeded(self):
+        return self.error is None
+
+    def to_string(self):
+        return "BatchResult{{ target={}, command={}, error={} }}".format(
+            self.target.get_name(), self.command.name, self.error)
+
+
+class BatchReport(object):
+    """
+    Per-target outcome of a sent batch
+    """
+    def __init__(self, results):
+        self.results = results
+
+    def succeeded(self):
+        return [result for result in self.results if result.succeeded()]
+
+    def failed(self):
+        return [result for result in self.results if not result.succeeded()]
+
+    def ok(self):
+        for result in self.results:
+            if not result.succeeded():
+                return False
+        return True
+
+    def __len__(self):
+        return len(self.results)
+
+
+class LightifyBatch(object):
+    """
+    Collector of switch/luminance/rgb/temperature commands which are encoded into one buffer and written to the
+    gateway at once. Local state of every luminary is updated only for accepted commands
+    """
+    def __init__(self, link):
+        self.__link = link
+        self.__operations = []
+        self.report = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.send()
+        return False
+
+    def __add(self, target, command, builder, apply):
+        packet = builder.on(command).with_(target).build()
+        self.__operations.append((packet, command, target, apply))
+        return self
+
+    def set_status(self, target, powered):
+        if isinstance(target, LightifyZone) and not powered:
+            self.set_luminance(target, 0, 0)
+        return self.__add(target, Command.LIGHT_SWITCH, PacketBuilder(self.__link).switching(powered),
+                          lambda: target.update_powered(powered))
+
+    def set_luminance(self, target, millis, lums):
+        def apply():
+            target.update_luminance(lums)
+            target.update_powered(True)
+        return self.__add(target, Command.LIGHT_LUMINANCE, PacketBuilder(self.__link).luminance(lums).millis(millis),
+                          apply)
+
+    def set_rgb(self, target, r, g, b, millis):
+        def apply():
+            target.update_rgb(r, g, b)
+            target.update_powered(True)
+        return self.__add(target, Command.LIGHT_COLOR, PacketBuilder(self.__link).rgb(r, g, b).millis(millis), apply)
+
+    def set_temperature(self, target, temperature, millis):
+        def apply():
+            target.update_temperature(temperature)
+            target.update_powered(True)
+        return self.__add(target, Command.LIGHT_TEMPERATURE,
+                          PacketBuilder(self.__link).temperature(temperature).millis(millis), apply)
+
+    def __len__(self):
+        return len(self.__operations)
+
+    def send(self):
+        """
+        Write all collected commands and check every reply
+        :return BatchReport: outcome per command, failures do not stop the rest of the batch
+        """
+        operations, self.__operations = self.__operations, []
+        results = []
+        if operations:
+            errors = self.__link.send_many([(packet, command) for (packet, command, target, apply) in operations])
+            for (packet, command, target, apply), error in zip(operations, errors):
+                if error is None:
+                    apply()
+                    self.__link.notify_commanded(target)
+                results.append(BatchResult(target, command, error))
+        self.report = BatchReport(results)
+        return self.report
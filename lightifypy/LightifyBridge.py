@@ -0,0 +1,357 @@
+from lightifypy import CommandPipeline
+from lightifypy.Capability import Capability
+from lightifypy.Errors import LightifyException
+from lightifypy.LightifyFleet import LightifyFleet
+from lightifypy.LightifyZone import LightifyZone
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import struct
+import time
+
+
+class ClientStats(object):
+    """
+    Counters of one client connection of the bridge
+    """
+    __slots__ = ('peer', 'connected_at', 'requests', 'errors', 'merged', 'gateway_requests', 'bytes_in',
+                 'bytes_out', 'queue_time', 'max_queue_time', 'service_time')
+
+    def __init__(self, peer):
+        self.peer = peer
+        self.connected_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        # reads answered by a gateway request another client started
+        self.merged = 0
+        self.gateway_requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # seconds gateway work waited for a worker thread
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+        self.service_time = 0.0
+
+    def to_dict(self):
+        result = dict((name, getattr(self, name)) for name in self.__slots__)
+        elapsed = time.time() - self.connected_at
+        result['requests_per_second'] = self.requests / elapsed if elapsed > 0 else 0.0
+        return result
+
+
+class LightifyBridge(object):
+    """
+    Local daemon sharing one connection per gateway between many clients. Devices and zones are discovered once
+    and served from the cache of the links, commands of all clients are multiplexed onto the shared connections
+    and identical reads which are in flight at the same time cost one gateway request.
+
+    Clients send one JSON object per line and get one per line back, carrying the same "id":
+
+        {"id": 1, "op": "devices"}
+        {"id": 2, "op": "zones", "gateway": "192.168.1.50:4000"}
+        {"id": 3, "op": "refresh", "target": "Kitchen", "max_age": 5}
+        {"id": 4, "op": "update"}
+        {"id": 5, "op": "set", "target": "zone::2", "action": "rgb", "rgb": "#ff8000", "millis": 500}
+        {"id": 6, "op": "stats"}
+
+    Answers are {"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false, "error": "..."}. Targets are
+    resolved like CommandPipeline.find_target(), a zone uid needs "gateway" or the '<gateway>/zone::<id>' form
+    when the bridge serves several gateways
+    """
+    def __init__(self, gateways, host='127.0.0.1', port=4001, window=4, workers=4, fleet_factory=LightifyFleet):
+        """
+        :param gateways: list of addresses or (address, port) tuples, see LightifyFleet.LightifyFleet
+        :param window(int): Requests in flight per gateway connection
+        :param workers(int): Threads running gateway requests
+        """
+        self.__logger = logging.getLogger('lightfypy')
+        self.__host = host
+        self.__port = port
+        self.__fleet = fleet_factory(gateways, window)
+        self.__links = self.__fleet.get_links()
+        self.__pool = ThreadPoolExecutor(workers)
+        self.__inflight = {}
+        self.__clients = {}
+        self.__connections = {}
+        self.__closed = []
+        self.__server = None
+        self.pending = 0
+        self.merged = 0
+        self.gateway_requests = 0
+
+    @property
+    def address(self):
+        """
+        :return: (host, port) the bridge listens on, the port is known once started
+        """
+        if self.__server is not None and self.__server.sockets:
+            return self.__server.sockets[0].getsockname()[:2]
+        return self.__host, self.__port
+
+    async def start(self):
+        self.__server = await asyncio.start_server(self.__serve, self.__host, self.__port)
+        self.__logger.info("Bridge listening on {}:{}".format(*self.address))
+        return self
+
+    async def serve_forever(self):
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+        # ending the connections lets their handlers finish the requests already read
+        for writer in self.__connections.values():
+            writer.close()
+        handlers = list(self.__connections)
+        if handlers:
+            await asyncio.wait(handlers)
+        self.__pool.shutdown()
+        self.__fleet.close()
+
+    async def __serve(self, reader, writer):
+        stats = ClientStats('{}:{}'.format(*writer.get_extra_info('peername')[:2]))
+        self.__clients[id(stats)] = stats
+        self.__connections[asyncio.current_task()] = writer
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                stats.bytes_in += len(line)
+                # every request runs on its own, a slow gateway read does not hold up the next line
+                task = asyncio.ensure_future(self.__answer(line, stats, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.__clients[id(stats)]
+            del self.__connections[asyncio.current_task()]
+            self.__closed = (self.__closed + [stats])[-16:]
+            writer.close()
+
+    async def __answer(self, line, stats, writer, lock):
+        start = time.perf_counter()
+        stats.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError('request has to be a JSON object')
+            request_id = request.get('id')
+            answer = {'id': request_id, 'ok': True, 'result': await self.handle(request, stats)}
+        except (LightifyException, socket.error, ValueError, KeyError) as e:
+            stats.errors += 1
+            answer = {'id': request_id, 'ok': False, 'error': str(e) or type(e).__name__}
+        except Exception as e:
+            # a bug must not leave the client without an answer for this id
+            self.__logger.exception("Request {!r} failed".format(line))
+            stats.errors += 1
+            answer = {'id': request_id, 'ok': False, 'error': 'internal error: {}'.format(e or type(e).__name__)}
+        data = (json.dumps(answer) + '\n').encode('utf-8')
+        stats.service_time += time.perf_counter() - start
+        stats.bytes_out += len(data)
+        async with lock:
+            writer.write(data)
+            await writer.drain()
+
+    async def handle(self, request, stats):
+        """
+        Answer one request
+        :param request(dict): decoded request line
+        :param stats: ClientStats of the client
+        :return: JSON serializable result
+        """
+        op = request.get('op')
+        if op == 'gateways':
+            return self.__fleet.health()
+        if op == 'devices':
+            return [self.__device(key, light) for key, link in self.__gateways(request)
+                    for light in link.get_devices().values()]
+        if op == 'zones':
+            return [self.__zone(key, zone) for key, link in self.__gateways(request)
+                    for zone in link.get_zones().values()]
+        if op == 'stats':
+            return self.stats()
+        if op == 'update':
+            result = {}
+            for key, link in self.__gateways(request):
+                diff = await self.__merged(('update', key), link.update, stats)
+                result[key] = dict((name, len(getattr(diff, name))) for name in
+                                   ('added', 'removed', 'changed', 'zones_added', 'zones_removed', 'zones_changed'))
+            return result
+        (key, luminary) = self.__resolve(request)
+        link = self.__links[key]
+        if op == 'refresh':
+            # STATUS_SINGLE addresses devices only, a zone is refreshed through its members
+            lights = luminary.get_lums() if isinstance(luminary, LightifyZone) else [luminary]
+            max_age = request.get('max_age')
+            if max_age is not None and (isinstance(max_age, bool) or not isinstance(max_age, (int, float))):
+                raise ValueError('max_age has to be a number')
+            await asyncio.gather(*[self.__refresh(key, link, light, max_age, stats) for light in lights])
+        elif op == 'set':
+            command = CommandPipeline.parse_record(request)
+            command.luminary = luminary
+            await self.__run(lambda: CommandPipeline.apply(command, link), stats)
+        elif op != 'get':
+            raise ValueError('unknown op {!r}'.format(op))
+        if isinstance(luminary, LightifyZone):
+            return self.__zone(key, luminary)
+        return self.__device(key, luminary)
+
+    def __refresh(self, key, link, light, max_age, stats):
+        if max_age is not None and link.get_state_age(light) <= max_age:
+            return asyncio.sleep(0)
+        return self.__merged(('refresh', key, light.address()), lambda: link.update_status(light), stats)
+
+    def __gateways(self, request):
+        gateway = request.get('gateway')
+        if gateway is None:
+            return list(self.__links.items())
+        if not isinstance(gateway, str) or gateway not in self.__links:
+            raise ValueError('unknown gateway {!r}'.format(gateway))
+        return [(gateway, self.__links[gateway])]
+
+    def __resolve(self, request):
+        target = request.get('target')
+        if not isinstance(target, str) or not target:
+            raise ValueError('missing target')
+        if '/' in target and 'gateway' not in request:
+            (gateway, target) = target.split('/', 1)
+            request = {'gateway': gateway}
+        found = []
+        for key, link in self.__gateways(request):
+            luminary = CommandPipeline.find_target(link, target)
+            if luminary is not None:
+                found.append((key, luminary))
+        if len(found) != 1:
+            raise ValueError('no unique device or zone {!r}'.format(target))
+        return found[0]
+
+    async def __run(self, fn, stats):
+        """
+        Run blocking gateway work on the worker threads
+        """
+        submitted = time.perf_counter()
+
+        def work():
+            return time.perf_counter(), fn()
+        self.pending += 1
+        self.gateway_requests += 1
+        stats.gateway_requests += 1
+        try:
+            (started, result) = await asyncio.get_event_loop().run_in_executor(self.__pool, work)
+        finally:
+            self.pending -= 1
+        waited = started - submitted
+        stats.queue_time += waited
+        stats.max_queue_time = max(stats.max_queue_time, waited)
+        return result
+
+    async def __merged(self, key, fn, stats):
+        """
+        Run a gateway read, or wait for the identical one already in flight
+        """
+        future = self.__inflight.get(key)
+        if future is not None:
+            stats.merged += 1
+            self.merged += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self.__run(fn, stats))
+        self.__inflight[key] = future
+        future.add_done_callback(lambda done: self.__inflight.pop(key, None))
+        # a client going away must not cancel a read other clients wait for
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def __state(luminary):
+        return {
+            'name': luminary.get_name(),
+            'powered': luminary.is_powered(),
+            'luminance': luminary.get_luminance(),
+            'temperature': luminary.get_temperature(),
+            'rgb': list(luminary.get_rgb()),
+        }
+
+    def __device(self, key, light):
+        mac = struct.unpack('<Q', light.address())[0]
+        state = self.__state(light)
+        state.update({
+            'gateway': key,
+            'mac': '0x{:016x}'.format(mac),
+            'capabilities': [capability.name for capability in Capability
+                             if light.get_capabilities() & capability],
+            'zones': ['zone::{}'.format(zone.get_zone_id())
+                      for zone in self.__links[key].get_registry().zones_of(mac)],
+        })
+        return state
+
+    def __zone(self, key, zone):
+        state = self.__state(zone)
+        state.update({
+            'gateway': key,
+            'uid': 'zone::{}'.format(zone.get_zone_id()),
+            'members': ['0x{:016x}'.format(struct.unpack('<Q', light.address())[0]) for light in zone.get_lums()],
+        })
+        return state
+
+    def stats(self):
+        """
+        :return dict: counters of connected and recently closed clients, gateway requests, merged reads and
+        gateway work waiting for a thread
+        """
+        return {
+            'clients': [stats.to_dict() for stats in self.__clients.values()],
+            'closed': [stats.to_dict() for stats in self.__closed],
+            'pending': self.pending,
+            'gateway_requests': self.gateway_requests,
+            'merged': self.merged,
+        }
+
+
+def main(argv=None):
+    """
+    Entry point of the lightify-bridge command
+    """
+    parser = argparse.ArgumentParser(prog='lightify-bridge',
+                                     description='Share Lightify gateway connections between local clients')
+    parser.add_argument('gateways', nargs='+', help='gateway addresses, optionally as address:port')
+    parser.add_argument('--listen', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4001)
+    parser.add_argument('--window', type=int, default=4, help='requests in flight per gateway connection')
+    parser.add_argument('--workers', type=int, default=4, help='threads running gateway requests')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s %(message)s')
+    gateways = []
+    for gateway in args.gateways:
+        (address, _, port) = gateway.partition(':')
+        gateways.append((address, int(port or 4000)))
+    bridge = LightifyBridge(gateways, args.listen, args.port, args.window, args.workers)
+
+    async def serve():
+        try:
+            await bridge.serve_forever()
+        finally:
+            await bridge.close()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+from lightifypy.Errors import LightifyException
+from lightifypy.LightifyLink import LightifyLink
+from lightifypy.LightifyZone import LightifyZone
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import socket
+import struct
+import threading
+import time
+
+
+class GatewayHealth(object):
+    """
+    Connection state and counters of one gateway of a fleet
+    """
+    __slots__ = ('gateway', 'connected', 'discovery_time', 'last_update', 'commands', 'failures', 'last_latency',
+                 'last_error', 'devices', 'zones')
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.connected = False
+        self.discovery_time = None
+        self.last_update = None
+        self.commands = 0
+        self.failures = 0
+        self.last_latency = None
+        self.last_error = None
+        self.devices = 0
+        self.zones = 0
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class LightifyFleet(object):
+    """
+    Several gateways behind one namespace. Gateways are discovered concurrently, devices are keyed by MAC address
+    and zones by '<gateway>/zone::<id>'. Every command goes to the link of the gateway its target belongs to and
+    batches for different gateways are sent in parallel
+    """
+    def __init__(self, gateways, window=1, max_workers=None, link_factory=LightifyLink):
+        """
+        :param gateways: list of addresses or (address, port) tuples
+        :param window(int): Requests in flight per gateway connection, see LightifyLink
+        :param max_workers(int): Threads used for discovery and parallel sends, defaults to one per gateway
+        :param link_factory: Callable(address, port, window) creating the link of a gateway
+        """
+        self.__logger = logging.getLogger('lightfypy')
+        self.__lock = threading.Lock()
+        self.__links = {}
+        self.__health = {}
+        self.__owners = {}
+        self.__zones = {}
+        endpoints = [gateway if isinstance(gateway, tuple) else (gateway, 4000) for gateway in gateways]
+        self.__pool = ThreadPoolExecutor(max_workers or max(1, len(endpoints)))
+        futures = []
+        for (address, port) in endpoints:
+            key = '{}:{}'.format(address, port)
+            self.__health[key] = GatewayHealth(key)
+            futures.append((key, self.__pool.submit(self.__connect, link_factory, address, port, window)))
+        for key, future in futures:
+            health = self.__health[key]
+            try:
+                (link, elapsed) = future.result()
+            except (LightifyException, socket.error) as e:
+                health.last_error = str(e)
+                self.__logger.error("Gateway {} unavailable: {}".format(key, health.last_error))
+                continue
+            self.__links[key] = link
+            health.connected = True
+            health.discovery_time = elapsed
+            health.last_update = time.time()
+        self.__merge()
+
+    @staticmethod
+    def __connect(link_factory, address, port, window):
+        start = time.perf_counter()
+        link = link_factory(address, port, window)
+        return link, time.perf_counter() - start
+
+    def __merge(self):
+        owners = {}
+        zones = {}
+        for key, link in self.__links.items():
+            health = self.__health[key]
+            macs = link.get_registry().macs_all()
+            for mac in macs:
+                if mac in owners:
+                    self.__logger.warning("Device {} is paired with {} and {}".format(mac, owners[mac], key))
+                owners[mac] = key
+            for uid, zone in link.get_zones().items():
+                zones['{}/{}'.format(key, uid)] = zone
+            health.devices = len(macs)
+            health.zones = len(link.get_zones())
+        with self.__lock:
+            self.__owners = owners
+            self.__zones = zones
+
+    def get_links(self):
+        """
+        :return dict: gateway key -> LightifyLink of every connected gateway
+        """
+        return dict(self.__links)
+
+    def get_devices(self):
+        """
+        :return dict: MAC address -> LightifyLight of all gateways, creates a LightifyLight for every light
+        """
+        devices = ((mac, self.__links[key].get_registry().device(mac)) for mac, key in self.__owners.items())
+        return dict((mac, light) for mac, light in devices if light is not None)
+
+    def get_device(self, mac):
+        """
+        :param mac(int): MAC address
+        :return: LightifyLight of mac, None if it belongs to no gateway of the fleet
+        """
+        key = self.__owners.get(mac)
+        return None if key is None else self.__links[key].get_registry().device(mac)
+
+    def get_zones(self):
+        """
+        :return dict: '<gateway>/zone::<id>' -> LightifyZone of all gateways
+        """
+        return self.__zones
+
+    def gateway_of(self, target):
+        """
+        :param target: LightifyLight, LightifyZone or MAC address
+        :return str: key of the gateway target belongs to
+        """
+        if isinstance(target, LightifyZone):
+            for key, link in self.__links.items():
+                if link is target.link:
+                    return key
+            raise LightifyException('Zone {} belongs to no gateway of the fleet'.format(target.get_name()))
+        mac = target if isinstance(target, int) else struct.unpack('<Q', target.address())[0]
+        key = self.__owners.get(mac)
+        if key is None:
+            raise LightifyException('Device {} belongs to no gateway of the fleet'.format(mac))
+        return key
+
+    def link_of(self, target):
+        """
+        :return LightifyLink: link commands to target are sent through
+        """
+        return self.__links[self.gateway_of(target)]
+
+    def __call(self, key, fn):
+        health = self.__health[key]
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except (LightifyException, socket.error) as e:
+            with self.__lock:
+                health.failures += 1
+                health.last_error = str(e)
+            raise
+        with self.__lock:
+            health.commands += 1
+            health.last_latency = time.perf_counter() - start
+        return result
+
+    def set_status(self, target, powered):
+        key = self.gateway_of(target)
+        return self.__call(key, lambda: self.__links[key].set_status(target, powered))
+
+    def set_luminance(self, target, millis, lums):
+        key = self.gateway_of(target)
+        return self.__call(key, lambda: self.__links[key].set_luminance(target, millis, lums))
+
+    def set_rgb(self, target, r, g, b, millis):
+        key = self.gateway_of(target)
+        return self.__call(key, lambda: self.__links[key].set_rgb(target, r, g, b, millis))
+
+    def set_temperature(self, target, temperature, millis):
+        key = self.gateway_of(target)
+        return self.__call(key, lambda: self.__links[key].set_temperature(target, temperature, millis))
+
+    def batch(self):
+        """
+        Collect commands for luminaries of any gateway. Use as context manager, one batch per gateway is sent in
+        parallel when the block exits
+        :return FleetBatch:
+        """
+        return FleetBatch(self)
+
+    def send_batches(self, batches):
+        """
+        :param batches: dict gateway key -> LightifyBatch.LightifyBatch
+        :return dict: gateway key -> BatchReport, or the exception which stopped the batch
+        """
+        futures = dict((key, self.__pool.submit(self.__call, key, batch.send)) for key, batch in batches.items())
+        reports = {}
+        for key, future in futures.items():
+            try:
+                reports[key] = future.result()
+            except (LightifyException, socket.error) as e:
+                reports[key] = e
+        with self.__lock:
+            for key, report in reports.items():
+                if not isinstance(report, Exception):
+                    self.__health[key].failures += len(report.failed())
+        return reports
+
+    def update(self):
+        """
+        Run update() on all gateways concurrently and merge the results
+        :return dict: gateway key -> UpdateDiff.UpdateDiff, or the exception the update failed with
+        """
+        futures = dict((key, self.__pool.submit(self.__call, key, link.update)) for key, link in self.__links.items())
+        diffs = {}
+        for key, future in futures.items():
+            try:
+                diffs[key] = future.result()
+                self.__health[key].last_update = time.time()
+            except (LightifyException, socket.error) as e:
+                diffs[key] = e
+        self.__merge()
+        return diffs
+
+    def health(self):
+        """
+        :return dict: gateway key -> dict of GatewayHealth fields plus the transport counters of the link
+        """
+        result = {}
+        with self.__lock:
+            for key, health in self.__health.items():
+                result[key] = health.to_dict()
+        for key, link in self.__links.items():
+            result[key]['transport'] = link.get_transport_stats()
+        return result
+
+    def close(self):
+        for link in self.__links.values():
+            link.close()
+        self.__pool.shutdown()
+
+
+class FleetBatch(object):
+    """
+    Commands for luminaries of several gateways, split into one LightifyBatch per gateway
+    """
+    def __init__(self, fleet):
+        self.__fleet = fleet
+        self.__batches = {}
+        self.reports = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.send()
+        return False
+
+    def __batch(self, target):
+        key = self.__fleet.gateway_of(target)
+        batch = self.__batches.get(key)
+        if batch is None:
+            batch = self.__fleet.get_links()[key].batch()
+            self.__batches[key] = batch
+        return batch
+
+    def set_status(self, target, powered):
+        self.__batch(target).set_status(target, powered)
+        return self
+
+    def set_luminance(self, target, millis, lums):
+        self.__batch(target).set_luminance(target, millis, lums)
+        return self
+
+    def set_rgb(self, target, r, g, b, millis):
+        self.__batch(target).set_rgb(target, r, g, b, millis)
+        return self
+
+    def set_temperature(self, target, temperature, millis):
+        self.__batch(target).set_temperature(target, temperature, millis)
+        return self
+
+    def __len__(self):
+        return sum(len(batch) for batch in self.__batches.values())
+
+    def send(self):
+        """
+        :return dict: gateway key -> BatchReport, or the exception which stopped the batch of that gateway
+        """
+        batches, self.__batches = self.__batches, {}
+        self.reports = self.__fleet.send_batches(batches)
+        return self.reports
@@ -3,6 +3,8 @@ import struct
 
 
 class LightifyLight(LightifyLuminary):
+    __slots__ = ('__address',)
+
     def __init__(self, link, name, capabilities, address):
         LightifyLuminary.__init__(self, link, name, capabilities)
         self.__address = struct.pack('<Q', address)
@@ -12,4 +14,4 @@ class LightifyLight(LightifyLuminary):
         return self.__address
 
     def to_string(self):
-        return "LightifyLight{ address={} }".format(self.__address)
\ No newline at end of file
+        return "LightifyLight{ address={} }".format(self.__address)
@@ -1,201 +1,474 @@
 from lightifypy.Command import Command
+from lightifypy.CommandCoalescer import CommandCoalescer
+from lightifypy.CommandDispatcher import CommandDispatcher, Priority
+from lightifypy.ConnectionManager import ConnectionManager
 from lightifypy.PacketBuilder import PacketBuilder
 import struct
 from lightifypy.LightifyZone import LightifyZone
 import socket
-import sys
 from lightifypy.DeviceType import DeviceType
+from lightifypy.EffectsEngine import EffectsEngine
 from lightifypy.Errors import LightifyException
-from lightifypy.Constant import BITMASK_PURE_WHITE, BITMASK_RGB, BITMASK_TUNABLE_WHITE
-from lightifypy.Capability import Capability
-from lightifypy.LightifyLight import LightifyLight
-import binascii
+from lightifypy.DeviceTable import DeviceTable
+from lightifypy.DeviceRegistry import DeviceRegistry
+from lightifypy.LightifyBatch import LightifyBatch
+from lightifypy.LinkMetrics import LinkMetrics
+from lightifypy.PacketParser import PacketParser
+from lightifypy.PollScheduler import PollScheduler
+from lightifypy.Scene import Scene
+from lightifypy.SingleFlight import SingleFlight
+from lightifypy.StateStore import StateStore
+from lightifypy.TopologySnapshot import TopologySnapshot
+from lightifypy.UpdateDiff import UpdateDiff
+from lightifypy.Transport import PipelinedTransport, SocketTransport
+from lightifypy.WireCapture import CaptureWriter
+import itertools
 import logging
 import threading
+import time
 
 
 class LightifyLink:
     """
     Main class of Lightify connector
     """
-    def __init__(self, address, port=4000):
+    # priority of requests in the dispatcher queue unless the calling thread set one, see CommandDispatcher.priority()
+    PRIORITIES = {
+        Command.STATUS_ALL: Priority.BACKGROUND,
+        Command.ZONE_LIST: Priority.BACKGROUND,
+        Command.ZONE_INFO: Priority.BACKGROUND,
+        Command.STATUS_SINGLE: Priority.NORMAL,
+    }
+
+    def __init__(self, address, port=4000, window=1, snapshot=None, revalidate=True, capture=None, transport=None):
         """
         :param address(str): IP Address of Lightify gateway
         :param port(int): TCP port of Lightify gateway (default 4000)
+        :param window(int): Maximum number of requests in flight on the connection (default 1, no pipelining)
+        :param snapshot(str): Path of a topology snapshot. If it exists, devices and zones are loaded from it and the
+        connection is only opened by the first request, otherwise the discovered topology is saved there
+        :param revalidate(bool): Reconcile a loaded snapshot with the gateway in a background thread
+        :param capture(str): Path of a capture file the traffic is appended to from the first request on, see
+        start_capture()
+        :param transport: Transport to use instead of a connection to address:port, e.g.
+        WireCapture.ReplayTransport
         """
-        self.__charset = "cp437"
         self.__address = address
         self.__zones = {}
         self.__devices = {}
-        self.__seq = 1
+        self.__state_store = StateStore()
+        self.__poll_scheduler = None
+        self.__coalescer = None
+        self.__effects = None
+        self.__dispatcher = None
+        self.__metrics = None
+        self.__wire_hook = None
+        self.__user_wire_hook = None
+        self.__capture = None
+        self.__bulbs = {}
+        self.__others = {}
+        self.__device_table = None
+        self.__registry = DeviceRegistry(self.__find_device, self.__zones.get)
+        self.__seq = itertools.count(2)
         self.__logger = logging.getLogger('lightfypy')
         self.__logger.addHandler(logging.NullHandler())
         self.__logger.info("Logging lightfypy")
         self.__lock = threading.RLock()
+        self.__connected = False
+        self.__snapshot_path = snapshot
+        self.__revalidation = None
+        self.__revalidation_diff = None
+        self.__flights = SingleFlight()
+        # time.monotonic() of the last STATUS_ALL, devices created from its table were confirmed then
+        self.__searched_at = 0.0
         self.logger = self.__logger
+        if transport is not None:
+            self.__transport = transport
+        elif window > 1:
+            self.__transport = ConnectionManager(PipelinedTransport(address, port, window))
+        else:
+            self.__transport = ConnectionManager(SocketTransport(address, port))
+        if capture:
+            self.start_capture(capture)
+        loaded = TopologySnapshot.load(snapshot) if snapshot else None
+        if loaded is not None:
+            self.__apply_snapshot(loaded)
+            if revalidate:
+                self.__revalidation = threading.Thread(target=self.__revalidate, name='lightifypy-revalidation',
+                                                       daemon=True)
+                self.__revalidation.start()
+            return
         with self.__lock:
             try:
-                self.__sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            except socket.error as msg:
-                self.__logger.error(msg[1])
-                sys.exit(1)
-            try:
-                self.__sock.connect((address, port))
-            except socket.error as msg:
-                self.__logger.error(msg[1])
-                sys.exit(2)
+                self.__transport.connect()
+                self.__connected = True
+            except socket.error as e:
+                raise LightifyException('Cannot connect to {}: {}'.format(address, e))
 
             self.update()
+        if snapshot:
+            self.save_snapshot(snapshot)
+
+    def __ensure_connected(self):
+        """
+        Open the connection on first use when the topology came from a snapshot
+        """
+        with self.__lock:
+            if not self.__connected:
+                try:
+                    self.__transport.connect()
+                except socket.error as e:
+                    raise LightifyException('Cannot connect to {}: {}'.format(self.__address, e))
+                self.__connected = True
+
+    def __apply_snapshot(self, snapshot):
+        diff = UpdateDiff()
+        self.__apply_table(snapshot.table, diff)
+        for (zone_id, name, addresses) in snapshot.zones:
+            zone = LightifyZone(self, name, zone_id)
+            self.__zones[self.__get_zone_uid(zone_id)] = zone
+            self.__registry.add_zone(self.__get_zone_uid(zone_id), name)
+            self.__apply_zone_members(zone, addresses)
+        self.__logger.info("Loaded %d devices and %d zones from snapshot of %.0fs ago", len(self.__bulbs),
+                           len(self.__zones), snapshot.age())
+
+    def __revalidate(self):
+        try:
+            # membership may have changed while the snapshot was on disk, so every zone is requested again
+            diff = UpdateDiff()
+            self.__perform_search(diff)
+            self.__fill_zone_list(diff, True)
+            self.__revalidation_diff = diff
+            if diff:
+                self.__logger.info("Snapshot revalidated: %s", self.__revalidation_diff.to_string())
+            self.save_snapshot(self.__snapshot_path)
+        except (LightifyException, socket.error) as e:
+            self.__logger.warning("Revalidation of snapshot failed: {}".format(e))
 
     def __next_seq(self):
         """
-        Generation of new sequence for packet ID
+        Generation of new sequence for packet ID. Safe to call from several threads
         :return int:
         """
-        self.__seq += 1
-        return self.__seq
+        return next(self.__seq) & 0xFFFFFFFF
 
     def next_seq(self):
         return self.__next_seq()
 
-    def __send(self, data):
+    def __fill_zone_list(self, diff, devices_changed):
         """
-        Sending data to a socket
-        :param data: Buffer to send
-        :return None: if success
+        Filling zones list. Zones which are already known are kept, their membership is only requested again when
+        they were renamed or when devices appeared or disappeared
+        :param diff: UpdateDiff.UpdateDiff collecting the changes
+        :param devices_changed(bool): True if the last search found new or removed devices
         """
-        return self.__sock.sendall(data)
+        command = Command.ZONE_LIST
+        packet = PacketBuilder(self).on(command).build()
+        seen = set()
+        for (zone_id, name) in self.__do_read(packet, command, PacketParser.parse_zone_list):
+            uid = self.__get_zone_uid(zone_id)
+            seen.add(uid)
+            zone = self.__zones.get(uid)
+            if zone is None:
+                zone = LightifyZone(self, name, zone_id)
+                self.__zones[uid] = zone
+                self.__registry.add_zone(uid, name)
+                diff.zones_added.append(uid)
+                self.__handle_zone_info(zone)
+                continue
+            renamed = zone.get_name() != name
+            if renamed:
+                diff.zones_changed.setdefault(uid, {})['name'] = (zone.get_name(), name)
+                zone.update_name(name)
+                self.__registry.rename_zone(uid, name)
+            if renamed or devices_changed:
+                self.__handle_zone_info(zone, diff)
+        for uid in list(self.__zones):
+            if uid not in seen:
+                self.__zones.pop(uid).release()
+                self.__registry.remove_zone(uid)
+                diff.zones_removed.append(uid)
 
-    def __read_packet(self):
+    def __do_read(self, packet, command, decode=None):
         """
-        Read data from socket
-        :return: bytes readed from socket
+        Main read function. This function sends data to socket than read response and check validity of received data
+        :param packet: Bytes to be sent
+        :param command: Command to be send. See Command.Command class to get more info
+        :param decode: Callable turning the reply into a result. It gets a memoryview which is only valid during the
+        call
+        :return: result of decode, None without decode
         """
-        (size,) = struct.unpack('<H', self.__sock.recv(2))
-        buffer = self.__sock.recv(size)
-        return buffer
+        dispatcher = self.__dispatcher
+        if dispatcher is not None and not dispatcher.is_worker():
+            priority = CommandDispatcher.current_priority(self.PRIORITIES.get(command, Priority.INTERACTIVE))
+            return dispatcher.call(lambda: self.__do_read(packet, command, decode), priority)
+        if not self.__connected:
+            self.__ensure_connected()
+        if self.__metrics is None and self.__wire_hook is None:
+            def checked(buff):
+                self.__check_reply(packet, buff, command)
+                return decode(buff) if decode else None
+            return self.__transport.request(packet, checked)
+        return self.__do_read_observed(packet, command, decode)
 
-    def __fill_zone_list(self):
+    def __do_read_observed(self, packet, command, decode):
         """
-        Filling zones list
+        __do_read feeding metrics and wire hook
         """
-        command = Command.ZONE_LIST
-        packet = PacketBuilder(self).on(command).build()
-        buffer = self.__do_read(packet, command)
-        (num,) = struct.unpack("<H", buffer[7:9])
-        for i in range(0, num):
-            pos = 9 + i * 18
-            payload = buffer[pos:pos + 18]
-            (zone_id, name) = struct.unpack("<H16s", payload)
-            name = self.__clean_name(name.decode(self.__charset))
-            zone = LightifyZone(self, name, zone_id)
-            self.__zones[self.__get_zone_uid(zone_id)] = zone
-            self.__handle_zone_info(zone)
+        metrics = self.__metrics
+        wire_hook = self.__wire_hook
+        error = [None]
+
+        def checked(buff):
+            if wire_hook is not None:
+                wire_hook('received', command, buff)
+            if metrics is not None:
+                metrics.received(command, buff)
+            error[0] = buff[6]
+            self.__check_reply(packet, buff, command)
+            return decode(buff) if decode else None
 
-    def __do_read(self, packet, command):
+        if wire_hook is not None:
+            wire_hook('sent', command, packet)
+        if metrics is None:
+            return self.__transport.request(packet, checked)
+        metrics.started()
+        metrics.sent(len(packet))
+        start = time.perf_counter()
+        try:
+            return self.__transport.request(packet, checked)
+        finally:
+            metrics.finished(command, time.perf_counter() - start, error[0])
+
+    def __check_reply(self, packet, buff, command):
         """
-        Main read function. This function sends data to socket than read response and check validity of received data
-        :param packet: Bytes to be sent
-        :param command: Command to be send. See Command.Command class to get more info
-        :return: bytes of received data
+        Check validity of received data
+        :raise LightifyException: if the gateway reported an error
         """
-        self.__lock.acquire()
-        self.__send(packet)
-        buff = self.__read_packet()
-        (error,) = self.__handle_header(packet, buff, command)
+        error = PacketParser.parse_header(packet, buff, command)
         if error != 0x00:
             sent = packet.upper()
-            received = buff.upper()
+            received = bytes(buff).upper()
             self.__logger.error("Packet content, sent: {}, received: {}".format(sent, received))
-            self.__logger.error("Error code: 0x{}, command: {}".format(error, command.name))
+            self.__logger.error("Error code: 0x{:02x}, command: {}".format(error, command.name))
             raise LightifyException('Error Stacktrace')
-        self.__lock.release()
-        return buff
 
-    @staticmethod
-    def __clean_name(name):
-        clean_name = ''
-        for ch in name:
-            if ch != chr(0):
-                clean_name += ch
-            else:
-                break
-        return clean_name
+    def send_many(self, requests):
+        """
+        Write several packets to the gateway at once and check every reply
+        :param requests: list of (packet, command) tuples
+        :return: list with None for every accepted request and LightifyException for every failed one
+        """
+        dispatcher = self.__dispatcher
+        if dispatcher is not None and not dispatcher.is_worker():
+            priority = CommandDispatcher.current_priority(Priority.INTERACTIVE)
+            return dispatcher.call(lambda: self.send_many(requests), priority)
+        if not self.__connected:
+            self.__ensure_connected()
+        by_request_id = dict((PacketParser.packet_request_id(packet), (packet, command))
+                             for (packet, command) in requests)
+        metrics = self.__metrics
+        wire_hook = self.__wire_hook
+        error_codes = {}
+
+        def checked(buff):
+            request_id = PacketParser.reply_request_id(buff)
+            (packet, command) = by_request_id[request_id]
+            if wire_hook is not None:
+                wire_hook('received', command, buff)
+            if metrics is not None:
+                metrics.received(command, buff)
+                error_codes[request_id] = buff[6]
+            self.__check_reply(packet, buff, command)
+
+        packets = [packet for (packet, command) in requests]
+        if wire_hook is not None:
+            for (packet, command) in requests:
+                wire_hook('sent', command, packet)
+        if metrics is None:
+            results = self.__transport.request_many(packets, checked)
+        else:
+            metrics.started(len(packets))
+            metrics.sent(sum(len(packet) for packet in packets))
+            start = time.perf_counter()
+            try:
+                results = self.__transport.request_many(packets, checked)
+            finally:
+                metrics.finished_batch([(command, error_codes.get(PacketParser.packet_request_id(packet)))
+                                        for (packet, command) in requests], time.perf_counter() - start)
+        return [result if isinstance(result, LightifyException) else None for result in results]
 
-    def __handle_zone_info(self, zone):
+    def batch(self):
+        """
+        Collect commands for many luminaries and send them in one write. Use as context manager, the batch is sent
+        when the block exits
+        :return LightifyBatch.LightifyBatch:
+        """
+        return LightifyBatch(self)
+
+    def scene(self, millis=0):
+        """
+        :param millis(int): Transition time of luminance, temperature and color changes
+        :return Scene.Scene: empty scene, fill it with Scene.set() and pass it to apply_scene()
+        """
+        return Scene(millis)
+
+    def plan_scene(self, scene):
+        """
+        Commands apply_scene() would send, based on the cached state of all luminaries
+        :return Scene.ScenePlan:
+        """
+        return scene.plan(list(self.__zones.values()))
+
+    def apply_scene(self, scene):
+        """
+        Bring all luminaries of scene into their target state with as few packets as possible. Values which already
+        match the cached state are skipped and zones whose members share a target get one zone-addressed command. All
+        commands are written in one batch
+        :return Scene.SceneReport: packets sent and saved, plus outcome per command
         """
-        Filling zone information and grouping devices by zones.
+        return self.plan_scene(scene).apply(self)
+
+    def __handle_zone_info(self, zone, diff=None):
+        """
+        Filling zone information and grouping devices by zones. Concurrent calls for the same zone share one request
         :param zone: Zone instance of LightifyZone.LightifyZone class
+        :param diff: UpdateDiff.UpdateDiff collecting membership changes of a known zone
         """
+        found = self.__flights.do((Command.ZONE_INFO, zone.get_zone_id()), lambda: self.__perform_zone_info(zone))
+        if diff is not None:
+            diff.merge(found)
+
+    def __perform_zone_info(self, zone):
         command = Command.ZONE_INFO
         packet = PacketBuilder(self).on(command).with_(zone).build()
-        data = self.__do_read(packet, command)
-        payload = data[7:]
-        (zone_id, name, num) = struct.unpack("<H16sB", payload[:19])
-        name = self.__clean_name(name.decode(self.__charset))
-        self.__logger.debug("Idx %d: '%s' %d", zone_id, name, num)
-        zone = self.__zones[self.__get_zone_uid(zone_id)]
-        for i in range(0, num):
-            pos = 7 + 19 + i * 8
-            payload = data[pos:pos + 8]
-            (addr,) = struct.unpack("<Q", payload[:8])
-            light = self.__find_device(addr)
-            zone.add_device(light)
-
-    def __perform_search(self):
-        """
-        Search all devices attached to the Lightify network
+        (zone_id, name, addresses) = self.__do_read(packet, command, PacketParser.parse_zone_info)
+        self.__logger.debug("Idx %d: '%s' %d", zone_id, name, len(addresses))
+        diff = UpdateDiff()
+        self.__apply_zone_members(zone, addresses, diff)
+        return diff
+
+    def __apply_zone_members(self, zone, addresses, diff=None):
+        """
+        Bring membership of zone in line with addresses, addresses of unknown devices are skipped
         """
+        current = dict((struct.unpack('<Q', light.address())[0], light) for light in zone.get_lums())
+        addresses = [addr for addr in addresses if addr in self.__bulbs]
+        members = set(addresses)
+        added = [addr for addr in addresses if addr not in current]
+        removed = [addr for addr in current if addr not in members]
+        uid = self.__get_zone_uid(zone.get_zone_id())
+        for addr in removed:
+            zone.remove_device(current[addr])
+            self.__registry.leave(uid, addr)
+        for addr in added:
+            zone.add_device(self.__find_device(addr))
+            self.__registry.join(uid, addr)
+        if diff is not None and (added or removed):
+            diff.zones_changed.setdefault(uid, {})['members'] = (added, removed)
+
+    @staticmethod
+    def __state_of_row(row):
+        (address, type_id, zone_id, powered, lum, temp, r, g, b, name) = row
+        return name, powered, lum, temp, (r, g, b)
+
+    def __perform_search(self, diff):
+        """
+        Search all devices attached to the Lightify network. Devices which are already known are updated in place.
+        Concurrent searches share one request
+        :param diff: UpdateDiff.UpdateDiff collecting the changes
+        """
+        diff.merge(self.__flights.do(Command.STATUS_ALL, self.__search))
+
+    def __search(self):
         command = Command.STATUS_ALL
         packet = PacketBuilder(self).on(command).data(struct.pack('<B', 0x01)).build()
-        data = self.__do_read(packet, command)[7:]
-        (num_of_lights,) = struct.unpack('<H', data[:2])
-        record_size = 50
-        for i in range(0, num_of_lights):
-            pos = 2 + i * record_size
-            payload = data[pos:pos + record_size]
-
-            (device_id, device_address, dev_type) = struct.unpack('<HQB', payload[:11])
-            (zone_id, status) = struct.unpack('<H?', payload[16:19])
-            (lum, temp, r, g, b, w) = struct.unpack('<BHBBBB', payload[19:26])
-            name = self.__clean_name(payload[26:].decode(self.__charset))
-            device_type = DeviceType.find_by_type_id(dev_type)
-            if device_type != DeviceType.Bulb:
-                self.__logger.warning("Found unsupported Lightify device, type id: {}. Skipping.".format(dev_type))
+        table = self.__do_read(packet, command, DeviceTable.from_status_all)
+        diff = UpdateDiff()
+        self.__apply_table(table, diff)
+        self.__searched_at = time.monotonic()
+        self.__state_store.confirm([light.get_slot() for light in list(self.__devices.values())],
+                                   self.__searched_at)
+        return diff
+
+    def __apply_table(self, table, diff):
+        """
+        Make table the current state of all devices, known LightifyLight objects are updated in place
+        """
+        bulbs = table.select(DeviceType.Bulb.value)
+        others = {}
+        if len(bulbs) != len(table):
+            for i in sorted(set(range(len(table))) - set(bulbs)):
+                mac = int(table.addresses[i])
+                type_id = int(table.types[i])
+                others[mac] = (DeviceType.find_by_type_id(type_id), table.name(i))
+                if mac in self.__others:
+                    self.__registry.rename_device(mac, others[mac][1])
+                    continue
+                self.__logger.warning("Found unsupported Lightify device {}, type id: {}. Skipping.".format(
+                    others[mac][0].name, type_id))
+                # no light, but indexed, so queries by type or capability find it
+                self.__registry.add_device(mac, others[mac][1], type_id)
+        for mac in self.__others:
+            if mac not in others:
+                self.__registry.remove_device(mac)
+        self.__others = others
+        old_table = self.__device_table
+        old_bulbs = self.__bulbs
+        self.__device_table = table
+        self.__bulbs = dict((int(table.addresses[i]), i) for i in bulbs)
+        for mac, i in self.__bulbs.items():
+            j = old_bulbs.get(mac)
+            if j is None:
+                diff.added.append(mac)
+                self.__registry.add_device(mac, table.name(i), int(table.types[i]))
+                continue
+            new = self.__state_of_row(table.row(i))
+            light = self.__devices.get(mac)
+            if light is None:
+                old = self.__state_of_row(old_table.row(j))
+            else:
+                old = (light.get_name(), light.is_powered(), light.get_luminance(), light.get_temperature(),
+                       light.get_rgb())
+            if old == new:
                 continue
-            is_rgb = (dev_type & BITMASK_RGB) == BITMASK_RGB
-            is_tunable_white = (dev_type & BITMASK_TUNABLE_WHITE) == BITMASK_TUNABLE_WHITE
-            is_pure_white = (dev_type & BITMASK_PURE_WHITE) == BITMASK_PURE_WHITE
-            capabilities = []
-            if is_rgb:
-                capabilities.append(Capability.RGB)
-            if is_tunable_white:
-                capabilities.append(Capability.TunableWhite)
-            if is_pure_white:
-                capabilities.append(Capability.PureWhite)
-            light = LightifyLight(self, name, capabilities, device_address)
-            light.update_luminance(lum)
-            light.update_powered(status)
-            light.update_rgb(r, g, b)
-            light.update_temperature(temp)
-            (mac,) = struct.unpack('<Q', light.address())
-            self.__devices[mac] = light
+            diff.changed[mac] = dict((field, (o, n)) for field, o, n in zip(UpdateDiff.FIELDS, old, new) if o != n)
+            if old[0] != new[0]:
+                self.__registry.rename_device(mac, new[0])
+            if light is not None:
+                (name, powered, lum, temp, rgb) = new
+                light.update_name(name)
+                light.update_powered(powered)
+                light.update_luminance(lum)
+                light.update_temperature(temp)
+                light.update_rgb(*rgb)
+        for mac in old_bulbs:
+            if mac not in self.__bulbs:
+                diff.removed.append(mac)
+                self.__registry.remove_device(mac)
+                light = self.__devices.pop(mac, None)
+                if light is not None:
+                    for zone in self.__zones.values():
+                        if light in zone.get_lums():
+                            zone.remove_device(light)
+                    light.release()
 
     def __perform_status_update(self, luminary):
         command = Command.STATUS_SINGLE
         packet = PacketBuilder(self).on(command).with_(luminary).build()
-        buffer = self.__do_read(packet, command)
-        (on, lum, temp, red, green, blue, h) = struct.unpack("<27x2BH4B16x", buffer)
+        (on, lum, temp, red, green, blue) = self.__do_read(packet, command, PacketParser.parse_status_single)
         luminary.update_powered(on)
-        luminary.set_luminance(lum)
-        luminary.set_temperature(temp)
-        luminary.set_rgb(red, green, blue)
+        luminary.update_luminance(lum)
+        luminary.update_temperature(temp)
+        luminary.update_rgb(red, green, blue)
+        self.__state_store.confirm((luminary.get_slot(),))
 
     def __perform_switch(self, luminary, activate):
         command = Command.LIGHT_SWITCH
         packet = PacketBuilder(self).on(command).with_(luminary).switching(activate).build()
         self.__do_read(packet, command)
         luminary.update_powered(activate)
+        self.notify_commanded(luminary)
 
     def __perform_luminance(self, luminary, millis, luminance):
         command = Command.LIGHT_LUMINANCE
@@ -203,6 +476,7 @@ class LightifyLink:
         self.__do_read(packet, command)
         luminary.update_luminance(luminance)
         luminary.update_powered(True)
+        self.notify_commanded(luminary)
 
     def __perform_rgb(self, luminary, r, g, b, millis):
         command = Command.LIGHT_COLOR
@@ -210,6 +484,7 @@ class LightifyLink:
         self.__do_read(packet, command)
         luminary.update_rgb(r, g, b)
         luminary.update_powered(True)
+        self.notify_commanded(luminary)
 
     def __perform_temperature(self, luminary, temperature, millis):
         command = Command.LIGHT_TEMPERATURE
@@ -217,23 +492,7 @@ class LightifyLink:
         self.__do_read(packet, command)
         luminary.update_temperature(temperature)
         luminary.update_powered(True)
-
-    @staticmethod
-    def __handle_header(packet, buffer, command):
-        """
-        :param packet: Data which was send to the Lightify gateway
-        :param buffer: Data which was received from Lightify gateway
-        :param command: Command which was sent. See Command.Command class to get more info
-        :return: integer of error code
-        """
-        print(binascii.hexlify(buffer))
-        (status, command_id) = struct.unpack('<BB', buffer[:2])
-        if status != 0x01 and status != 0x03:
-            sent = packet.upper()
-            received = buffer.upper()
-            print("Packet content, sent: {}, received: {}", sent, received)
-            print("Status code: 0x{}, command: {}".format(status, command.name))
-        return struct.unpack('<B', buffer[6:7])
+        self.notify_commanded(luminary)
 
     @staticmethod
     def __get_zone_uid(zone_id):
@@ -245,11 +504,31 @@ class LightifyLink:
 
     def __find_device(self, mac):
         """
-        Return device by mac
+        Return device by mac, LightifyLight is created on first access
         :param mac:
-        :return:
+        :return: None if mac is no light of the last search
         """
-        return self.__devices[mac]
+        light = self.__devices.get(mac)
+        if light is None:
+            # row and table are taken together, an update may replace the table meanwhile
+            table = self.__device_table
+            i = table.index_of(mac) if table is not None and mac in self.__bulbs else None
+            if i is None:
+                return None
+            light = table.light(self, i)
+            self.__state_store.confirm((light.get_slot(),), self.__searched_at)
+            stored = self.__devices.setdefault(mac, light)
+            if stored is not light:
+                light.release()
+                light = stored
+        return light
+
+    def get_state_store(self):
+        """
+        Store holding power, luminance, temperature and rgb of all luminaries of this link
+        :return StateStore.StateStore:
+        """
+        return self.__state_store
 
     def get_zones(self):
         """
@@ -264,25 +543,346 @@ class LightifyLink:
         :return: list of devices
 
         """
+        if len(self.__devices) != len(self.__bulbs):
+            for mac in self.__bulbs:
+                self.__find_device(mac)
         return self.__devices
 
-    def update_status(self, target):
-        self.__perform_status_update(target)
+    def get_other_devices(self):
+        """
+        Devices which are no bulbs, like plugs, motion sensors and switches
+        :return dict: MAC address -> (DeviceType.DeviceType, name)
+        """
+        return self.__others
+
+    def get_registry(self):
+        """
+        Indexes of devices by name, zone, capability and type, kept current by update()
+        :return DeviceRegistry.DeviceRegistry:
+        """
+        return self.__registry
+
+    def query(self):
+        """
+        Select devices through the registry indexes, e.g. link.query().zone('Kitchen').capability(Capability.RGB)
+        :return DeviceRegistry.DeviceQuery:
+        """
+        return self.__registry.query()
+
+    def get_transport_stats(self):
+        """
+        Counters of the connection: frames and bytes received, partial reads and receive buffer growths, plus
+        reconnects, retried requests and recovery time, see ConnectionManager.ConnectionManager.stats()
+        :return dict:
+        """
+        return self.__transport.stats()
+
+    def get_device_table(self):
+        """
+        Columnar state of all devices as reported by the last search, without creating LightifyLight objects
+        :return DeviceTable.DeviceTable:
+        """
+        return self.__device_table
+
+    def update_status(self, target, max_age=None):
+        """
+        Refresh state of a device with STATUS_SINGLE, a zone is refreshed through its members. Concurrent refreshes
+        of the same device share one request
+        :param target: LightifyLight or LightifyZone
+        :param max_age(float): Seconds since the state was last confirmed, by a status reply or an accepted command,
+        within which it is returned without asking the gateway. None always asks
+        """
+        lights = target.get_lums() if isinstance(target, LightifyZone) else (target,)
+        store = self.__state_store
+        for light in lights:
+            if max_age is not None and store.age(light.get_slot()) <= max_age:
+                continue
+            self.__flights.do((Command.STATUS_SINGLE, light.address()),
+                              lambda: self.__perform_status_update(light))
+
+    def get_state_age(self, target):
+        """
+        :param target: LightifyLight or LightifyZone, for a zone the age of its least recently confirmed member
+        :return float: seconds since state of target was confirmed by the gateway, infinity if it never was
+        """
+        store = self.__state_store
+        if isinstance(target, LightifyZone):
+            return max([store.age(light.get_slot()) for light in target.get_lums()] or [float('inf')])
+        return store.age(target.get_slot())
+
+    def get_flight_stats(self):
+        """
+        :return dict: status, search and zone requests run and requests which shared the reply of a concurrent one
+        """
+        return self.__flights.stats()
+
+    def __submit(self, target, command, send):
+        """
+        Run command now, or queue it when coalescing or the dispatcher is enabled
+        :return concurrent.futures.Future: while the dispatcher is enabled, None otherwise
+        """
+        if self.__coalescer is not None:
+            self.__coalescer.submit(CommandCoalescer.key(target, command), send)
+        elif self.__dispatcher is not None and not self.__dispatcher.is_worker():
+            return self.__dispatcher.submit(send, CommandDispatcher.current_priority(Priority.INTERACTIVE))
+        else:
+            send()
 
     def set_temperature(self, target, temperature, millis):
-        self.__perform_temperature(target, temperature, millis)
+        return self.__submit(target, Command.LIGHT_TEMPERATURE,
+                             lambda: self.__perform_temperature(target, temperature, millis))
 
     def set_rgb(self, target, r, g, b, millis):
-        self.__perform_rgb(target, r, g, b, millis)
+        return self.__submit(target, Command.LIGHT_COLOR, lambda: self.__perform_rgb(target, r, g, b, millis))
 
     def set_status(self, target, powered):
         if isinstance(target, LightifyZone) and not powered:
-            self.__perform_luminance(target, 0, 0)
-        self.__perform_switch(target, powered)
+            def send():
+                self.__perform_luminance(target, 0, 0)
+                self.__perform_switch(target, powered)
+            return self.__submit(target, Command.LIGHT_SWITCH, send)
+        return self.__submit(target, Command.LIGHT_SWITCH, lambda: self.__perform_switch(target, powered))
 
     def set_luminance(self, target, millis, lums):
-        self.__perform_luminance(target, millis, lums)
+        return self.__submit(target, Command.LIGHT_LUMINANCE, lambda: self.__perform_luminance(target, millis, lums))
+
+    def enable_dispatcher(self, workers=1, timeout=None):
+        """
+        Send all requests from dispatcher threads taking work by priority, so set_* jump ahead of polling and
+        discovery. set_* return a concurrent.futures.Future while enabled, other calls block as before
+        :param workers(int): Number of dispatcher threads, more than one only helps with a window above 1
+        :param timeout(float): Seconds a request may wait in the queue before it fails, None waits forever
+        :return CommandDispatcher.CommandDispatcher:
+        """
+        if self.__dispatcher is None:
+            self.__dispatcher = CommandDispatcher(workers, timeout)
+        return self.__dispatcher
+
+    def disable_dispatcher(self, cancel=False):
+        """
+        Send requests from the calling threads again
+        :param cancel(bool): Cancel queued requests, otherwise they are sent first
+        """
+        if self.__dispatcher is not None:
+            dispatcher, self.__dispatcher = self.__dispatcher, None
+            dispatcher.close(cancel)
+
+    def get_dispatcher(self):
+        """
+        :return CommandDispatcher.CommandDispatcher: active dispatcher, None if it is disabled
+        """
+        return self.__dispatcher
+
+    def enable_coalescing(self, rate=10.0, burst=None):
+        """
+        Queue set_* commands instead of sending them right away. Only the newest pending value per target and
+        command is kept and commands are sent at most `rate` per second. set_* return immediately while enabled
+        :return CommandCoalescer.CommandCoalescer:
+        """
+        if self.__coalescer is None:
+            self.__coalescer = CommandCoalescer(rate, burst)
+        return self.__coalescer
+
+    def disable_coalescing(self, flush=True):
+        """
+        Send set_* commands right away again
+        :param flush(bool): Send pending commands first, otherwise they are dropped
+        """
+        if self.__coalescer is not None:
+            coalescer, self.__coalescer = self.__coalescer, None
+            coalescer.close(flush)
+
+    def enable_metrics(self):
+        """
+        Start collecting latency histograms per command, time spent waiting for the connection, bytes on the wire,
+        status and error codes and requests in flight. Costs nothing until enabled
+        :return LinkMetrics.LinkMetrics:
+        """
+        if self.__metrics is None:
+            self.__metrics = LinkMetrics()
+            self.__transport.metrics = self.__metrics
+        return self.__metrics
+
+    def disable_metrics(self):
+        self.__metrics = None
+        self.__transport.metrics = None
+
+    def get_metrics(self):
+        """
+        :return LinkMetrics.LinkMetrics: active metrics, None if metrics are disabled
+        """
+        return self.__metrics
+
+    def set_wire_hook(self, hook):
+        """
+        Debug hook getting every packet sent and every reply received, see LinkMetrics.wire_logger()
+        :param hook: Callable getting (direction, command, data) with direction 'sent' or 'received'. Received data
+        is a memoryview only valid during the call. None removes the hook
+        """
+        self.__user_wire_hook = hook
+        self.__install_wire_hook()
+
+    def __install_wire_hook(self):
+        hook = self.__user_wire_hook
+        capture = self.__capture
+        if hook is None or capture is None:
+            self.__wire_hook = hook or capture
+            return
+
+        def both(direction, command, data):
+            capture(direction, command, data)
+            hook(direction, command, data)
+        self.__wire_hook = both
+
+    def start_capture(self, path):
+        """
+        Append every frame sent and received to a capture file, see WireCapture.CaptureWriter. Replay it with
+        LightifyLink(None, transport=WireCapture.ReplayTransport(path))
+        :return WireCapture.CaptureWriter:
+        """
+        self.stop_capture()
+        self.__capture = CaptureWriter(path)
+        self.__install_wire_hook()
+        return self.__capture
+
+    def stop_capture(self):
+        capture, self.__capture = self.__capture, None
+        if capture is not None:
+            self.__install_wire_hook()
+            capture.close()
+
+    def get_capture(self):
+        """
+        :return WireCapture.CaptureWriter: active capture, None if traffic is not captured
+        """
+        return self.__capture
+
+    def get_coalescer(self):
+        """
+        :return CommandCoalescer.CommandCoalescer: active coalescer, None if coalescing is disabled
+        """
+        return self.__coalescer
+
+    def save_snapshot(self, path=None):
+        """
+        Persist devices and zones, see TopologySnapshot.TopologySnapshot
+        :param path(str): Defaults to the snapshot path the link was created with
+        """
+        zones = [(zone.get_zone_id(), zone.get_name(), [struct.unpack('<Q', light.address())[0]
+                                                        for light in zone.get_lums()])
+                 for zone in list(self.__zones.values())]
+        TopologySnapshot(self.__device_table, zones).save(path or self.__snapshot_path)
+
+    def wait_revalidated(self, timeout=None):
+        """
+        Wait for the background reconciliation of a loaded snapshot with the gateway
+        :return UpdateDiff.UpdateDiff: changes found, None if there was no revalidation, it failed or timed out
+        """
+        if self.__revalidation is not None:
+            self.__revalidation.join(timeout)
+        return self.__revalidation_diff
+
+    def close(self):
+        """
+        Close connection to the gateway
+        """
+        if self.__revalidation is not None:
+            self.__revalidation.join()
+        self.stop_effects()
+        self.stop_polling()
+        self.disable_coalescing(False)
+        self.disable_dispatcher(True)
+        self.stop_capture()
+        self.__transport.close()
+
+    def start_keepalive(self, interval=30.0, timeout=5.0):
+        """
+        Probe the connection with a ZONE_LIST request after `interval` idle seconds. A probe without reply within
+        `timeout` seconds drops the connection and reconnects, see ConnectionManager.ConnectionManager
+        """
+        if not isinstance(self.__transport, ConnectionManager):
+            raise LightifyException('Keepalive needs a connection to a gateway')
+        self.__transport.start_keepalive(lambda: PacketBuilder(self).on(Command.ZONE_LIST).build(), interval, timeout)
+
+    def stop_keepalive(self):
+        if isinstance(self.__transport, ConnectionManager):
+            self.__transport.stop_keepalive()
+
+    def notify_commanded(self, target):
+        """
+        Called after a command to target was accepted by the gateway
+        :param target: LightifyLight or LightifyZone
+        """
+        if isinstance(target, LightifyZone):
+            self.__state_store.confirm([light.get_slot() for light in target.get_lums()])
+        else:
+            self.__state_store.confirm((target.get_slot(),))
+        if self.__poll_scheduler is not None:
+            self.__poll_scheduler.commanded(target)
+
+    def start_polling(self, interval=30.0, commanded_delay=1.0, sweep_threshold=8, budget=4.0):
+        """
+        Start polling status of all devices in a background thread. See PollScheduler.PollScheduler
+        :return PollScheduler.PollScheduler:
+        """
+        if self.__poll_scheduler is None:
+            self.__poll_scheduler = PollScheduler(self, interval, commanded_delay, sweep_threshold, budget)
+            self.__poll_scheduler.start()
+        return self.__poll_scheduler
+
+    def stop_polling(self):
+        if self.__poll_scheduler is not None:
+            self.__poll_scheduler.stop()
+            self.__poll_scheduler = None
+
+    def get_poll_scheduler(self):
+        """
+        :return PollScheduler.PollScheduler: running scheduler, None if polling was not started
+        """
+        return self.__poll_scheduler
+
+    def start_effects(self, max_fps=10.0, min_fps=1.0):
+        """
+        Start the engine playing effects in a background thread. See EffectsEngine.EffectsEngine
+        :return EffectsEngine.EffectsEngine: play effects with EffectsEngine.play()
+        """
+        if self.__effects is None:
+            self.__effects = EffectsEngine(self, max_fps, min_fps).start()
+        return self.__effects
+
+    def stop_effects(self):
+        if self.__effects is not None:
+            self.__effects.stop()
+            self.__effects = None
+
+    def get_effects_engine(self):
+        """
+        :return EffectsEngine.EffectsEngine: running engine, None if effects were not started
+        """
+        return self.__effects
+
+    def refresh_status(self, max_age=None):
+        """
+        Refresh state of all devices with a single STATUS_ALL. Zones are only requested again when devices appeared
+        or disappeared
+        :param max_age(float): Skip the request if the last STATUS_ALL is at most this many seconds old
+        :return UpdateDiff.UpdateDiff:
+        """
+        diff = UpdateDiff()
+        if max_age is not None and self.__searched_at and time.monotonic() - self.__searched_at <= max_age:
+            return diff
+        self.__perform_search(diff)
+        if diff.added or diff.removed:
+            self.__fill_zone_list(diff, True)
+        return diff
 
     def update(self):
-        self.__perform_search()
-        self.__fill_zone_list()
+        """
+        Refresh all devices and zones in place. Objects returned by get_devices() and get_zones() stay the same,
+        ZONE_INFO is only requested for new or renamed zones, or for every zone when devices appeared or disappeared
+        :return UpdateDiff.UpdateDiff: added, removed and changed devices and zones
+        """
+        diff = UpdateDiff()
+        self.__perform_search(diff)
+        self.__fill_zone_list(diff, bool(diff.added or diff.removed))
+        return diff
@@ -2,72 +2,104 @@ from lightifypy.Capability import Capability
 
 
 class LightifyLuminary(object):
+    __slots__ = ('__lightifyLink', '__name', '__capabilities', '__store', '__slot', 'type_flag', '__weakref__')
+
     def __init__(self, link, name, capabilities):
+        """
+        :param capabilities: Capability.Capability flags, or a list of them
+        """
+        if not isinstance(capabilities, Capability):
+            flags = Capability(0)
+            for capability in capabilities:
+                flags |= capability
+            capabilities = flags
         self.__lightifyLink = link
         self.__name = name
         self.__capabilities = capabilities
-        self.__status = False
-        self.__temperature = 0
-        self.__luminance = 0
-        self.__rgb = None
-        self.__address = None
+        self.__store = link.get_state_store()
+        self.__slot = self.__store.allocate(bool(capabilities & Capability.RGB))
         self.type_flag = None
-        self.__online = True
+
+    def release(self):
+        """
+        Free the StateStore.StateStore slot of this luminary. Called by the link when the luminary is gone from the
+        gateway, the object must not be used afterwards
+        """
+        if self.__store is not None:
+            self.__store.release(self.__slot)
+            self.__store = None
 
     def get_name(self):
         return self.__name
 
+    def get_slot(self):
+        """
+        :return int: slot of this luminary in the StateStore.StateStore of its link
+        """
+        return self.__slot
+
     def set_switch(self,  powered):
-        self.__lightifyLink.set_status(self, powered)
+        return self.__lightifyLink.set_status(self, powered)
 
     def set_luminance(self, millis, lum):
-        self.__lightifyLink.set_luminance(self, millis, lum)
+        return self.__lightifyLink.set_luminance(self, millis, lum)
 
     def set_rgb(self, r, g, b, millis):
-        self.__lightifyLink.set_rgb(self, r, g, b, millis)
+        return self.__lightifyLink.set_rgb(self, r, g, b, millis)
 
     def set_temperature(self, temperature, millis):
-        self.__lightifyLink.set_temperature(self, temperature, millis)
+        return self.__lightifyLink.set_temperature(self, temperature, millis)
 
     def supports(self, capability):
-        return capability in self.__capabilities
+        return self.__capabilities & capability == capability
+
+    def get_capabilities(self):
+        """
+        :return Capability.Capability: flags of all capabilities
+        """
+        return self.__capabilities
 
     def is_powered(self):
-        return self.__status
+        return bool(self.__store.powered[self.__slot])
 
     def get_temperature(self):
-        return self.__temperature
+        return self.__store.temperature[self.__slot]
 
     def get_luminance(self):
-        return self.__luminance
+        return self.__store.luminance[self.__slot]
 
     def get_rgb(self):
-        if not self.__rgb:
+        rgb = self.__store.get_rgb(self.__slot)
+        if not rgb:
             return (255, 255, 255)
-        return self.__rgb
+        return rgb
 
     def to_string(self):
         return "LightifyLuminary( name='{}', status={}, temperature={}, luminance={}, rgb={}".format(
-            self.__name, self.__status, self.__temperature, self.__luminance, ','.join(self.__rgb)
+            self.__name, self.is_powered(), self.get_temperature(), self.get_luminance(),
+            ','.join(str(c) for c in self.get_rgb())
         )
 
     def is_rgb(self):
-        return Capability.RGB in self.__capabilities
+        return bool(self.__capabilities & Capability.RGB)
+
+    def update_name(self, name):
+        self.__name = name
 
     def update_temperature(self, temperature):
-        self.__temperature = temperature
+        self.__store.set_temperature(self.__slot, temperature)
 
     def update_luminance(self, luminance):
-        self.__luminance = luminance
+        self.__store.set_luminance(self.__slot, luminance)
 
     def update_rgb(self, r, g, b):
-        self.__rgb = (r, g, b)
+        self.__store.set_rgb(self.__slot, r, g, b)
 
     def update_powered(self, status):
-        self.__status = status
+        self.__store.set_powered(self.__slot, status)
 
     def address(self):
-        return self.__address
+        return None
 
     def update(self):
-        self.__lightifyLink.update()
\ No newline at end of file
+        return self.__lightifyLink.update()
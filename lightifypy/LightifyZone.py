@@ -1,57 +1,42 @@
 from lightifypy.LightifyLuminary import LightifyLuminary
 from lightifypy.Capability import Capability
+from lightifypy.StateStore import ZoneAggregate
 import struct
 
 
 class LightifyZone(LightifyLuminary):
+    __slots__ = ('__zone_id', '__luminaries', '__address', '__aggregate', 'link')
+
     def __init__(self, link, name, zone_id):
-        LightifyLuminary.__init__(self, link, name, [Capability.TunableWhite, Capability.RGB])
+        LightifyLuminary.__init__(self, link, name, Capability.TunableWhite | Capability.RGB)
         self.__zone_id = zone_id
-        self.__name = name
         self.__luminaries = []
         self.__address = struct.pack('<Q', zone_id)
-        self.__lightifyLink = link
-        self.__rgb = None
+        self.__aggregate = ZoneAggregate()
         self.type_flag = 0x02
         self.link = link
 
+    def release(self):
+        store = self.link.get_state_store()
+        for luminary in self.__luminaries:
+            store.leave(luminary.get_slot(), self.__aggregate)
+        self.__luminaries = []
+        LightifyLuminary.release(self)
+
     def address(self):
         return self.__address
 
     def is_powered(self):
-        powered = True
-        for luminary in self.__luminaries:
-            if not luminary.is_powered():
-                powered = False
-                break
-        return powered
+        return self.__aggregate.is_powered()
 
     def get_temperature(self):
-        temperature = -1
-        for luminary in self.__luminaries:
-            if temperature == -1:
-                temperature = luminary.get_temperature()
-            elif temperature != luminary.get_temperature():
-                temperature = 2000
-                break
-        return temperature
+        return self.__aggregate.get_temperature()
 
     def get_luminance(self):
-        luminance = -1
-        for luminary in self.__luminaries:
-            if luminance == -1:
-                luminance = luminary.get_luminance()
-            elif luminance != luminary.get_luminance():
-                luminance = 100
-                break
-        return luminance
+        return self.__aggregate.get_luminance()
 
     def is_rgb(self):
-        for luminary in self.__luminaries:
-            if luminary.supports(Capability.RGB):
-                return True
-        else:
-            return False
+        return self.__aggregate.rgb_members > 0
 
     def get_zone_id(self):
         return self.__zone_id
@@ -62,6 +47,11 @@ class LightifyZone(LightifyLuminary):
 
     def add_device(self, luminary):
         self.__luminaries.append(luminary)
+        self.link.get_state_store().join(luminary.get_slot(), self.__aggregate)
+
+    def remove_device(self, luminary):
+        self.__luminaries.remove(luminary)
+        self.link.get_state_store().leave(luminary.get_slot(), self.__aggregate)
 
     def get_lums(self):
         return self.__luminaries
@@ -73,11 +63,11 @@ class LightifyZone(LightifyLuminary):
     def update_rgb(self, r, g, b):
         for lum in self.__luminaries:
             lum.update_rgb(r, g, b)
-        self.__rgb = (r, g, b)
+        LightifyLuminary.update_rgb(self, r, g, b)
 
     def update_luminance(self, luminance):
         for lum in self.__luminaries:
-            self.__lightifyLink.logger.info('UPDATING STATUS.Ser lum to %s', luminance)
+            self.link.logger.info('UPDATING STATUS.Ser lum to %s', luminance)
             lum.update_luminance(luminance)
 
     def update_temperature(self, temp):
@@ -85,5 +75,6 @@ class LightifyZone(LightifyLuminary):
             lum.update_temperature(temp)
 
     def get_rgb(self):
-        for lum in self.__luminaries:
-            self.__rgb = lum.get_rgb()
+        if self.__luminaries:
+            return self.__luminaries[-1].get_rgb()
+        return LightifyLuminary.get_rgb(self)
@@ -0,0 +1,247 @@
+from lightifypy.Command import Command
+import binascii
+import bisect
+import logging
+import threading
+
+
+class Histogram(object):
+    """
+    Fixed-bucket histogram of durations in seconds, Prometheus style: counts[i] holds observations <= BOUNDS[i],
+    the last bucket everything above
+    """
+    __slots__ = ('counts', 'count', 'sum')
+
+    BOUNDS = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, fraction):
+        """
+        :return float: upper bound of the bucket holding the given fraction of observations, None if empty
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.BOUNDS[i] if i < len(self.BOUNDS) else float('inf')
+        return float('inf')
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': list(zip(self.BOUNDS + (float('inf'),), self.counts)),
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+        }
+
+
+class LinkMetrics(object):
+    """
+    Counters and histograms of the requests of one link. Only maintained while enabled on the link, see
+    LightifyLink.enable_metrics(). Hooks are called after every request with (command, seconds, error) where
+    error is the gateway error code, or None if the request failed without a reply
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__hooks = []
+        self.latency = dict((command, Histogram()) for command in Command)
+        self.batch_latency = Histogram()
+        self.lock_wait = Histogram()
+        self.recovery = Histogram()
+        self.reconnects = 0
+        self.retries = 0
+        self.requests = dict((command, 0) for command in Command)
+        self.errors = dict((command, 0) for command in Command)
+        self.status_codes = {}
+        self.error_codes = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def add_hook(self, hook):
+        """
+        :param hook: Callable getting (command, seconds, error) after every request
+        """
+        self.__hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.__hooks.remove(hook)
+
+    def started(self, count=1):
+        with self.__lock:
+            self.in_flight += count
+            if self.in_flight > self.max_in_flight:
+                self.max_in_flight = self.in_flight
+
+    def sent(self, size):
+        with self.__lock:
+            self.bytes_sent += size
+
+    def waited(self, seconds):
+        """
+        Time a request spent waiting for the connection, before it could be written
+        """
+        with self.__lock:
+            self.lock_wait.observe(seconds)
+
+    def received(self, command, frame):
+        """
+        Count status and error code of a reply frame without length prefix
+        """
+        status = frame[0]
+        error = frame[6] if len(frame) > 6 else None
+        with self.__lock:
+            self.bytes_received += len(frame) + 2
+            self.status_codes[status] = self.status_codes.get(status, 0) + 1
+            if error:
+                self.error_codes[error] = self.error_codes.get(error, 0) + 1
+
+    def finished(self, command, seconds, error):
+        """
+        :param error: Gateway error code, 0 on success, None if the request failed without a reply
+        """
+        with self.__lock:
+            self.in_flight -= 1
+            self.requests[command] += 1
+            self.latency[command].observe(seconds)
+            if error != 0:
+                self.errors[command] += 1
+        for hook in self.__hooks:
+            hook(command, seconds, error)
+
+    def recovered(self, seconds, retried):
+        """
+        The connection was rebuilt after it dropped
+        :param seconds(float): Time from noticing the drop until the new connection was up
+        :param retried(int): In-flight requests sent again on the new connection
+        """
+        with self.__lock:
+            self.reconnects += 1
+            self.retries += retried
+            self.recovery.observe(seconds)
+
+    def finished_batch(self, outcomes, seconds):
+        """
+        :param outcomes: list of (command, error) per request of the batch, see finished()
+        """
+        with self.__lock:
+            self.in_flight -= len(outcomes)
+            self.batch_latency.observe(seconds)
+            for command, error in outcomes:
+                self.requests[command] += 1
+                if error != 0:
+                    self.errors[command] += 1
+
+    def snapshot(self):
+        """
+        :return dict: consistent copy of all counters and histograms
+        """
+        with self.__lock:
+            return {
+                'requests': dict((command.name, count) for command, count in self.requests.items()),
+                'errors': dict((command.name, count) for command, count in self.errors.items()),
+                'latency': dict((command.name, histogram.snapshot()) for command, histogram in self.latency.items()),
+                'batch_latency': self.batch_latency.snapshot(),
+                'lock_wait': self.lock_wait.snapshot(),
+                'recovery': self.recovery.snapshot(),
+                'reconnects': self.reconnects,
+                'retries': self.retries,
+                'status_codes': dict(self.status_codes),
+                'error_codes': dict(self.error_codes),
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+            }
+
+
+class PrometheusExporter(object):
+    """
+    Renders metrics of one or more links in the Prometheus text exposition format
+    """
+    def __init__(self, prefix='lightify'):
+        self.__prefix = prefix
+        self.__links = []
+
+    def register(self, metrics, gateway):
+        """
+        :param metrics: LinkMetrics to export
+        :param gateway(str): Value of the gateway label
+        """
+        self.__links.append((metrics, gateway))
+
+    @staticmethod
+    def __labels(**labels):
+        return '{' + ','.join('{}="{}"'.format(key, value) for key, value in sorted(labels.items())) + '}'
+
+    def __histogram(self, lines, name, histogram, **labels):
+        cumulative = 0
+        for bound, count in histogram['buckets']:
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('{}_bucket{} {}'.format(name, self.__labels(le=le, **labels), cumulative))
+        lines.append('{}_sum{} {!r}'.format(name, self.__labels(**labels), histogram['sum']))
+        lines.append('{}_count{} {}'.format(name, self.__labels(**labels), histogram['count']))
+
+    def render(self):
+        """
+        :return str: all registered metrics
+        """
+        p = self.__prefix
+        snapshots = [(metrics.snapshot(), gateway) for metrics, gateway in self.__links]
+        lines = ['# TYPE {}_request_seconds histogram'.format(p)]
+        for snapshot, gateway in snapshots:
+            for command, histogram in sorted(snapshot['latency'].items()):
+                self.__histogram(lines, p + '_request_seconds', histogram, gateway=gateway, command=command)
+        for name, key in (('batch_seconds', 'batch_latency'), ('lock_wait_seconds', 'lock_wait'),
+                          ('recovery_seconds', 'recovery')):
+            lines.append('# TYPE {}_{} histogram'.format(p, name))
+            for snapshot, gateway in snapshots:
+                self.__histogram(lines, '{}_{}'.format(p, name), snapshot[key], gateway=gateway)
+        for name, key in (('requests_total', 'requests'), ('request_errors_total', 'errors')):
+            lines.append('# TYPE {}_{} counter'.format(p, name))
+            for snapshot, gateway in snapshots:
+                for command, count in sorted(snapshot[key].items()):
+                    lines.append('{}_{}{} {}'.format(p, name, self.__labels(gateway=gateway, command=command), count))
+        for name, key in (('status_codes_total', 'status_codes'), ('error_codes_total', 'error_codes')):
+            lines.append('# TYPE {}_{} counter'.format(p, name))
+            for snapshot, gateway in snapshots:
+                for code, count in sorted(snapshot[key].items()):
+                    lines.append('{}_{}{} {}'.format(
+                        p, name, self.__labels(gateway=gateway, code='0x{:02x}'.format(code)), count))
+        for name, key, kind in (('bytes_sent_total', 'bytes_sent', 'counter'),
+                                ('bytes_received_total', 'bytes_received', 'counter'),
+                                ('reconnects_total', 'reconnects', 'counter'),
+                                ('retries_total', 'retries', 'counter'),
+                                ('in_flight', 'in_flight', 'gauge')):
+            lines.append('# TYPE {}_{} {}'.format(p, name, kind))
+            for snapshot, gateway in snapshots:
+                lines.append('{}_{}{} {}'.format(p, name, self.__labels(gateway=gateway), snapshot[key]))
+        return '\n'.join(lines) + '\n'
+
+
+def wire_logger(logger=None):
+    """
+    Wire hook logging every packet as hex, see LightifyLink.set_wire_hook()
+    :param logger: logging.Logger, defaults to the lightifypy logger
+    """
+    logger = logger or logging.getLogger('lightfypy')
+
+    def hook(direction, command, data):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s %s", direction, command.name, binascii.hexlify(bytes(data)))
+    return hook
@@ -1,6 +1,6 @@
 from lightifypy.Errors import LightifyException
 from lightifypy.Command import Command
-import struct
+from lightifypy.PacketEncoder import PacketEncoder
 
 
 class PacketBuilder(object):
@@ -14,7 +14,6 @@ class PacketBuilder(object):
         self.__luminance = None
         self.__temperature = None
         self.__millis = 0
-        self.__seq = 1
         self.__buffer = bytes()
 
     def with_(self, luminary):
@@ -51,17 +50,20 @@ class PacketBuilder(object):
 
     def build(self):
         self.validate()
-        packet_size = self.calculate_packet_size()
-
         request_id = self.__lightify_link.next_seq()
-        self.put_header(packet_size, request_id)
-        if not self.__luminary:
-            self.put_global()
-        else:
-            self.put_addressable()
-        while len(self.__buffer) < packet_size+2:
-            self.__buffer += struct.pack('<B', 0)
-        return self.__buffer
+        return PacketEncoder.encode(request_id, self.__command, self.__luminary, self.__switching, self.__rgb,
+                                    self.__luminance, self.__temperature, self.__millis, self.__data)
+
+    def build_into(self, buffer, offset=0):
+        """
+        Encode the packet straight into a caller-supplied writable buffer
+        :return int: number of bytes written
+        """
+        self.validate()
+        request_id = self.__lightify_link.next_seq()
+        return PacketEncoder.encode_into(buffer, offset, request_id, self.__command, self.__luminary,
+                                         self.__switching, self.__rgb, self.__luminance, self.__temperature,
+                                         self.__millis, self.__data)
 
     def validate(self):
         command = self.__command
@@ -82,45 +84,19 @@ class PacketBuilder(object):
             assert LightifyException("temperature not set for temperature command")
 
     def calculate_packet_size(self):
-        size = 6 if self.__command.is_broadcast() else 14
-        if self.__luminary:
-            size += 8
-        if self.__switching != -1:
-            size += 1
-        if self.__rgb:
-            size += 6
-        if self.__luminance:
-            size += 3
-        if self.__temperature:
-            size += 4
-        if self.__data:
-            size += len(self.__data)
-        return size
+        return PacketEncoder.packet_size(self.__command, self.__luminary is not None, self.__switching, self.__rgb,
+                                         self.__luminance, self.__temperature, self.__data)
 
     def put_header(self, packet_size, request_id):
-        broadcast_or_unicast = 0x02 if self.__command.is_broadcast() else self.__luminary.type_flag
-        self.__buffer += struct.pack('<H', packet_size)
-        self.__buffer += struct.pack('<B', broadcast_or_unicast)
-        self.__buffer += struct.pack('<B', self.__command.get_id())
-        self.__buffer += struct.pack('<I', request_id)
+        """
+        Append the header to the buffer of this builder. Kept for compatibility, build() encodes whole packets
+        """
+        self.__buffer += PacketEncoder.encode_header(self.__command, self.__luminary, packet_size, request_id)
 
     def put_global(self):
         if self.__command == Command.STATUS_ALL:
             self.__buffer += self.__data
 
     def put_addressable(self):
-        self.__buffer += self.__luminary.address()
-        if self.__command == Command.LIGHT_SWITCH:
-            self.__buffer += struct.pack('<B', 0x01 if self.__switching else 0x00)
-        elif self.__command == Command.LIGHT_TEMPERATURE:
-            self.__buffer += struct.pack('<H', self.__temperature if self.__temperature else 0)
-        elif self.__command == Command.LIGHT_LUMINANCE:
-            self.__buffer += struct.pack('<B', self.__luminance if self.__luminance else 0)
-            self.__buffer += struct.pack('<H', self.__millis)
-        elif self.__command == Command.LIGHT_COLOR:
-            r = self.__rgb[0]
-            g = self.__rgb[1]
-            b = self.__rgb[2]
-            self.__buffer += struct.pack('<3B', r, g, b)
-            self.__buffer += struct.pack('<B', 0xff)
-            self.__buffer += struct.pack('<H', self.__millis)
+        self.__buffer += PacketEncoder.encode_fields(self.__command, self.__luminary, self.__switching, self.__rgb,
+                                                     self.__luminance, self.__temperature, self.__millis)
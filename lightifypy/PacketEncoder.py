@@ -0,0 +1,150 @@
+from lightifypy.Command import Command
+import struct
+
+
+class PacketEncoder(object):
+    """
+    Encoder of Lightify packets. Every packet is written by a single precompiled struct.Struct which already holds
+    the header, the command fields and the zero padding, so encoding is one pack() or pack_into() call
+    """
+    HEADER = '<HBBI'
+    ADDRESS = '8s'
+    BODIES = {
+        Command.STATUS_SINGLE: '',
+        Command.ZONE_INFO: '',
+        Command.LIGHT_SWITCH: 'B',
+        Command.LIGHT_LUMINANCE: 'BH',
+        Command.LIGHT_TEMPERATURE: 'HH',
+        Command.LIGHT_COLOR: '4BH',
+    }
+    COMMANDS = dict((command, (6 if command.is_broadcast() else 14, command.get_id(), command.is_broadcast()))
+                    for command in Command)
+    HEADER_LAYOUT = struct.Struct(HEADER)
+    __layouts = {}
+    __field_layouts = {}
+
+    @staticmethod
+    def packet_size(command, addressed, switching=-1, rgb=None, luminance=None, temperature=None, data=None):
+        """
+        Value of the size field of the packet, the length prefix itself not included
+        :param command: Command to be send. See Command.Command class to get more info
+        :param addressed(bool): True if the packet carries the address of a luminary
+        :return int:
+        """
+        size = PacketEncoder.COMMANDS[command][0]
+        if addressed:
+            size += 8
+        if switching != -1:
+            size += 1
+        if rgb:
+            size += 6
+        if luminance:
+            size += 3
+        if temperature:
+            size += 4
+        if data:
+            size += len(data)
+        return size
+
+    @staticmethod
+    def layout(command, addressed, size, data_length=0):
+        """
+        Precompiled layout of a packet, created once and cached
+        :return struct.Struct:
+        """
+        key = (command, addressed, size, data_length)
+        layout = PacketEncoder.__layouts.get(key)
+        if layout is None:
+            fmt = PacketEncoder.HEADER
+            if addressed:
+                fmt += PacketEncoder.ADDRESS + PacketEncoder.BODIES.get(command, '')
+            elif command == Command.STATUS_ALL and data_length:
+                fmt += '{}s'.format(data_length)
+            padding = size + 2 - struct.calcsize(fmt)
+            if padding > 0:
+                fmt += '{}x'.format(padding)
+            layout = struct.Struct(fmt)
+            PacketEncoder.__layouts[key] = layout
+        return layout
+
+    @staticmethod
+    def __fields(command, luminary, switching, rgb, luminance, temperature, millis):
+        values = [luminary.address()]
+        if command == Command.LIGHT_SWITCH:
+            values.append(0x01 if switching else 0x00)
+        elif command == Command.LIGHT_TEMPERATURE:
+            values.extend((temperature if temperature else 0, millis))
+        elif command == Command.LIGHT_LUMINANCE:
+            values.extend((luminance if luminance else 0, millis))
+        elif command == Command.LIGHT_COLOR:
+            values.extend((rgb[0], rgb[1], rgb[2], 0xff, millis))
+        return values
+
+    @staticmethod
+    def encode_header(command, luminary, size, request_id):
+        """
+        :param size(int): Value of the size field, see packet_size()
+        :return bytes: length prefix, flag, command id and request id
+        """
+        (base_size, command_id, broadcast) = PacketEncoder.COMMANDS[command]
+        type_flag = 0x02 if broadcast else luminary.type_flag
+        return PacketEncoder.HEADER_LAYOUT.pack(size, type_flag, command_id, request_id)
+
+    @staticmethod
+    def encode_fields(command, luminary, switching=-1, rgb=None, luminance=None, temperature=None, millis=0):
+        """
+        :return bytes: address and command fields of an addressed packet, without header and padding
+        """
+        values = PacketEncoder.__fields(command, luminary, switching, rgb, luminance, temperature, millis)
+        layout = PacketEncoder.__field_layouts.get(command)
+        if layout is None:
+            layout = struct.Struct('<' + PacketEncoder.ADDRESS + PacketEncoder.BODIES.get(command, ''))
+            PacketEncoder.__field_layouts[command] = layout
+        return layout.pack(*values)
+
+    @staticmethod
+    def __prepare(request_id, command, luminary, switching, rgb, luminance, temperature, millis, data):
+        (base_size, command_id, broadcast) = PacketEncoder.COMMANDS[command]
+        if luminary is None:
+            # global commands carry nothing but the header and the data of STATUS_ALL
+            data_length = len(data) if data else 0
+            size = base_size + data_length
+            layout = PacketEncoder.__layouts.get((command, False, size, data_length))
+            if layout is None:
+                layout = PacketEncoder.layout(command, False, size, data_length)
+            if command == Command.STATUS_ALL and data_length:
+                return layout, (size, 0x02, command_id, request_id, data)
+            return layout, (size, 0x02, command_id, request_id)
+        size = PacketEncoder.packet_size(command, True, switching, rgb, luminance, temperature, data)
+        layout = PacketEncoder.layout(command, True, size, len(data) if data else 0)
+        type_flag = 0x02 if broadcast else luminary.type_flag
+        values = [size, type_flag, command_id, request_id]
+        values.extend(PacketEncoder.__fields(command, luminary, switching, rgb, luminance, temperature, millis))
+        return layout, values
+
+    @staticmethod
+    def encode(request_id, command, luminary=None, switching=-1, rgb=None, luminance=None, temperature=None,
+               millis=0, data=None):
+        """
+        :param request_id(int): Request id stamped into the header
+        :param command: Command to be send. See Command.Command class to get more info
+        :param luminary: Addressed luminary, None for global commands
+        :return bytes: encoded packet including the length prefix
+        """
+        layout, values = PacketEncoder.__prepare(request_id, command, luminary, switching, rgb, luminance,
+                                                 temperature, millis, data)
+        return layout.pack(*values)
+
+    @staticmethod
+    def encode_into(buffer, offset, request_id, command, luminary=None, switching=-1, rgb=None, luminance=None,
+                    temperature=None, millis=0, data=None):
+        """
+        Encode a packet straight into a caller-supplied writable buffer
+        :param buffer: bytearray, memoryview or any other writable buffer
+        :param offset(int): Position in buffer the packet starts at
+        :return int: number of bytes written
+        """
+        layout, values = PacketEncoder.__prepare(request_id, command, luminary, switching, rgb, luminance,
+                                                 temperature, millis, data)
+        layout.pack_into(buffer, offset, *values)
+        return layout.size
@@ -0,0 +1,123 @@
+from lightifypy.DeviceType import DeviceType
+import logging
+import struct
+
+
+class PacketParser(object):
+    """
+    Decoders for replies of the Lightify gateway. Shared by all link implementations
+    """
+    CHARSET = "cp437"
+    STATUS_RECORD_SIZE = 50
+
+    @staticmethod
+    def clean_name(name):
+        clean_name = ''
+        for ch in name:
+            if ch != chr(0):
+                clean_name += ch
+            else:
+                break
+        return clean_name
+
+    @staticmethod
+    def packet_request_id(packet):
+        """
+        :param packet: Data built by PacketBuilder.PacketBuilder, including the length prefix
+        :return: integer of request id stamped into the header
+        """
+        (request_id,) = struct.unpack_from('<I', packet, 4)
+        return request_id
+
+    @staticmethod
+    def reply_request_id(buffer):
+        """
+        :param buffer: Data which was received from Lightify gateway, without the length prefix
+        :return: integer of request id the gateway echoed back
+        """
+        (request_id,) = struct.unpack_from('<I', buffer, 2)
+        return request_id
+
+    @staticmethod
+    def parse_header(packet, buffer, command):
+        """
+        :param packet: Data which was send to the Lightify gateway
+        :param buffer: Data which was received from Lightify gateway
+        :param command: Command which was sent. See Command.Command class to get more info
+        :return: integer of error code
+        """
+        status = buffer[0]
+        if status != 0x01 and status != 0x03:
+            logger = logging.getLogger('lightfypy')
+            logger.warning("Packet content, sent: {}, received: {}".format(packet.upper(), bytes(buffer).upper()))
+            logger.warning("Status code: 0x{:02x}, command: {}".format(status, command.name))
+        return buffer[6]
+
+    @staticmethod
+    def parse_zone_list(buffer):
+        """
+        :param buffer: ZONE_LIST reply
+        :return: list of (zone_id, name) tuples
+        """
+        (num,) = struct.unpack("<H", buffer[7:9])
+        zones = []
+        for i in range(0, num):
+            pos = 9 + i * 18
+            payload = buffer[pos:pos + 18]
+            (zone_id, name) = struct.unpack("<H16s", payload)
+            zones.append((zone_id, PacketParser.clean_name(name.decode(PacketParser.CHARSET))))
+        return zones
+
+    @staticmethod
+    def parse_zone_info(buffer):
+        """
+        :param buffer: ZONE_INFO reply
+        :return: tuple of (zone_id, name, list of member addresses)
+        """
+        payload = buffer[7:]
+        (zone_id, name, num) = struct.unpack("<H16sB", payload[:19])
+        name = PacketParser.clean_name(name.decode(PacketParser.CHARSET))
+        addresses = []
+        for i in range(0, num):
+            pos = 7 + 19 + i * 8
+            (addr,) = struct.unpack("<Q", buffer[pos:pos + 8])
+            addresses.append(addr)
+        return zone_id, name, addresses
+
+    @staticmethod
+    def parse_status_all(buffer):
+        """
+        :param buffer: STATUS_ALL reply
+        :return: list of (address, type_id, zone_id, powered, luminance, temperature, r, g, b, name) tuples
+        """
+        data = buffer[7:]
+        (num_of_lights,) = struct.unpack('<H', data[:2])
+        record_size = PacketParser.STATUS_RECORD_SIZE
+        records = []
+        for i in range(0, num_of_lights):
+            pos = 2 + i * record_size
+            payload = data[pos:pos + record_size]
+
+            (device_id, device_address, dev_type) = struct.unpack('<HQB', payload[:11])
+            (zone_id, status) = struct.unpack('<H?', payload[16:19])
+            (lum, temp, r, g, b, w) = struct.unpack('<BHBBBB', payload[19:26])
+            name = PacketParser.clean_name(bytes(payload[26:]).decode(PacketParser.CHARSET))
+            records.append((device_address, dev_type, zone_id, status, lum, temp, r, g, b, name))
+        return records
+
+    @staticmethod
+    def parse_status_single(buffer):
+        """
+        :param buffer: STATUS_SINGLE reply
+        :return: tuple of (powered, luminance, temperature, r, g, b)
+        """
+        (on, lum, temp, red, green, blue, h) = struct.unpack("<27x2BH4B16x", buffer)
+        return on, lum, temp, red, green, blue
+
+    @staticmethod
+    def parse_capabilities(dev_type):
+        """
+        :param dev_type: Type byte of device as reported in STATUS_ALL
+        :return Capability.Capability: flags looked up in DeviceType.TYPE_TABLE
+        """
+        return DeviceType.capabilities_of(dev_type)
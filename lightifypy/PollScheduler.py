@@ -0,0 +1,208 @@
+from lightifypy.CommandDispatcher import CommandDispatcher, Priority
+from lightifypy.DeviceType import DeviceType
+from lightifypy.Errors import LightifyException
+from lightifypy.LightifyZone import LightifyZone
+from lightifypy.RateLimiter import TokenBucket
+import heapq
+import itertools
+import logging
+import struct
+import threading
+import time
+
+
+class PollScheduler(object):
+    """
+    Status polling of all devices of a link within a request budget. Every device is due `interval` seconds after
+    its last poll, devices which were just commanded are due after `commanded_delay`. Due devices are polled with
+    STATUS_SINGLE, unless at least `sweep_threshold` of them are due at once, then one STATUS_ALL refreshes them all.
+    When the budget does not cover all due devices, the ones most recently commanded or seen changing go first
+    """
+    def __init__(self, link, interval=30.0, commanded_delay=1.0, sweep_threshold=8, budget=4.0,
+                 clock=time.monotonic):
+        """
+        :param link: LightifyLink.LightifyLink to poll
+        :param interval(float): Seconds between two polls of an untouched device
+        :param commanded_delay(float): Seconds after a command until its target is polled
+        :param sweep_threshold(int): Number of due devices from which one STATUS_ALL is sent instead
+        :param budget(float): Maximum gateway requests per second spent on polling
+        """
+        self.__link = link
+        self.__interval = interval
+        self.__commanded_delay = commanded_delay
+        self.__sweep_threshold = sweep_threshold
+        self.__bucket = TokenBucket(budget, clock=clock)
+        self.__clock = clock
+        self.__logger = logging.getLogger('lightfypy')
+        self.__lock = threading.Lock()
+        self.__heap = []
+        self.__due = {}
+        self.__last_polled = {}
+        # MAC address -> time the device was last commanded or seen changing
+        self.__active = {}
+        self.__order = itertools.count()
+        self.__thread = None
+        self.__stop = threading.Event()
+        self.__wakeup = threading.Event()
+        self.polls = 0
+        self.sweeps = 0
+        self.deferred = 0
+        self.errors = 0
+        self.sync()
+
+    def __schedule(self, mac, due):
+        self.__due[mac] = due
+        heapq.heappush(self.__heap, (due, next(self.__order), mac))
+
+    def sync(self):
+        """
+        Track devices which appeared since the last call and forget removed ones
+        """
+        devices = self.__link.get_registry().macs_of_type(DeviceType.Bulb)
+        now = self.__clock()
+        with self.__lock:
+            for mac in devices:
+                if mac not in self.__due:
+                    self.__schedule(mac, now + self.__interval)
+            for mac in list(self.__due):
+                if mac not in devices:
+                    del self.__due[mac]
+                    self.__last_polled.pop(mac, None)
+                    self.__active.pop(mac, None)
+
+    def commanded(self, target):
+        """
+        Poll target soon, it was just commanded
+        :param target: LightifyLight or LightifyZone
+        """
+        targets = target.get_lums() if isinstance(target, LightifyZone) else [target]
+        now = self.__clock()
+        due = now + self.__commanded_delay
+        with self.__lock:
+            for luminary in targets:
+                mac = struct.unpack('<Q', luminary.address())[0]
+                if mac in self.__due:
+                    self.__active[mac] = now
+                    if due < self.__due[mac]:
+                        self.__schedule(mac, due)
+        self.__wakeup.set()
+
+    def staleness(self, mac):
+        """
+        :return float: seconds since the device was last polled, None if it was never polled
+        """
+        polled = self.__last_polled.get(mac)
+        return None if polled is None else self.__clock() - polled
+
+    def __pop_due(self, now):
+        due = []
+        while self.__heap and self.__heap[0][0] <= now:
+            (at, order, mac) = heapq.heappop(self.__heap)
+            if self.__due.get(mac) == at:
+                due.append(mac)
+        return due
+
+    def __priority(self, mac):
+        """
+        Sort key of due devices: most recently active first, then the one polled longest ago
+        """
+        return -self.__active.get(mac, float('-inf')), self.__last_polled.get(mac, float('-inf'))
+
+    def __observed(self, macs, now):
+        for mac in macs:
+            if mac in self.__due:
+                self.__active[mac] = now
+
+    @staticmethod
+    def __state(device):
+        return device.is_powered(), device.get_luminance(), device.get_temperature(), device.get_rgb()
+
+    def __polled(self, macs, now):
+        for mac in macs:
+            if mac in self.__due:
+                self.__last_polled[mac] = now
+                self.__schedule(mac, now + self.__interval)
+
+    def tick(self):
+        """
+        Poll due devices as far as the budget allows
+        :return float: seconds until the next device is due
+        """
+        now = self.__clock()
+        with self.__lock:
+            due = self.__pop_due(now)
+            due.sort(key=self.__priority)
+        if len(due) >= self.__sweep_threshold and self.__bucket.try_acquire():
+            try:
+                diff = self.__link.refresh_status()
+                self.sweeps += 1
+                if diff.added or diff.removed:
+                    self.sync()
+                with self.__lock:
+                    self.__observed(diff.changed, self.__clock())
+                    self.__polled(list(self.__due), self.__clock())
+                due = []
+            except LightifyException as e:
+                self.errors += 1
+                self.__logger.warning("Polling sweep failed: {}".format(e))
+        registry = self.__link.get_registry()
+        # counted once, failing requests may take long enough to refill the bucket for the whole due set
+        allowed = int(self.__bucket.tokens())
+        for i, mac in enumerate(due):
+            if i >= allowed or not self.__bucket.try_acquire():
+                self.deferred += len(due) - i
+                with self.__lock:
+                    for rest in due[i:]:
+                        if rest in self.__due:
+                            self.__schedule(rest, now + self.__bucket.wait_time())
+                break
+            device = registry.device(mac)
+            if device is None:
+                continue
+            before = self.__state(device)
+            try:
+                self.__link.update_status(device)
+                self.polls += 1
+            except LightifyException as e:
+                self.errors += 1
+                self.__logger.warning("Polling of {} failed: {}".format(mac, e))
+            with self.__lock:
+                if self.__state(device) != before:
+                    self.__observed([mac], self.__clock())
+                self.__polled([mac], self.__clock())
+        with self.__lock:
+            if not self.__heap:
+                return self.__interval
+            return max(0.0, self.__heap[0][0] - self.__clock())
+
+    def __run(self):
+        while not self.__stop.is_set():
+            with CommandDispatcher.priority(Priority.BACKGROUND):
+                delay = self.tick()
+            self.__wakeup.wait(min(delay, self.__interval))
+            self.__wakeup.clear()
+
+    def start(self):
+        if self.__thread is None:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, name='lightifypy-poller', daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__wakeup.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self):
+        """
+        :return dict: counters of STATUS_SINGLE polls, STATUS_ALL sweeps, polls deferred by the budget and errors
+        """
+        return {
+            'tracked': len(self.__due),
+            'polls': self.polls,
+            'sweeps': self.sweeps,
+            'deferred': self.deferred,
+            'errors': self.errors,
+        }
@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate` per second up to `capacity`
+    """
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        """
+        :param rate(float): Tokens added per second
+        :param capacity(float): Maximum number of tokens, defaults to one second worth of tokens (at least 1)
+        :param clock: Callable returning monotonic seconds
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.__clock = clock
+        self.__tokens = self.capacity
+        self.__stamp = clock()
+        self.__lock = threading.Lock()
+
+    def __refill(self):
+        now = self.__clock()
+        self.__tokens = min(self.capacity, self.__tokens + (now - self.__stamp) * self.rate)
+        self.__stamp = now
+
+    def tokens(self):
+        with self.__lock:
+            self.__refill()
+            return self.__tokens
+
+    def try_acquire(self, count=1):
+        """
+        Take tokens if they are available
+        :return bool: True if the tokens were taken
+        """
+        with self.__lock:
+            self.__refill()
+            if self.__tokens >= count:
+                self.__tokens -= count
+                return True
+            return False
+
+    def wait_time(self, count=1):
+        """
+        :return float: seconds until `count` tokens are available
+        """
+        with self.__lock:
+            self.__refill()
+            missing = count - self.__tokens
+            return missing / self.rate if missing > 0 else 0.0
+
+    def acquire(self, count=1, timeout=None):
+        """
+        Block until tokens are available
+        :param timeout(float): Maximum seconds to wait, None waits forever
+        :return bool: True if the tokens were taken
+        """
+        deadline = None if timeout is None else self.__clock() + timeout
+        while True:
+            if self.try_acquire(count):
+                return True
+            delay = self.wait_time(count)
+            if deadline is not None:
+                remaining = deadline - self.__clock()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
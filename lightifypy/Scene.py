@@ -0,0 +1,186 @@
+from lightifypy.Command import Command
+from lightifypy.LightifyZone import LightifyZone
+from collections import OrderedDict
+import struct
+
+
+class Scene(object):
+    """
+    Declarative target state of luminaries and zones. Applying a scene only sends commands for values which differ
+    from the cached state. A zone whose members share a target gets one zone-addressed command, followed by unicasts
+    for the members which deviate from it
+    """
+    # order commands are sent in, switching off comes last as every other command switches the light on
+    COMMANDS = (Command.LIGHT_LUMINANCE, Command.LIGHT_TEMPERATURE, Command.LIGHT_COLOR, Command.LIGHT_SWITCH)
+
+    def __init__(self, millis=0):
+        """
+        :param millis(int): Transition time of luminance, temperature and color changes
+        """
+        self.millis = millis
+        self.__targets = OrderedDict()
+
+    def set(self, target, powered=None, luminance=None, temperature=None, rgb=None):
+        """
+        Add target state of a LightifyLight or LightifyZone. Zones stand for all their members, later calls override
+        earlier ones per light. Setting luminance, temperature or rgb implies powered. With powered False the other
+        values are ignored, they can not be set without switching the light on
+        :param rgb: tuple of (r, g, b)
+        :return Scene: self
+        """
+        state = self.__targets.setdefault(target, {})
+        for command, value in ((Command.LIGHT_SWITCH, powered), (Command.LIGHT_LUMINANCE, luminance),
+                               (Command.LIGHT_TEMPERATURE, temperature),
+                               (Command.LIGHT_COLOR, tuple(rgb) if rgb is not None else None)):
+            if value is not None:
+                state[command] = value
+        return self
+
+    def __len__(self):
+        return len(self.__targets)
+
+    def desired(self):
+        """
+        :return dict: mac -> (LightifyLight, dict of command -> value) of every light the scene covers
+        """
+        return self.__expand()[0]
+
+    def __expand(self):
+        """
+        :return: tuple of desired() and the number of set_* calls the scene stands for
+        """
+        lights = {}
+        for target, state in self.__targets.items():
+            members = target.get_lums() if isinstance(target, LightifyZone) else [target]
+            for light in members:
+                mac = struct.unpack('<Q', light.address())[0]
+                if mac not in lights:
+                    lights[mac] = (light, {})
+                lights[mac][1].update(state)
+        naive = 0
+        for mac, (light, state) in lights.items():
+            if state.get(Command.LIGHT_SWITCH, True):
+                naive += len(state)
+                state[Command.LIGHT_SWITCH] = True
+            else:
+                naive += 1
+                state.clear()
+                state[Command.LIGHT_SWITCH] = False
+        return lights, naive
+
+    def plan(self, zones):
+        """
+        Work out the smallest command set
+        :param zones: collection of LightifyZone.LightifyZone which may be addressed instead of their members
+        :return ScenePlan:
+        """
+        (desired, naive) = self.__expand()
+        members = [(zone, [struct.unpack('<Q', light.address())[0] for light in zone.get_lums()]) for zone in zones]
+        members = sorted([(zone, macs) for zone, macs in members if macs], key=lambda item: -len(item[1]))
+        operations = []
+        touched = set()
+        for command in self.COMMANDS:
+            needed = {}
+            for mac, (light, state) in desired.items():
+                if command not in state:
+                    continue
+                value = state[command]
+                if command == Command.LIGHT_SWITCH:
+                    if light.is_powered() != value and not (value and mac in touched):
+                        needed[mac] = value
+                elif self.__cached(light, command) != value:
+                    needed[mac] = value
+            for zone, macs in members:
+                values = [desired[mac][1].get(command) if mac in desired else None for mac in macs]
+                if None in values:
+                    continue
+                value = max(set(values), key=values.count)
+                outliers = [mac for mac in macs if desired[mac][1][command] != value]
+                # a zone is switched off with a luminance 0 in front of the switch, see LightifyLink.set_status
+                if command == Command.LIGHT_SWITCH and not value:
+                    if outliers:
+                        continue
+                    cost = 2
+                else:
+                    cost = 1 + len(outliers)
+                if cost < sum(1 for mac in macs if mac in needed):
+                    operations.append((zone, command, value))
+                    for mac in macs:
+                        needed.pop(mac, None)
+                        touched.add(mac)
+                    # the zone command overwrote the outliers, they get their own value afterwards
+                    for mac in outliers:
+                        needed[mac] = desired[mac][1][command]
+            for mac, value in needed.items():
+                operations.append((desired[mac][0], command, value))
+                touched.add(mac)
+        return ScenePlan(operations, naive, self.millis)
+
+    @staticmethod
+    def __cached(light, command):
+        if command == Command.LIGHT_LUMINANCE:
+            return light.get_luminance()
+        if command == Command.LIGHT_TEMPERATURE:
+            return light.get_temperature()
+        return tuple(light.get_rgb())
+
+
+class ScenePlan(object):
+    """
+    Commands a scene resolved to, in the order they are sent
+    """
+    def __init__(self, operations, naive, millis=0):
+        """
+        :param operations: list of (target, command, value) tuples
+        :param naive(int): Number of packets sending every value of the scene to every light would take
+        """
+        self.operations = operations
+        self.naive = naive
+        self.millis = millis
+
+    def packets(self):
+        """
+        :return int: number of packets the plan sends
+        """
+        return sum(2 if isinstance(target, LightifyZone) and command == Command.LIGHT_SWITCH and not value else 1
+                   for (target, command, value) in self.operations)
+
+    def saved(self):
+        return max(0, self.naive - self.packets())
+
+    def apply(self, link):
+        """
+        Send all commands in one batch
+        :return SceneReport:
+        """
+        batch = link.batch()
+        for (target, command, value) in self.operations:
+            if command == Command.LIGHT_SWITCH:
+                batch.set_status(target, value)
+            elif command == Command.LIGHT_LUMINANCE:
+                batch.set_luminance(target, self.millis, value)
+            elif command == Command.LIGHT_TEMPERATURE:
+                batch.set_temperature(target, value, self.millis)
+            else:
+                batch.set_rgb(target, value[0], value[1], value[2], self.millis)
+        sent = len(batch)
+        return SceneReport(self, batch.send(), sent)
+
+
+class SceneReport(object):
+    """
+    Outcome of an applied scene
+    """
+    def __init__(self, plan, batch_report, sent):
+        self.plan = plan
+        self.batch = batch_report
+        self.sent = sent
+        self.naive = plan.naive
+        self.saved = max(0, plan.naive - sent)
+
+    def ok(self):
+        return self.batch.ok()
+
+    def to_string(self):
+        return "SceneReport{{ sent={}, naive={}, saved={}, failed={} }}".format(
+            self.sent, self.naive, self.saved, len(self.batch.failed()))
@@ -0,0 +1,70 @@
+import threading
+
+
+class _Call(object):
+    """
+    One call in flight and the callers waiting for it
+    """
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """
+    Collapses concurrent calls for the same key into one: the first caller runs the function, callers arriving
+    while it runs wait for it and get the same result or exception. Nothing is cached once the call returned
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        :param key: Hashable identifying the work, e.g. command and target
+        :param fn: Callable without arguments
+        :return: result of fn, run by this or by a concurrent caller
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.__calls[key] = call
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """
+        :return int: number of keys with a call running
+        """
+        return len(self.__calls)
+
+    def stats(self):
+        """
+        :return dict: calls executed and calls which shared the result of another one
+        """
+        return {'executed': self.executed, 'shared': self.shared, 'in_flight': len(self.__calls)}
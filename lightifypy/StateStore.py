@@ -0,0 +1,203 @@
+from array import array
+import threading
+import time
+
+
+class ZoneAggregate(object):
+    """
+    Running aggregate of the members of one zone. Kept up to date by StateStore on every state change of a member,
+    so zone state is read in O(1)
+    """
+    __slots__ = ('members', 'powered', 'rgb_members', 'luminances', 'temperatures')
+
+    def __init__(self):
+        self.members = 0
+        self.powered = 0
+        self.rgb_members = 0
+        self.luminances = {}
+        self.temperatures = {}
+
+    @staticmethod
+    def _count(counts, value, delta):
+        count = counts.get(value, 0) + delta
+        if count:
+            counts[value] = count
+        else:
+            del counts[value]
+
+    def is_powered(self):
+        return self.powered == self.members
+
+    def get_luminance(self):
+        """
+        :return int: common luminance of all members, 100 if they differ, -1 for an empty zone
+        """
+        if not self.members:
+            return -1
+        if len(self.luminances) == 1:
+            for luminance in self.luminances:
+                return luminance
+        return 100
+
+    def get_temperature(self):
+        """
+        :return int: common temperature of all members, 2000 if they differ, -1 for an empty zone
+        """
+        if not self.members:
+            return -1
+        if len(self.temperatures) == 1:
+            for temperature in self.temperatures:
+                return temperature
+        return 2000
+
+
+class StateStore(object):
+    """
+    Array-backed state of luminaries. Every luminary owns one slot holding power, luminance, temperature and rgb,
+    the time.monotonic() its state was last confirmed by the gateway, and every slot knows the zone aggregates it
+    contributes to
+    """
+    __slots__ = ('powered', 'luminance', 'temperature', 'red', 'green', 'blue', 'rgb_set', 'rgb_capable',
+                 'confirmed', '__zones', '__free', '__lock')
+
+    def __init__(self):
+        self.powered = array('b')
+        self.luminance = array('H')
+        self.temperature = array('H')
+        self.red = array('B')
+        self.green = array('B')
+        self.blue = array('B')
+        self.rgb_set = array('b')
+        self.rgb_capable = array('b')
+        # 0.0 for state which was never confirmed
+        self.confirmed = array('d')
+        self.__zones = []
+        self.__free = []
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.powered) - len(self.__free)
+
+    def allocate(self, rgb_capable=False):
+        """
+        :param rgb_capable(bool): True if the luminary supports Capability.RGB
+        :return int: slot of a new luminary
+        """
+        with self.__lock:
+            if self.__free:
+                slot = self.__free.pop()
+                for column in (self.powered, self.luminance, self.temperature, self.red, self.green, self.blue,
+                               self.rgb_set):
+                    column[slot] = 0
+                self.rgb_capable[slot] = rgb_capable
+                self.confirmed[slot] = 0.0
+                self.__zones[slot] = None
+                return slot
+            for column in (self.powered, self.luminance, self.temperature, self.red, self.green, self.blue,
+                           self.rgb_set):
+                column.append(0)
+            self.rgb_capable.append(rgb_capable)
+            self.confirmed.append(0.0)
+            self.__zones.append(None)
+            return len(self.powered) - 1
+
+    def release(self, slot):
+        """
+        Free slot of a discarded luminary and remove it from all zone aggregates
+        """
+        with self.__lock:
+            for aggregate in self.__zones[slot] or ():
+                self.__remove(aggregate, slot)
+            self.__zones[slot] = None
+            self.__free.append(slot)
+
+    def join(self, slot, aggregate):
+        """
+        Account luminary of slot in a zone aggregate
+        """
+        with self.__lock:
+            if self.__zones[slot] is None:
+                self.__zones[slot] = []
+            self.__zones[slot].append(aggregate)
+            aggregate.members += 1
+            aggregate.powered += self.powered[slot]
+            aggregate.rgb_members += self.rgb_capable[slot]
+            ZoneAggregate._count(aggregate.luminances, self.luminance[slot], 1)
+            ZoneAggregate._count(aggregate.temperatures, self.temperature[slot], 1)
+
+    def leave(self, slot, aggregate):
+        """
+        Remove luminary of slot from a zone aggregate
+        """
+        with self.__lock:
+            zones = self.__zones[slot]
+            if zones and aggregate in zones:
+                zones.remove(aggregate)
+                self.__remove(aggregate, slot)
+
+    def __remove(self, aggregate, slot):
+        aggregate.members -= 1
+        aggregate.powered -= self.powered[slot]
+        aggregate.rgb_members -= self.rgb_capable[slot]
+        ZoneAggregate._count(aggregate.luminances, self.luminance[slot], -1)
+        ZoneAggregate._count(aggregate.temperatures, self.temperature[slot], -1)
+
+    def set_powered(self, slot, powered):
+        powered = 1 if powered else 0
+        with self.__lock:
+            delta = powered - self.powered[slot]
+            if delta:
+                self.powered[slot] = powered
+                for aggregate in self.__zones[slot] or ():
+                    aggregate.powered += delta
+
+    def set_luminance(self, slot, luminance):
+        with self.__lock:
+            old = self.luminance[slot]
+            if old != luminance:
+                self.luminance[slot] = luminance
+                for aggregate in self.__zones[slot] or ():
+                    ZoneAggregate._count(aggregate.luminances, old, -1)
+                    ZoneAggregate._count(aggregate.luminances, luminance, 1)
+
+    def set_temperature(self, slot, temperature):
+        with self.__lock:
+            old = self.temperature[slot]
+            if old != temperature:
+                self.temperature[slot] = temperature
+                for aggregate in self.__zones[slot] or ():
+                    ZoneAggregate._count(aggregate.temperatures, old, -1)
+                    ZoneAggregate._count(aggregate.temperatures, temperature, 1)
+
+    def set_rgb(self, slot, r, g, b):
+        self.red[slot] = r
+        self.green[slot] = g
+        self.blue[slot] = b
+        self.rgb_set[slot] = 1
+
+    def confirm(self, slots, now=None):
+        """
+        Mark state of slots as just reported or accepted by the gateway
+        :param slots: iterable of slots
+        """
+        now = time.monotonic() if now is None else now
+        confirmed = self.confirmed
+        for slot in slots:
+            confirmed[slot] = now
+
+    def age(self, slot, now=None):
+        """
+        :return float: seconds since state of slot was confirmed, infinity if it never was
+        """
+        confirmed = self.confirmed[slot]
+        if not confirmed:
+            return float('inf')
+        return (time.monotonic() if now is None else now) - confirmed
+
+    def get_rgb(self, slot):
+        """
+        :return: tuple of (r, g, b), None if rgb was never set
+        """
+        if not self.rgb_set[slot]:
+            return None
+        return self.red[slot], self.green[slot], self.blue[slot]
@@ -0,0 +1,87 @@
+from lightifypy.DeviceTable import DeviceTable
+from lightifypy.Errors import LightifyException
+from lightifypy.PacketParser import PacketParser
+import os
+import struct
+import time
+
+
+class TopologySnapshot(object):
+    """
+    Devices and zones of a gateway persisted to disk, so a link can start without running the discovery first.
+    The file holds a header, the devices encoded as STATUS_ALL reply and every zone encoded like a ZONE_INFO reply
+    """
+    MAGIC = b'LFYT'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBdI')
+    ZONE = struct.Struct('<H16sB')
+
+    def __init__(self, table, zones, saved_at=None):
+        """
+        :param table: DeviceTable.DeviceTable of all devices
+        :param zones: list of (zone_id, name, list of member addresses) tuples
+        :param saved_at(float): Epoch seconds the topology was discovered
+        """
+        self.table = table
+        self.zones = zones
+        self.saved_at = time.time() if saved_at is None else saved_at
+
+    def age(self):
+        """
+        :return float: seconds since the topology was discovered
+        """
+        return time.time() - self.saved_at
+
+    def to_bytes(self):
+        devices = self.table.to_status_all()
+        parts = [self.HEADER.pack(self.MAGIC, self.VERSION, self.saved_at, len(devices)), devices,
+                 struct.pack('<H', len(self.zones))]
+        for (zone_id, name, addresses) in self.zones:
+            parts.append(self.ZONE.pack(zone_id, name.encode(PacketParser.CHARSET, 'replace'), len(addresses)))
+            parts.append(struct.pack('<{}Q'.format(len(addresses)), *addresses))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        :raise LightifyException: if data is no snapshot of a supported version
+        """
+        try:
+            (magic, version, saved_at, size) = cls.HEADER.unpack_from(data)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise LightifyException('Not a topology snapshot of version {}'.format(cls.VERSION))
+            pos = cls.HEADER.size
+            table = DeviceTable.from_status_all(data[pos:pos + size])
+            pos += size
+            (num,) = struct.unpack_from('<H', data, pos)
+            pos += 2
+            zones = []
+            for i in range(num):
+                (zone_id, name, count) = cls.ZONE.unpack_from(data, pos)
+                pos += cls.ZONE.size
+                addresses = list(struct.unpack_from('<{}Q'.format(count), data, pos))
+                pos += 8 * count
+                zones.append((zone_id, PacketParser.clean_name(name.decode(PacketParser.CHARSET)), addresses))
+        except struct.error as e:
+            raise LightifyException('Truncated topology snapshot: {}'.format(e))
+        return cls(table, zones, saved_at)
+
+    def save(self, path):
+        """
+        Write the snapshot. The file is replaced atomically, readers never see a partial snapshot
+        """
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :return TopologySnapshot: None if there is no readable snapshot at path
+        """
+        try:
+            with open(path, 'rb') as f:
+                return cls.from_bytes(f.read())
+        except (IOError, OSError, LightifyException):
+            return None
@@ -0,0 +1,293 @@
+from lightifypy.Errors import ConnectionLost, LightifyException
+from lightifypy.FrameReader import FrameReader
+from lightifypy.PacketParser import PacketParser
+import logging
+import socket
+import struct
+import threading
+import time
+
+
+def copy_frame(frame):
+    """
+    Default decoder, detaches the frame from the receive buffer
+    :return bytes:
+    """
+    return bytes(frame)
+
+
+class SocketTransport(object):
+    """
+    Blocking transport with a single request in flight at a time. Replies are decoded while the lock is held, so
+    decoders work on a memoryview of the receive buffer without copying it
+    """
+    def __init__(self, address, port=4000):
+        """
+        :param address(str): IP Address of Lightify gateway
+        :param port(int): TCP port of Lightify gateway (default 4000)
+        """
+        self.__address = address
+        self.__port = port
+        self.__sock = None
+        self.__reader = None
+        self.__lock = threading.RLock()
+        # LinkMetrics.LinkMetrics getting the time spent waiting for the connection, None when disabled
+        self.metrics = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect((self.__address, self.__port))
+        except socket.error:
+            sock.close()
+            raise
+        self.__reader = FrameReader(sock)
+        self.__sock = sock
+
+    def close(self):
+        sock, self.__sock = self.__sock, None
+        if sock:
+            # wakes up a request blocked on the socket
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+
+    def __socket(self):
+        sock = self.__sock
+        if sock is None:
+            raise ConnectionLost('Not connected')
+        return sock
+
+    def stats(self):
+        """
+        :return dict: counters of the frame reader
+        """
+        return self.__reader.stats() if self.__reader else {}
+
+    def request(self, packet, decode=copy_frame):
+        """
+        Send packet and wait for its reply
+        :param packet: Bytes to be sent
+        :param decode: Callable turning the reply frame (memoryview) into the result
+        :return: result of decode
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        with self.__lock:
+            if metrics is not None:
+                metrics.waited(time.perf_counter() - start)
+            self.__socket().sendall(packet)
+            return decode(self.__reader.read_frame())
+
+    def request_many(self, packets, decode=copy_frame):
+        """
+        Write all packets with a single send and read one reply per packet
+        :param packets: list of bytes to be sent
+        :param decode: Callable turning a reply frame (memoryview) into a result
+        :return: list of results or LightifyException per packet, in the order of packets
+        """
+        replies = {}
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        with self.__lock:
+            if metrics is not None:
+                metrics.waited(time.perf_counter() - start)
+            self.__socket().sendall(b''.join(packets))
+            for i in range(len(packets)):
+                frame = self.__reader.read_frame()
+                request_id = PacketParser.reply_request_id(frame)
+                try:
+                    replies[request_id] = decode(frame)
+                except LightifyException as e:
+                    replies[request_id] = e
+        results = []
+        for packet in packets:
+            request_id = PacketParser.packet_request_id(packet)
+            results.append(replies.get(request_id, LightifyException('No reply for request id {}'.format(request_id))))
+        return results
+
+
+class _Pending(object):
+    """
+    Reply slot of one outstanding request
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.buffer = None
+        self.error = None
+
+
+class PipelinedTransport(object):
+    """
+    Transport keeping up to `window` requests outstanding on one connection. Replies are routed to their callers
+    by the request id echoed in the reply header, so they may arrive in any order. The reader thread copies every
+    frame once out of the receive buffer before handing it over
+    """
+    def __init__(self, address, port=4000, window=8, timeout=None):
+        """
+        :param address(str): IP Address of Lightify gateway
+        :param port(int): TCP port of Lightify gateway (default 4000)
+        :param window(int): Maximum number of requests in flight
+        :param timeout(float): Seconds to wait for a reply, None waits forever
+        """
+        self.__address = address
+        self.__port = port
+        self.__timeout = timeout
+        self.__sock = None
+        self.__reader = None
+        self.__thread = None
+        self.__window_size = window
+        self.__window = threading.BoundedSemaphore(window)
+        self.__send_lock = threading.Lock()
+        self.__batch_lock = threading.Lock()
+        self.__pending_lock = threading.Lock()
+        self.__pending = {}
+        self.__logger = logging.getLogger('lightfypy')
+        # LinkMetrics.LinkMetrics getting the time spent waiting for a window slot, None when disabled
+        self.metrics = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect((self.__address, self.__port))
+        except socket.error:
+            sock.close()
+            raise
+        self.__reader = FrameReader(sock)
+        self.__sock = sock
+        self.__thread = threading.Thread(target=self.__read_loop, name='lightifypy-reader', daemon=True)
+        self.__thread.start()
+
+    def close(self):
+        self.__shutdown(ConnectionLost('Connection closed'))
+
+    def __shutdown(self, error):
+        """
+        Close the socket and fail all requests waiting for a reply with error
+        """
+        sock, self.__sock = self.__sock, None
+        self.__reader = None
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+        self.__fail_all(error)
+
+    def __send(self, data):
+        sock = self.__sock
+        if sock is None:
+            raise ConnectionLost('Not connected')
+        with self.__send_lock:
+            sock.sendall(data)
+
+    def stats(self):
+        """
+        :return dict: counters of the frame reader
+        """
+        return self.__reader.stats() if self.__reader else {}
+
+    def in_flight(self):
+        """
+        :return int: number of requests waiting for a reply
+        """
+        return len(self.__pending)
+
+    def __read_loop(self):
+        reader = self.__reader
+        try:
+            while True:
+                frame = reader.read_frame()
+                request_id = PacketParser.reply_request_id(frame)
+                with self.__pending_lock:
+                    pending = self.__pending.pop(request_id, None)
+                if pending is None:
+                    self.__logger.warning("Dropping reply with unknown request id {}".format(request_id))
+                    continue
+                pending.buffer = bytes(frame)
+                pending.event.set()
+        except (socket.error, struct.error, LightifyException) as e:
+            # after a reconnect the requests waiting belong to the new connection
+            if self.__reader is reader:
+                self.__shutdown(ConnectionLost('Connection lost: {}'.format(e)))
+
+    def __fail_all(self, error):
+        with self.__pending_lock:
+            pending, self.__pending = self.__pending, {}
+        for slot in pending.values():
+            slot.error = error
+            slot.event.set()
+
+    def request(self, packet, decode=copy_frame):
+        """
+        Send packet and wait for the reply carrying the same request id
+        :param packet: Bytes to be sent
+        :param decode: Callable turning the reply frame into the result
+        :return: result of decode
+        """
+        request_id = PacketParser.packet_request_id(packet)
+        slot = _Pending()
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        with self.__window:
+            if metrics is not None:
+                metrics.waited(time.perf_counter() - start)
+            with self.__pending_lock:
+                self.__pending[request_id] = slot
+            try:
+                self.__send(packet)
+                if not slot.event.wait(self.__timeout):
+                    raise LightifyException('No reply for request id {}'.format(request_id))
+            finally:
+                with self.__pending_lock:
+                    self.__pending.pop(request_id, None)
+        if slot.error:
+            raise slot.error
+        return decode(slot.buffer)
+
+    def request_many(self, packets, decode=copy_frame):
+        """
+        Write packets in chunks of `window`, one send per chunk, and wait for all replies
+        :param packets: list of bytes to be sent
+        :param decode: Callable turning a reply frame into a result
+        :return: list of results or LightifyException per packet, in the order of packets
+        """
+        results = []
+        for start in range(0, len(packets), self.__window_size):
+            chunk = packets[start:start + self.__window_size]
+            slots = [(PacketParser.packet_request_id(packet), _Pending()) for packet in chunk]
+            metrics = self.metrics
+            if metrics is not None:
+                start = time.perf_counter()
+            with self.__batch_lock:
+                for i in range(len(chunk)):
+                    self.__window.acquire()
+            if metrics is not None:
+                metrics.waited(time.perf_counter() - start)
+            try:
+                with self.__pending_lock:
+                    self.__pending.update(slots)
+                self.__send(b''.join(chunk))
+                for request_id, slot in slots:
+                    if not slot.event.wait(self.__timeout):
+                        slot.error = LightifyException('No reply for request id {}'.format(request_id))
+                    if slot.error:
+                        results.append(slot.error)
+                        continue
+                    try:
+                        results.append(decode(slot.buffer))
+                    except LightifyException as e:
+                        results.append(e)
+            finally:
+                with self.__pending_lock:
+                    for request_id, slot in slots:
+                        self.__pending.pop(request_id, None)
+                for i in range(len(chunk)):
+                    self.__window.release()
+        return results
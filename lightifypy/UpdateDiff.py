@@ -0,0 +1,42 @@
+class UpdateDiff(object):
+    """
+    Changes found by LightifyLink.update() compared to the previous update
+    """
+    FIELDS = ('name', 'powered', 'luminance', 'temperature', 'rgb')
+
+    def __init__(self):
+        # MAC addresses of devices which appeared or disappeared
+        self.added = []
+        self.removed = []
+        # MAC address -> {field: (old, new)}
+        self.changed = {}
+        # zone uids of zones which appeared or disappeared
+        self.zones_added = []
+        self.zones_removed = []
+        # zone uid -> {'name': (old, new), 'members': (added MACs, removed MACs)}
+        self.zones_changed = {}
+
+    def merge(self, other):
+        """
+        Add the changes of other
+        :return UpdateDiff: self
+        """
+        self.added.extend(other.added)
+        self.removed.extend(other.removed)
+        self.changed.update(other.changed)
+        self.zones_added.extend(other.zones_added)
+        self.zones_removed.extend(other.zones_removed)
+        self.zones_changed.update(other.zones_changed)
+        return self
+
+    def is_empty(self):
+        return not (self.added or self.removed or self.changed or self.zones_added or self.zones_removed or
+                    self.zones_changed)
+
+    def __bool__(self):
+        return not self.is_empty()
+
+    def to_string(self):
+        return ("UpdateDiff{{ added={}, removed={}, changed={}, zones_added={}, zones_removed={}, "
+                "zones_changed={} }}").format(len(self.added), len(self.removed), len(self.changed),
+                                              len(self.zones_added), len(self.zones_removed), len(self.zones_changed))
@@ -0,0 +1,255 @@
+from lightifypy.Errors import LightifyException
+from lightifypy.PacketParser import PacketParser
+from lightifypy.Transport import copy_frame
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+class CaptureRecord(object):
+    """
+    One frame of a capture. data is a memoryview into the mapped file
+    """
+    __slots__ = ('direction', 'command', 'request_id', 'timestamp', 'data')
+
+    def __init__(self, direction, command, request_id, timestamp, data):
+        self.direction = direction
+        self.command = command
+        self.request_id = request_id
+        self.timestamp = timestamp
+        self.data = data
+
+    def to_string(self):
+        return "CaptureRecord{{ direction={}, command=0x{:02x}, request_id={}, timestamp={:.6f}, size={} }}".format(
+            self.direction, self.command, self.request_id, self.timestamp, len(self.data))
+
+
+class CaptureWriter(object):
+    """
+    Append-only capture of the frames a link sends and receives. The file starts with MAGIC and VERSION, followed
+    by one RECORD header plus the raw frame per packet: sent frames include the length prefix, received frames do
+    not. Captures of several sessions may be appended to the same file.
+
+    The writer is a wire hook, see LightifyLink.set_wire_hook(), and is usually installed with
+    LightifyLink.start_capture()
+    """
+    MAGIC = b'LFYC'
+    VERSION = 1
+    HEADER = struct.Struct('<4sB')
+    # direction, command id, request id, epoch seconds, frame size
+    RECORD = struct.Struct('<BBIdI')
+    SENT = 0
+    RECEIVED = 1
+
+    def __init__(self, path, buffering=65536):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__file = open(path, 'ab', buffering)
+        if self.__file.tell() == 0:
+            self.__file.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+        else:
+            with open(path, 'rb') as existing:
+                CaptureReader.check_header(existing.read(self.HEADER.size))
+        self.records = 0
+        self.bytes_written = 0
+
+    def __call__(self, direction, command, data):
+        if direction == 'sent':
+            (code, request_id) = (self.SENT, PacketParser.packet_request_id(data))
+        else:
+            (code, request_id) = (self.RECEIVED, PacketParser.reply_request_id(data))
+        header = self.RECORD.pack(code, command.get_id(), request_id, time.time(), len(data))
+        with self.__lock:
+            if self.__file is None:
+                return
+            self.__file.write(header)
+            self.__file.write(data)
+            self.records += 1
+            self.bytes_written += len(header) + len(data)
+
+    def flush(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.flush()
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+    def stats(self):
+        """
+        :return dict: path, records and bytes written
+        """
+        return {'path': self.path, 'records': self.records, 'bytes_written': self.bytes_written}
+
+
+class CaptureReader(object):
+    """
+    Memory mapped capture file. Records are read in place, the frames handed out are views of the mapping
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < CaptureWriter.HEADER.size:
+                raise LightifyException('{} is no capture file'.format(path))
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__view = memoryview(self.__map)
+        self.check_header(self.__view[:CaptureWriter.HEADER.size])
+
+    @staticmethod
+    def check_header(data):
+        """
+        :raise LightifyException: if data is not the header of a supported capture
+        """
+        try:
+            (magic, version) = CaptureWriter.HEADER.unpack_from(data)
+        except struct.error:
+            magic = version = None
+        if magic != CaptureWriter.MAGIC or version != CaptureWriter.VERSION:
+            raise LightifyException('Not a capture file of version {}'.format(CaptureWriter.VERSION))
+
+    def __iter__(self):
+        view = self.__view
+        record = CaptureWriter.RECORD
+        pos = CaptureWriter.HEADER.size
+        end = len(view)
+        while pos + record.size <= end:
+            (direction, command, request_id, timestamp, size) = record.unpack_from(view, pos)
+            pos += record.size
+            if pos + size > end:
+                # the last record was cut short, e.g. by a crash of the recording process
+                break
+            yield CaptureRecord(direction, command, request_id, timestamp, view[pos:pos + size])
+            pos += size
+
+    def exchanges(self):
+        """
+        Pair every sent frame with the first reply carrying its request id
+        :return list: (sent CaptureRecord, reply CaptureRecord or None) in the order the frames were sent
+        """
+        pairs = []
+        waiting = {}
+        for record in self:
+            if record.direction == CaptureWriter.SENT:
+                waiting[record.request_id] = len(pairs)
+                pairs.append([record, None])
+            else:
+                index = waiting.pop(record.request_id, None)
+                if index is not None:
+                    pairs[index][1] = record
+        return [tuple(pair) for pair in pairs]
+
+    def close(self):
+        """
+        Unmap the file. Records still referenced keep the mapping alive until they are gone
+        """
+        self.__view.release()
+        try:
+            self.__map.close()
+        except BufferError:
+            pass
+
+
+class ReplayTransport(object):
+    """
+    Transport answering requests from a capture instead of a gateway, so parsing and state updates of a link can be
+    run and benchmarked on recorded traffic:
+
+        link = LightifyLink(None, transport=ReplayTransport('site.cap'))
+
+    A request gets the recorded reply of the next unanswered exchange for the same command, looking at most
+    LOOKAHEAD exchanges ahead to allow for the reordering of concurrent requests. Replies are handed to the
+    decoders as views of the mapped file, they are only copied when the request id has to be rewritten
+    """
+    LOOKAHEAD = 64
+
+    def __init__(self, path, speed=None):
+        """
+        :param path(str): Capture written by CaptureWriter
+        :param speed(float): None replays as fast as possible, 1.0 keeps the recorded reply delays, 2.0 halves them
+        """
+        self.__reader = CaptureReader(path)
+        self.__exchanges = [pair for pair in self.__reader.exchanges() if pair[1] is not None]
+        self.__used = [False] * len(self.__exchanges)
+        self.__cursor = 0
+        self.__speed = speed
+        self.__lock = threading.RLock()
+        self.frames = 0
+        self.bytes_received = 0
+        self.rewritten = 0
+        # LinkMetrics.LinkMetrics getting the time spent waiting for the transport, None when disabled
+        self.metrics = None
+
+    def connect(self):
+        pass
+
+    def close(self):
+        """
+        Unmap the capture, frames handed out before become invalid
+        """
+        with self.__lock:
+            self.__exchanges = []
+            self.__used = []
+            self.__reader.close()
+
+    def stats(self):
+        """
+        :return dict: frames and bytes replayed, replies whose request id was rewritten and exchanges left
+        """
+        return {
+            'frames': self.frames,
+            'bytes_received': self.bytes_received,
+            'rewritten': self.rewritten,
+            'remaining': self.__used.count(False),
+        }
+
+    def __next_reply(self, packet):
+        command = packet[3]
+        exchanges = self.__exchanges
+        used = self.__used
+        while self.__cursor < len(used) and used[self.__cursor]:
+            self.__cursor += 1
+        for index in range(self.__cursor, min(len(used), self.__cursor + self.LOOKAHEAD)):
+            if not used[index] and exchanges[index][0].command == command:
+                used[index] = True
+                return exchanges[index]
+        raise LightifyException('Capture has no reply left for command 0x{:02x}'.format(command))
+
+    def __reply(self, packet):
+        (sent, reply) = self.__next_reply(packet)
+        if self.__speed:
+            time.sleep(max(0.0, reply.timestamp - sent.timestamp) / self.__speed)
+        frame = reply.data
+        request_id = PacketParser.packet_request_id(packet)
+        if reply.request_id != request_id:
+            frame = bytearray(frame)
+            struct.pack_into('<I', frame, 2, request_id)
+            frame = memoryview(frame)
+            self.rewritten += 1
+        self.frames += 1
+        self.bytes_received += len(frame)
+        return frame
+
+    def request(self, packet, decode=copy_frame):
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        with self.__lock:
+            if metrics is not None:
+                metrics.waited(time.perf_counter() - start)
+            return decode(self.__reply(packet))
+
+    def request_many(self, packets, decode=copy_frame):
+        results = []
+        with self.__lock:
+            for packet in packets:
+                try:
+                    results.append(decode(self.__reply(packet)))
+                except LightifyException as e:
+                    results.append(e)
+        return results
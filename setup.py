@@ -4,6 +4,13 @@ setup(
     version='0.0.6',
     packages=['lightifypy'],
     include_package_data=True,
+    python_requires='>=3.7',
+    entry_points={
+        'console_scripts': [
+            'lightify=lightifypy.CommandLine:main',
+            'lightify-bridge=lightifypy.LightifyBridge:main',
+        ],
+    },
     license='WTFPL',
     description='A library to work with OSRAM lightify.',
     long_description='A library to work with OSRAM lightify.',
@@ -14,8 +21,9 @@ setup(
         'Intended Audience :: Developers',
         'Operating System :: OS Independent',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
         'Topic :: Internet',
     ],
 )
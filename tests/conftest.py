@@ -0,0 +1,26 @@
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyLink import LightifyLink
+import pytest
+
+
+@pytest.fixture
+def simulator():
+    with GatewaySimulator(devices=12, zones=3, seed=1) as simulator:
+        yield simulator
+
+
+@pytest.fixture
+def connect(simulator):
+    """
+    Factory of links to the simulator, closed at the end of the test
+    """
+    links = []
+
+    def factory(window=1):
+        (host, port) = simulator.address
+        link = LightifyLink(host, port, window=window)
+        links.append(link)
+        return link
+    yield factory
+    for link in links:
+        link.close()
@@ -0,0 +1,74 @@
+from lightifypy.AsyncLightifyLink import AsyncLightifyLink
+from lightifypy.GatewaySimulator import GatewaySimulator
+import asyncio
+import pytest
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 5))
+
+
+def test_discovery(simulator):
+    async def scenario():
+        link = await AsyncLightifyLink.create(*simulator.address)
+        try:
+            return (sorted(light.get_name() for light in link.get_devices().values()),
+                    sorted(len(zone.get_lums()) for zone in link.get_zones().values()))
+        finally:
+            await link.close()
+    (names, members) = run(scenario())
+    assert names == sorted(device.name for device in simulator.devices)
+    assert members == [4, 4, 4]
+
+
+def test_concurrent_commands_reach_gateway(simulator):
+    async def scenario():
+        link = await AsyncLightifyLink.create(*simulator.address, window=4)
+        try:
+            devices = link.get_devices()
+            await asyncio.gather(*[link.set_luminance(devices[device.address], 0, 10 + i)
+                                   for i, device in enumerate(simulator.devices)])
+            light = devices[simulator.devices[0].address]
+            await link.set_rgb(light, 1, 2, 3, 0)
+            await link.set_temperature(light, 3000, 0)
+            await link.set_status(light, False)
+        finally:
+            await link.close()
+    run(scenario())
+    assert [device.luminance for device in simulator.devices] == [10 + i for i in range(len(simulator.devices))]
+    first = simulator.devices[0]
+    assert (first.r, first.g, first.b, first.temperature, first.powered) == (1, 2, 3, 3000, False)
+
+
+def test_update_status_reads_gateway_state(simulator):
+    async def scenario():
+        link = await AsyncLightifyLink.create(*simulator.address)
+        try:
+            light = link.get_devices()[simulator.devices[1].address]
+            simulator.devices[1].luminance = 7
+            await link.update_status(light)
+            return light.get_luminance()
+        finally:
+            await link.close()
+    assert run(scenario()) == 7
+
+
+@pytest.fixture
+def mixed():
+    """
+    Simulator whose first zone contains a plug, which is not a bulb
+    """
+    with GatewaySimulator(devices=8, zones=2, seed=1) as simulator:
+        simulator.devices[0].type_id = 16
+        yield simulator
+
+
+def test_non_bulb_zone_members_are_skipped(mixed):
+    async def scenario():
+        link = await AsyncLightifyLink.create(*mixed.address)
+        try:
+            return (len(link.get_devices()),
+                    sorted(len(zone.get_lums()) for zone in link.get_zones().values()))
+        finally:
+            await link.close()
+    assert run(scenario()) == (7, [3, 4])
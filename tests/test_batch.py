@@ -0,0 +1,54 @@
+from lightifypy.Command import Command
+import pytest
+
+
+@pytest.mark.parametrize('window', [1, 4])
+def test_batch_reaches_every_light(connect, simulator, window):
+    link = connect(window)
+    devices = link.get_devices()
+    with link.batch() as batch:
+        for i, device in enumerate(simulator.devices):
+            batch.set_luminance(devices[device.address], 0, 20 + i)
+        assert len(batch) == len(simulator.devices)
+    assert batch.report.ok()
+    assert len(batch.report) == len(simulator.devices)
+    assert [device.luminance for device in simulator.devices] == [20 + i for i in range(len(simulator.devices))]
+    assert [devices[device.address].get_luminance() for device in simulator.devices] == \
+        [20 + i for i in range(len(simulator.devices))]
+
+
+def test_failed_command_leaves_rest_of_batch(connect, simulator):
+    link = connect()
+    light = link.get_devices()[simulator.devices[0].address]
+    before = tuple(light.get_rgb())
+    simulator.set_error(Command.LIGHT_COLOR, 0x15)
+    batch = link.batch()
+    batch.set_rgb(light, 1, 2, 3, 0)
+    batch.set_luminance(light, 0, 44)
+    report = batch.send()
+    assert not report.ok()
+    assert [result.command for result in report.failed()] == [Command.LIGHT_COLOR]
+    assert [result.command for result in report.succeeded()] == [Command.LIGHT_LUMINANCE]
+    # local state only follows accepted commands
+    assert tuple(light.get_rgb()) == before
+    assert light.get_luminance() == 44
+    assert simulator.devices[0].luminance == 44
+
+
+def test_zone_off_dims_before_switching(connect, simulator):
+    link = connect()
+    zone = link.get_zones()['zone::1']
+    batch = link.batch().set_status(zone, False)
+    assert len(batch) == 2
+    assert batch.send().ok()
+    members = [device for device in simulator.devices if device.zone_id == 1]
+    assert members and all(not device.powered and device.luminance == 0 for device in members)
+    assert all(device.powered for device in simulator.devices if device.zone_id != 1)
+
+
+def test_empty_batch_sends_nothing(connect, simulator):
+    link = connect()
+    sent = sum(simulator.requests.values())
+    report = link.batch().send()
+    assert len(report) == 0 and report.ok()
+    assert sum(simulator.requests.values()) == sent
@@ -0,0 +1,114 @@
+from lightifypy.Command import Command
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyBridge import LightifyBridge
+import asyncio
+import json
+import pytest
+
+
+def exchange(simulator, lines, patch=None):
+    """
+    Send raw request lines to a bridge in front of simulator
+    :return dict: answers by id, answers without id under None in arrival order
+    """
+    async def scenario():
+        bridge = await LightifyBridge([simulator.address], port=0).start()
+        if patch is not None:
+            patch(bridge)
+        (reader, writer) = await asyncio.open_connection(*bridge.address)
+        try:
+            writer.write(b''.join(line if isinstance(line, bytes) else (json.dumps(line) + '\n').encode('utf-8')
+                                  for line in lines))
+            await writer.drain()
+            answers = {}
+            for line in lines:
+                answer = json.loads(await asyncio.wait_for(reader.readline(), 3))
+                answers.setdefault(answer['id'], []).append(answer)
+            return answers
+        finally:
+            writer.close()
+            await bridge.close()
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('request_', [
+    {'id': 1, 'op': 'refresh', 'target': 'Bulb 1', 'max_age': [1]},
+    {'id': 1, 'op': 'refresh', 'target': 'Bulb 1', 'max_age': True},
+    {'id': 1, 'op': 'devices', 'gateway': ['x']},
+    {'id': 1, 'op': 'devices', 'gateway': {'x': 1}},
+    {'id': 1, 'op': 'get', 'target': ['Bulb 1']},
+    {'id': 1, 'op': 'get'},
+    {'id': 1, 'op': 'get', 'target': 'No such bulb'},
+    {'id': 1, 'op': 'set', 'target': 'Bulb 1', 'action': {'a': 1}},
+    {'id': 1, 'op': 'set', 'target': 'Bulb 1', 'action': 'luminance', 'luminance': 'bright'},
+    {'id': 1, 'op': 'set', 'target': 'Bulb 1', 'action': 'rgb', 'rgb': [1]},
+    {'id': 1, 'op': 'set', 'target': 'Bulb 1', 'action': 'luminance', 'luminance': 300},
+    {'id': 1, 'op': 'set', 'target': 'Bulb 1', 'action': 'rgb', 'rgb': [0, 0, 256]},
+    {'id': 1, 'op': 'set', 'target': 'Bulb 1', 'action': 'temperature', 'temperature': 2700, 'millis': -5},
+    {'id': 1, 'op': 'dance', 'target': 'Bulb 1'},
+])
+def test_malformed_request_is_answered(simulator, request_):
+    answers = exchange(simulator, [request_])
+    (answer,) = answers[1]
+    assert answer['ok'] is False
+    assert answer['error'] and not answer['error'].startswith('internal error')
+
+
+def test_out_of_range_value_is_reported(simulator):
+    answers = exchange(simulator, [{'id': 2, 'op': 'set', 'target': 'Bulb 3', 'action': 'luminance',
+                                    'luminance': 300}])
+    assert 'luminance 300 out of range' in answers[2][0]['error']
+    assert simulator.requests[Command.LIGHT_LUMINANCE] == 0
+
+
+def test_undecodable_lines_are_answered(simulator):
+    answers = exchange(simulator, [b'not json\n', b'[1, 2]\n', {'id': 7, 'op': 'get', 'target': 'Bulb 1'}])
+    assert [answer['ok'] for answer in answers[None]] == [False, False]
+    assert answers[7][0]['ok'] is True
+    assert answers[7][0]['result']['name'] == 'Bulb 1'
+
+
+def test_valid_requests_still_work_next_to_bad_ones(simulator):
+    answers = exchange(simulator, [
+        {'id': 1, 'op': 'refresh', 'target': 'Bulb 2', 'max_age': 'soon'},
+        {'id': 2, 'op': 'refresh', 'target': 'Bulb 2', 'max_age': 5},
+        {'id': 3, 'op': 'set', 'target': 'Bulb 2', 'action': 'luminance', 'luminance': 12},
+    ])
+    assert answers[1][0]['ok'] is False
+    assert answers[2][0]['ok'] is True
+    assert answers[3][0]['result']['luminance'] == 12
+    assert next(device for device in simulator.devices if device.name == 'Bulb 2').luminance == 12
+
+
+def test_unexpected_exception_is_answered(simulator):
+    def patch(bridge):
+        async def broken(request, stats):
+            raise RuntimeError('boom')
+        bridge.handle = broken
+    answers = exchange(simulator, [{'id': 5, 'op': 'gateways'}], patch)
+    (answer,) = answers[5]
+    assert answer['ok'] is False
+    assert 'boom' in answer['error']
+
+
+def test_clients_share_identical_reads():
+    async def client(address, request_id):
+        (reader, writer) = await asyncio.open_connection(*address)
+        try:
+            writer.write((json.dumps({'id': request_id, 'op': 'refresh', 'target': 'Bulb 1'}) + '\n').encode('utf-8'))
+            return json.loads(await asyncio.wait_for(reader.readline(), 3))
+        finally:
+            writer.close()
+
+    async def scenario(simulator):
+        bridge = await LightifyBridge([simulator.address], port=0).start()
+        try:
+            answers = await asyncio.gather(*[client(bridge.address, i) for i in range(3)])
+            return answers, bridge.stats()
+        finally:
+            await bridge.close()
+    with GatewaySimulator(devices=4, zones=1, latency=0.2) as simulator:
+        (answers, stats) = asyncio.run(scenario(simulator))
+        assert all(answer['ok'] for answer in answers)
+        assert stats['merged'] == 2
+        assert simulator.requests[Command.STATUS_SINGLE] == 1
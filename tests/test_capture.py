@@ -0,0 +1,69 @@
+from lightifypy.Command import Command
+from lightifypy.Errors import LightifyException
+from lightifypy.LightifyLink import LightifyLink
+from lightifypy.WireCapture import CaptureReader, CaptureWriter, ReplayTransport
+import pytest
+
+
+def record(simulator, path):
+    """
+    Capture a discovery, a luminance change seen by update() and a command
+    """
+    link = LightifyLink(*simulator.address, capture=path)
+    simulator.devices[2].luminance = 44
+    link.update()
+    link.set_luminance(link.get_devices()[simulator.devices[3].address], 0, 9)
+    link.close()
+
+
+def test_capture_pairs_every_request_with_its_reply(simulator, tmp_path):
+    path = str(tmp_path / 'session.cap')
+    record(simulator, path)
+    reader = CaptureReader(path)
+    try:
+        exchanges = reader.exchanges()
+        assert all(reply is not None and reply.request_id == sent.request_id for sent, reply in exchanges)
+        assert [sent.command for sent, reply in exchanges].count(Command.STATUS_ALL.get_id()) == 2
+        assert exchanges[-1][0].command == Command.LIGHT_LUMINANCE.get_id()
+        assert len(list(reader)) == 2 * len(exchanges)
+    finally:
+        reader.close()
+
+
+def test_replay_reproduces_the_session(simulator, tmp_path):
+    path = str(tmp_path / 'session.cap')
+    record(simulator, path)
+    transport = ReplayTransport(path)
+    link = LightifyLink(None, transport=transport)
+    try:
+        assert sorted(link.get_devices()) == sorted(device.address for device in simulator.devices)
+        diff = link.update()
+        assert diff.changed == {simulator.devices[2].address: {'luminance': (100, 44)}}
+        link.set_luminance(link.get_devices()[simulator.devices[3].address], 0, 9)
+        assert transport.stats()['remaining'] == 0
+        with pytest.raises(LightifyException):
+            link.update()
+    finally:
+        link.close()
+
+
+def test_sessions_are_appended(simulator, tmp_path):
+    path = str(tmp_path / 'session.cap')
+    record(simulator, path)
+    first = len(CaptureReader(path).exchanges())
+    record(simulator, path)
+    assert len(CaptureReader(path).exchanges()) == 2 * first
+
+
+def test_truncated_capture_is_read_up_to_the_last_whole_record(simulator, tmp_path):
+    path = tmp_path / 'session.cap'
+    record(simulator, str(path))
+    data = path.read_bytes()
+    count = len(list(CaptureReader(str(path))))
+    path.write_bytes(data[:-3])
+    assert len(list(CaptureReader(str(path)))) == count - 1
+    path.write_bytes(b'nope')
+    with pytest.raises(LightifyException):
+        CaptureReader(str(path))
+    with pytest.raises(LightifyException):
+        CaptureWriter(str(path))
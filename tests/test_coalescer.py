@@ -0,0 +1,54 @@
+from lightifypy.Command import Command
+from lightifypy.CommandCoalescer import CommandCoalescer
+import time
+
+
+def test_last_write_wins(connect, simulator):
+    link = connect()
+    light = link.get_devices()[simulator.devices[0].address]
+    coalescer = link.enable_coalescing(rate=5, burst=1)
+    for luminance in range(1, 51):
+        link.set_luminance(light, 0, luminance)
+    assert coalescer.flush(5)
+    stats = coalescer.stats()
+    assert stats['submitted'] == 50 and stats['sent'] + stats['merged'] == 50
+    assert stats['sent'] <= 3 and stats['depth'] == 0
+    assert simulator.devices[0].luminance == 50
+
+
+def test_commands_are_rate_limited(connect, simulator):
+    link = connect()
+    devices = link.get_devices()
+    coalescer = link.enable_coalescing(rate=20, burst=1)
+    start = time.perf_counter()
+    for device in simulator.devices[:5]:
+        link.set_luminance(devices[device.address], 0, 7)
+    assert coalescer.flush(5)
+    assert time.perf_counter() - start >= 0.18
+    assert all(device.luminance == 7 for device in simulator.devices[:5])
+
+
+def test_close_without_flush_counts_dropped_commands():
+    coalescer = CommandCoalescer(rate=1, burst=1)
+    sent = []
+    for i in range(3):
+        coalescer.submit((0, i, Command.LIGHT_SWITCH), lambda i=i: sent.append(i))
+    coalescer.close(flush=False)
+    stats = coalescer.stats()
+    assert stats['dropped'] >= 2 and stats['dropped'] + stats['sent'] == 3
+    assert stats['depth'] == 0
+
+
+def test_unexpected_exception_does_not_stall_flush():
+    coalescer = CommandCoalescer(rate=100)
+    sent = []
+
+    def broken():
+        raise RuntimeError('boom')
+    coalescer.submit((0, 1, Command.LIGHT_SWITCH), broken)
+    coalescer.submit((0, 2, Command.LIGHT_SWITCH), lambda: sent.append(2))
+    assert coalescer.flush(2)
+    assert coalescer.stats()['errors'] == 1 and sent == [2]
+    coalescer.submit((0, 3, Command.LIGHT_SWITCH), lambda: sent.append(3))
+    coalescer.close()
+    assert sent == [2, 3]
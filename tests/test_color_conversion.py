@@ -0,0 +1,98 @@
+from lightifypy.Capability import Capability
+from lightifypy.ColorConversion import ColorConversion
+import pytest
+
+
+class Target(object):
+    """
+    Anything with capabilities, a luminary without a link
+    """
+    def __init__(self, capabilities):
+        self.capabilities = capabilities
+
+    def get_capabilities(self):
+        return self.capabilities
+
+
+RGB = Capability.RGB | Capability.TunableWhite
+
+
+def test_hsv_to_rgb():
+    assert ColorConversion.hsv_to_rgb([(0.0, 1.0, 1.0), (1 / 3.0, 1.0, 1.0), (2 / 3.0, 1.0, 1.0), (0.5, 0.0, 0.5)],
+                                      use_numpy=False) == [(255, 0, 0), (0, 255, 0), (0, 0, 255), (128, 128, 128)]
+    # hue wraps around, saturation and value are clipped
+    assert ColorConversion.hsv_to_rgb([(1.0, 2.0, 3.0), (-0.5, -1.0, 1.0)], use_numpy=False) == \
+        [(255, 0, 0), (255, 255, 255)]
+
+
+def test_xy_to_rgb():
+    (white, red, black) = ColorConversion.xy_to_rgb([(0.3127, 0.3290), (0.64, 0.33), (0.3, 0.0)], use_numpy=False)
+    assert min(white) >= 250
+    assert red[0] == 255 and max(red[1:]) <= 5
+    assert black == (0, 0, 0)
+
+
+def test_kelvin_and_rgb_to_kelvin():
+    (warm, cold) = ColorConversion.kelvin_to_rgb([2000, 6600], use_numpy=False)
+    assert warm[0] == 255 and warm[0] > warm[1] > warm[2]
+    assert cold == (255, 255, 255)
+    (white, black) = ColorConversion.rgb_to_kelvin([(255, 255, 255), (0, 0, 0)], use_numpy=False)
+    assert 6400 < white < 6600
+    assert black == 6500.0
+
+
+def test_temperature_range():
+    assert ColorConversion.temperature_range(RGB) == ColorConversion.RGB_TEMPERATURE_RANGE
+    assert ColorConversion.temperature_range(Capability.TunableWhite) == ColorConversion.TUNABLE_WHITE_RANGE
+    assert ColorConversion.temperature_range(Capability.PureWhite) is None
+
+
+def test_convert_follows_capabilities():
+    targets = [Target(RGB), Target(Capability.TunableWhite), Target(Capability.PureWhite)]
+    batch = ColorConversion.convert(targets, hsv=[(0.0, 1.0, 1.0), (0.0, 0.0, 1.0), (0.5, 1.0, 1.0)],
+                                    use_numpy=False)
+    assert len(batch) == 3
+    assert batch.skipped() == [targets[2]]
+    values = list(batch)
+    assert values[0] == (targets[0], 'rgb', (255, 0, 0))
+    assert values[1][:2] == (targets[1], 'temperature')
+    assert ColorConversion.TUNABLE_WHITE_RANGE[0] <= values[1][2] <= ColorConversion.TUNABLE_WHITE_RANGE[1]
+
+
+def test_temperatures_are_clamped_to_the_range_of_each_target():
+    targets = [Target(RGB), Target(Capability.TunableWhite), Target(Capability.RGB)]
+    batch = ColorConversion.convert(targets, kelvin=[1500, 1500, 2000], use_numpy=False)
+    assert [kind for target, kind, value in batch] == ['temperature', 'temperature', 'rgb']
+    assert [value for target, kind, value in batch][:2] == [2000, 2700]
+    assert list(batch)[2][2] == tuple(ColorConversion.kelvin_to_rgb([2000], use_numpy=False)[0])
+    batch = ColorConversion.convert(targets[:2], kelvin=[9000, 9000], use_numpy=False)
+    assert [value for target, kind, value in batch] == [6500, 6500]
+
+
+def test_convert_rejects_bad_arguments():
+    targets = [Target(RGB)]
+    with pytest.raises(ValueError):
+        ColorConversion.convert(targets, use_numpy=False)
+    with pytest.raises(ValueError):
+        ColorConversion.convert(targets, hsv=[(0, 0, 0)], kelvin=[2700], use_numpy=False)
+    with pytest.raises(ValueError):
+        ColorConversion.convert(targets, kelvin=[2700, 3000], use_numpy=False)
+
+
+def test_apply_through_a_batch(connect, simulator):
+    link = connect(window=4)
+    devices = link.get_devices()
+    targets = [devices[device.address] for device in simulator.devices]
+    hsv = [(2 / 3.0, 1.0, 1.0) if device.type_id == 10 else (0.0, 0.0, 1.0) for device in simulator.devices]
+    converted = ColorConversion.convert(targets, hsv=hsv, use_numpy=False)
+    with link.batch() as batch:
+        assert converted.apply(batch) == len(targets) - len(converted.skipped())
+    assert batch.report.ok()
+    for device in simulator.devices:
+        if device.type_id == 10:
+            assert (device.r, device.g, device.b) == (0, 0, 255)
+        elif device.type_id == 2:
+            assert device.temperature == ColorConversion.TUNABLE_WHITE_RANGE[1]
+        else:
+            assert (device.r, device.g, device.b, device.temperature) == (255, 255, 255, 2700)
+    assert converted.skipped() == [targets[i] for i, device in enumerate(simulator.devices) if device.type_id == 4]
@@ -0,0 +1,53 @@
+from lightifypy.Command import Command
+from lightifypy.DeviceTable import DeviceTable
+from lightifypy.LightifyLight import LightifyLight
+import struct
+
+
+def status_all(simulator):
+    """
+    STATUS_ALL reply of the simulator, without the length prefix
+    """
+    return simulator.handle(struct.pack('<BBIB', 0x00, Command.STATUS_ALL.get_id(), 1, 0x01))[2:]
+
+
+def test_decodes_every_record(simulator):
+    simulator.devices[3].luminance = 9
+    simulator.devices[3].powered = False
+    table = DeviceTable.from_status_all(status_all(simulator), use_numpy=False)
+    assert len(table) == len(simulator.devices)
+    assert table.names() == [device.name for device in simulator.devices]
+    d = simulator.devices[3]
+    assert table.row(3) == (d.address, d.type_id, d.zone_id, False, 9, d.temperature, d.r, d.g, d.b, d.name)
+    assert table.index_of(d.address) == 3
+    assert table.index_of(1) is None
+
+
+def test_select_by_type(simulator):
+    simulator.devices[0].type_id = 16
+    table = DeviceTable.from_status_all(status_all(simulator), use_numpy=False)
+    assert table.select([16]) == [0]
+    assert len(table.select([2, 4, 10])) == len(simulator.devices) - 1
+
+
+def test_empty_reply():
+    reply = struct.pack('<BBIBH', 0x01, Command.STATUS_ALL.get_id(), 1, 0, 0)
+    table = DeviceTable.from_status_all(reply, use_numpy=False)
+    assert len(table) == 0 and table.names() == []
+
+
+def test_encode_is_inverse_of_decode(simulator):
+    table = DeviceTable.from_status_all(status_all(simulator), use_numpy=False)
+    again = DeviceTable.from_status_all(table.to_status_all(), use_numpy=False)
+    assert [again.row(i) for i in range(len(again))] == [table.row(i) for i in range(len(table))]
+
+
+def test_link_creates_lights_on_demand(connect, simulator):
+    link = connect()
+    table = link.get_device_table()
+    assert len(table) == len(simulator.devices)
+    light = table.light(link, 5)
+    assert isinstance(light, LightifyLight)
+    assert light.get_name() == simulator.devices[5].name
+    assert light.get_luminance() == simulator.devices[5].luminance
+    assert set(link.get_devices()) == set(device.address for device in simulator.devices)
@@ -0,0 +1,40 @@
+from lightifypy.Capability import Capability
+from lightifypy.DeviceType import DeviceType, TYPE_TABLE
+from lightifypy.PacketParser import PacketParser
+import pytest
+
+
+@pytest.mark.parametrize('type_id,device_type,capabilities', [
+    (2, DeviceType.Bulb, Capability.TunableWhite),
+    (4, DeviceType.Bulb, Capability.PureWhite),
+    (10, DeviceType.Bulb, Capability.TunableWhite | Capability.RGB),
+    (16, DeviceType.PlugSocket, Capability.Switching),
+    (32, DeviceType.MotionSensor, Capability.MotionSensor),
+    (64, DeviceType.Switch, Capability(0)),
+    (65, DeviceType.Switch, Capability(0)),
+    (3, DeviceType.Unknown, Capability(0)),
+])
+def test_known_type_bytes(type_id, device_type, capabilities):
+    assert DeviceType.find_by_type_id(type_id) == device_type
+    assert DeviceType.capabilities_of(type_id) == capabilities
+    assert PacketParser.parse_capabilities(type_id) == capabilities
+
+
+def test_table_covers_every_byte():
+    assert len(TYPE_TABLE) == 256
+    for type_id, (device_type, capabilities) in enumerate(TYPE_TABLE):
+        assert (type_id in device_type.value) == (device_type != DeviceType.Unknown)
+
+
+@pytest.mark.parametrize('type_id', [-1, 256, 1000])
+def test_out_of_range_bytes_are_unknown(type_id):
+    assert DeviceType.find_by_type_id(type_id) == DeviceType.Unknown
+    assert DeviceType.capabilities_of(type_id) == Capability(0)
+
+
+def test_lights_get_capabilities_of_their_type(connect, simulator):
+    link = connect()
+    for device in simulator.devices:
+        light = link.get_devices()[device.address]
+        assert light.get_capabilities() == DeviceType.capabilities_of(device.type_id)
+        assert light.is_rgb() == (device.type_id == 10)
@@ -0,0 +1,58 @@
+from lightifypy.Command import Command
+from lightifypy.CommandDispatcher import CommandDispatcher, Priority
+from lightifypy.Errors import LightifyException
+from concurrent.futures import Future
+import pytest
+import threading
+
+
+def test_set_returns_future_resolved_by_reply(connect, simulator):
+    link = connect()
+    link.enable_dispatcher()
+    device = simulator.devices[0]
+    future = link.set_luminance(link.get_devices()[device.address], 0, 33)
+    assert isinstance(future, Future)
+    future.result(2)
+    assert device.luminance == 33
+
+
+def test_error_reply_fails_future(connect, simulator):
+    link = connect()
+    link.enable_dispatcher()
+    light = link.get_devices()[simulator.devices[0].address]
+    simulator.set_error(Command.LIGHT_LUMINANCE, 0x15)
+    future = link.set_luminance(light, 0, 33)
+    with pytest.raises(LightifyException):
+        future.result(2)
+    # the failure is confined to that request
+    simulator.set_error(Command.LIGHT_LUMINANCE, 0)
+    link.set_luminance(light, 0, 34).result(2)
+    assert simulator.devices[0].luminance == 34
+
+
+def test_dispatcher_runs_by_priority():
+    dispatcher = CommandDispatcher(workers=1)
+    gate = threading.Event()
+    order = []
+    try:
+        dispatcher.submit(gate.wait)
+        futures = [dispatcher.submit(lambda name=name: order.append(name), priority)
+                   for name, priority in (('poll', Priority.BACKGROUND), ('set', Priority.INTERACTIVE),
+                                          ('read', Priority.NORMAL))]
+        gate.set()
+        for future in futures:
+            future.result(2)
+    finally:
+        dispatcher.close()
+    assert order == ['set', 'read', 'poll']
+
+
+def test_dispatcher_propagates_exceptions():
+    dispatcher = CommandDispatcher(workers=1)
+    try:
+        def fail():
+            raise LightifyException('gateway said no')
+        with pytest.raises(LightifyException, match='gateway said no'):
+            dispatcher.submit(fail).result(2)
+    finally:
+        dispatcher.close()
@@ -0,0 +1,83 @@
+from lightifypy.Command import Command
+from lightifypy.EffectsEngine import Effect, EffectsEngine, Keyframe, TimerWheel
+import pytest
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_keyframe_interpolation():
+    start = Keyframe(0, (0, 0, 0), luminance=0)
+    end = Keyframe(2, (200, 100, 50), luminance=100, temperature=3000)
+    middle = start.interpolate(end, 0.5)
+    assert (middle.at, middle.rgb, middle.luminance, middle.temperature) == (1.0, (100, 50, 25), 50, 3000)
+
+
+def test_effect_segments():
+    effect = Effect([], [Keyframe(0, luminance=0), Keyframe(1, luminance=50), Keyframe(3, luminance=100)])
+    assert effect.duration == 3.0
+    (keyframe, remaining) = effect.segment(1.5)
+    assert keyframe.luminance == 100 and remaining == 1.5
+    assert effect.at(2.0).luminance == 75
+    assert effect.segment(3.5) is None
+    looped = Effect([], effect.keyframes, loop=True)
+    assert looped.segment(3.5)[0].luminance == 50
+    with pytest.raises(ValueError):
+        Effect([], [Keyframe(0)])
+
+
+def test_timer_wheel_expires_in_deadline_order():
+    wheel = TimerWheel(0.5, slots=4)
+    for at, item in ((3.2, 'c'), (0.7, 'a'), (9.0, 'd'), (1.0, 'b')):
+        wheel.schedule(at, item)
+    assert len(wheel) == 4
+    assert wheel.advance(0.4) == []
+    assert wheel.advance(1.0) == ['a', 'b']
+    assert wheel.advance(5.0) == ['c']
+    assert wheel.advance(9.0) == ['d']
+    assert len(wheel) == 0
+
+
+def test_fade_is_one_command_per_segment(connect, simulator):
+    clock = Clock()
+    link = connect()
+    light = link.get_devices()[simulator.devices[0].address]
+    engine = EffectsEngine(link, max_fps=10, clock=clock)
+    engine.play(Effect.fade([light], 2.0, 10, 90))
+    sent = simulator.requests[Command.LIGHT_LUMINANCE]
+    clock.now = 0.1
+    assert engine.tick() == 1
+    assert simulator.devices[0].luminance == 10
+    clock.now = 0.25
+    assert engine.tick() == 1
+    assert simulator.devices[0].luminance == 90
+    # nothing to send while the bulb runs the transition
+    for now in (0.5, 1.0, 1.5):
+        clock.now = now
+        assert engine.tick() == 0
+    clock.now = 2.5
+    assert engine.tick() == 0
+    assert simulator.requests[Command.LIGHT_LUMINANCE] == sent + 2
+    assert engine.stats()['tracks'] == 0 and engine.stats()['frames'] == 2
+
+
+def test_zone_and_stopped_effects(connect, simulator):
+    clock = Clock()
+    link = connect()
+    zone = link.get_zones()['zone::2']
+    light = link.get_devices()[simulator.devices[0].address]
+    engine = EffectsEngine(link, max_fps=10, clock=clock)
+    engine.play(Effect.color_loop([zone], 6.0))
+    engine.play(Effect.fade([light], 1.0, 0, 100)).stop()
+    clock.now = 0.1
+    assert engine.tick() == 1
+    assert all((device.r, device.g, device.b) == (255, 0, 0) for device in simulator.zones[2][1])
+    assert simulator.devices[0].luminance == 100
+    clock.now = 0.2
+    assert engine.tick() == 1
+    assert engine.stats()['tracks'] == 1
@@ -0,0 +1,69 @@
+from lightifypy.Errors import LightifyException
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyFleet import LightifyFleet
+import pytest
+import socket
+
+
+@pytest.fixture
+def gateways():
+    with GatewaySimulator(devices=6, zones=2, seed=1) as first, \
+            GatewaySimulator(devices=4, zones=1, seed=2, base_address=0x84182600000B0000) as second:
+        yield first, second
+
+
+def key(simulator):
+    return '{}:{}'.format(*simulator.address)
+
+
+def test_devices_of_all_gateways(gateways):
+    fleet = LightifyFleet([simulator.address for simulator in gateways])
+    try:
+        assert sorted(fleet.get_devices()) == sorted(device.address for simulator in gateways
+                                                     for device in simulator.devices)
+        assert sorted(fleet.get_zones()) == sorted(['{}/zone::1'.format(key(gateways[0])),
+                                                    '{}/zone::2'.format(key(gateways[0])),
+                                                    '{}/zone::1'.format(key(gateways[1]))])
+        health = fleet.health()
+        assert [health[key(simulator)]['devices'] for simulator in gateways] == [6, 4]
+        assert all(health[key(simulator)]['connected'] for simulator in gateways)
+    finally:
+        fleet.close()
+
+
+def test_commands_are_routed_to_the_owning_gateway(gateways):
+    (first, second) = gateways
+    fleet = LightifyFleet([simulator.address for simulator in gateways], window=2)
+    try:
+        light = fleet.get_device(second.devices[2].address)
+        assert fleet.gateway_of(light) == key(second)
+        fleet.set_luminance(light, 0, 12)
+        assert second.devices[2].luminance == 12
+        with fleet.batch() as batch:
+            for simulator in gateways:
+                for device in simulator.devices:
+                    batch.set_luminance(fleet.get_device(device.address), 0, 70)
+            batch.set_status(fleet.get_zones()['{}/zone::2'.format(key(first))], False)
+        assert sorted(batch.reports) == sorted(key(simulator) for simulator in gateways)
+        assert all(report.ok() for report in batch.reports.values())
+        assert all(device.luminance == 70 for device in second.devices)
+        assert [device.powered for device in first.devices] == [True, False] * 3
+        assert fleet.health()[key(second)]['commands'] == 2
+        with pytest.raises(LightifyException):
+            fleet.gateway_of(0x1234)
+    finally:
+        fleet.close()
+
+
+def test_unreachable_gateway_is_reported(gateways):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    unreachable = listener.getsockname()
+    listener.close()
+    fleet = LightifyFleet([gateways[0].address, unreachable])
+    try:
+        assert len(fleet.get_devices()) == 6
+        health = fleet.health()['{}:{}'.format(*unreachable)]
+        assert not health['connected'] and health['last_error']
+    finally:
+        fleet.close()
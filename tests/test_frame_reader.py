@@ -0,0 +1,57 @@
+from lightifypy.Errors import ConnectionLost
+from lightifypy.FrameReader import FrameReader
+import pytest
+import socket
+import struct
+
+
+def frame(payload):
+    return struct.pack('<H', len(payload)) + payload
+
+
+@pytest.fixture
+def pair():
+    (a, b) = socket.socketpair()
+    yield a, b
+    a.close()
+    b.close()
+
+
+class Trickle(object):
+    """
+    Socket handing out at most `step` bytes per recv_into, like a gateway sending in small TCP segments
+    """
+    def __init__(self, data, step=1):
+        self.data = data
+        self.step = step
+
+    def recv_into(self, view, size):
+        count = min(size, self.step, len(self.data))
+        view[:count] = self.data[:count]
+        self.data = self.data[count:]
+        return count
+
+
+def test_fragmented_frame_is_reassembled():
+    reader = FrameReader(Trickle(frame(bytes(range(200))) + frame(b'next'), step=3))
+    assert bytes(reader.read_frame()) == bytes(range(200))
+    assert bytes(reader.read_frame()) == b'next'
+    assert reader.partial_reads > 0
+    assert reader.frames == 2
+
+
+def test_coalesced_frames_are_split(pair):
+    (reader_end, writer_end) = pair
+    payloads = [b'a' * 10, b'', b'b' * 300, b'c']
+    writer_end.sendall(b''.join(frame(payload) for payload in payloads))
+    reader = FrameReader(reader_end, initial_size=16)
+    assert [bytes(reader.read_frame()) for payload in payloads] == payloads
+    assert reader.buffer_growths == 1
+
+
+def test_eof_raises_connection_lost(pair):
+    (reader_end, writer_end) = pair
+    writer_end.sendall(frame(b'abcdef')[:4])
+    writer_end.close()
+    with pytest.raises(ConnectionLost):
+        FrameReader(reader_end).read_frame()
@@ -0,0 +1,74 @@
+from lightifypy.Command import Command
+from lightifypy.Errors import LightifyException
+from lightifypy.LinkMetrics import Histogram, PrometheusExporter
+import pytest
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    for seconds in (0.0002, 0.0002, 0.003, 20.0):
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.00025
+    assert histogram.quantile(0.75) == 0.005
+    assert histogram.quantile(1.0) == float('inf')
+    assert histogram.snapshot()['count'] == 4
+
+
+def test_requests_are_counted_per_command(connect, simulator):
+    link = connect()
+    light = link.get_devices()[simulator.devices[0].address]
+    metrics = link.enable_metrics()
+    calls = []
+    metrics.add_hook(lambda command, seconds, error: calls.append((command, error)))
+    link.set_luminance(light, 0, 20)
+    link.set_luminance(light, 0, 30)
+    simulator.set_error(Command.LIGHT_COLOR, 0x15)
+    with pytest.raises(LightifyException):
+        link.set_rgb(light, 1, 2, 3, 0)
+    snapshot = metrics.snapshot()
+    assert snapshot['requests']['LIGHT_LUMINANCE'] == 2
+    assert snapshot['latency']['LIGHT_LUMINANCE']['count'] == 2
+    assert snapshot['errors'] == dict((command.name, 1 if command == Command.LIGHT_COLOR else 0)
+                                      for command in Command)
+    assert snapshot['error_codes'] == {0x15: 1}
+    assert snapshot['bytes_sent'] > 0 and snapshot['bytes_received'] > 0
+    assert snapshot['in_flight'] == 0
+    assert calls == [(Command.LIGHT_LUMINANCE, 0), (Command.LIGHT_LUMINANCE, 0), (Command.LIGHT_COLOR, 0x15)]
+
+
+def test_batch_is_counted(connect, simulator):
+    link = connect(window=4)
+    devices = link.get_devices()
+    metrics = link.enable_metrics()
+    with link.batch() as batch:
+        for device in simulator.devices:
+            batch.set_luminance(devices[device.address], 0, 5)
+    snapshot = metrics.snapshot()
+    assert snapshot['requests']['LIGHT_LUMINANCE'] == len(simulator.devices)
+    assert snapshot['batch_latency']['count'] == 1
+    assert snapshot['max_in_flight'] >= 1 and snapshot['in_flight'] == 0
+
+
+def test_prometheus_rendering(connect, simulator):
+    link = connect()
+    metrics = link.enable_metrics()
+    link.set_status(link.get_devices()[simulator.devices[0].address], False)
+    exporter = PrometheusExporter()
+    exporter.register(metrics, 'hall')
+    text = exporter.render()
+    assert 'lightify_requests_total{command="LIGHT_SWITCH",gateway="hall"} 1\n' in text
+    assert 'lightify_request_seconds_count{command="LIGHT_SWITCH",gateway="hall"} 1\n' in text
+
+
+def test_wire_hook_sees_both_directions(connect, simulator):
+    link = connect()
+    light = link.get_devices()[simulator.devices[0].address]
+    seen = []
+    link.set_wire_hook(lambda direction, command, data: seen.append((direction, command, bytes(data))))
+    link.set_luminance(light, 0, 20)
+    link.set_wire_hook(None)
+    link.set_luminance(light, 0, 30)
+    assert [(direction, command) for direction, command, data in seen] == \
+        [('sent', Command.LIGHT_LUMINANCE), ('received', Command.LIGHT_LUMINANCE)]
+    assert seen[0][2][3] == Command.LIGHT_LUMINANCE.get_id()
@@ -0,0 +1,76 @@
+from lightifypy.Command import Command
+from lightifypy.PacketBuilder import PacketBuilder
+from lightifypy.PacketEncoder import PacketEncoder
+import pytest
+import struct
+
+
+class Luminary(object):
+    type_flag = 0x00
+
+    def address(self):
+        return struct.pack('<Q', 0x84182600000A0001)
+
+
+class Link(object):
+    def __init__(self):
+        self.seq = 0
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+
+CASES = [
+    (Command.STATUS_ALL, lambda b: b.data(b'\x01')),
+    (Command.ZONE_LIST, lambda b: b),
+    (Command.STATUS_SINGLE, lambda b: b.with_(Luminary())),
+    (Command.LIGHT_SWITCH, lambda b: b.with_(Luminary()).switching(True)),
+    (Command.LIGHT_LUMINANCE, lambda b: b.with_(Luminary()).luminance(40).millis(300)),
+    (Command.LIGHT_TEMPERATURE, lambda b: b.with_(Luminary()).temperature(2700).millis(300)),
+    (Command.LIGHT_COLOR, lambda b: b.with_(Luminary()).rgb(255, 128, 0).millis(300)),
+]
+
+
+@pytest.mark.parametrize('command,configure', CASES)
+def test_build_matches_legacy_helpers(command, configure):
+    builder = configure(PacketBuilder(Link()).on(command))
+    packet = builder.build()
+    size = builder.calculate_packet_size()
+    assert struct.unpack_from('<H', packet)[0] == size
+    assert len(packet) == size + 2
+    builder.put_header(size, 1)
+    if command in (Command.STATUS_ALL, Command.ZONE_LIST):
+        builder.put_global()
+    else:
+        builder.put_addressable()
+    legacy = builder._PacketBuilder__buffer
+    assert packet[:len(legacy)] == legacy
+    assert packet[len(legacy):] == bytes(len(packet) - len(legacy))
+
+
+@pytest.mark.parametrize('command,configure', CASES)
+def test_build_into_writes_same_bytes(command, configure):
+    packet = configure(PacketBuilder(Link()).on(command)).build()
+    buffer = bytearray(100)
+    written = configure(PacketBuilder(Link()).on(command)).build_into(buffer, 7)
+    assert written == len(packet)
+    assert bytes(buffer[7:7 + written]) == packet
+    assert buffer[:7] == bytes(7) and buffer[7 + written:] == bytes(100 - 7 - written)
+
+
+def test_fields_of_color_packet():
+    packet = PacketEncoder.encode(0x01020304, Command.LIGHT_COLOR, Luminary(), rgb=(1, 2, 3), millis=500)
+    (size, flag, command_id, request_id, address, r, g, b, alpha, millis) = struct.unpack_from('<HBBIQ4BH', packet)
+    assert (flag, command_id, request_id) == (0x00, Command.LIGHT_COLOR.get_id(), 0x01020304)
+    assert (address, r, g, b, alpha, millis) == (0x84182600000A0001, 1, 2, 3, 0xff, 500)
+
+
+def test_layouts_are_cached():
+    first = PacketEncoder.layout(Command.LIGHT_SWITCH, True, 23)
+    assert PacketEncoder.layout(Command.LIGHT_SWITCH, True, 23) is first
+
+
+def test_out_of_range_value_is_rejected():
+    with pytest.raises(struct.error):
+        PacketEncoder.encode(1, Command.LIGHT_LUMINANCE, Luminary(), luminance=300)
@@ -0,0 +1,78 @@
+from lightifypy import CommandPipeline
+from lightifypy.CommandLine import main
+from lightifypy.CommandPipeline import PipelineCommand, PipelineSummary
+import io
+import json
+import pytest
+
+
+def jsonl(*records):
+    return io.StringIO(''.join(json.dumps(record) + '\n' for record in records))
+
+
+def test_parse_record():
+    command = CommandPipeline.parse_record({'target': 'Kitchen', 'action': 'rgb', 'rgb': '#ff8000', 'millis': 500})
+    assert (command.target, command.action, command.values) == ('Kitchen', 'rgb', ((255, 128, 0), 500))
+    command = CommandPipeline.parse_record({'target': 'zone::2', 'action': 'status', 'on': 'off'})
+    assert command.values == (False,)
+    command = CommandPipeline.parse_record({'target': 'x', 'action': 'rgb', 'r': 1, 'g': 2, 'b': '3'})
+    assert command.values == ((1, 2, 3), 0)
+
+
+@pytest.mark.parametrize('record', [
+    {'target': 'x', 'action': 'luminance', 'luminance': 300},
+    {'target': 'x', 'action': 'luminance', 'luminance': -1},
+    {'target': 'x', 'action': 'rgb', 'rgb': [256, 0, 0]},
+    {'target': 'x', 'action': 'rgb', 'rgb': [1, 2]},
+    {'target': 'x', 'action': 'rgb', 'r': 1, 'g': 2},
+    {'target': 'x', 'action': 'temperature', 'temperature': 70000},
+    {'target': 'x', 'action': 'luminance', 'luminance': 10, 'millis': 0x10000},
+    {'target': 'x', 'action': 'blink'},
+    {'action': 'status'},
+])
+def test_invalid_records_are_rejected(record):
+    with pytest.raises(ValueError):
+        CommandPipeline.parse_record(record)
+
+
+def test_run_skips_invalid_records(connect, simulator):
+    link = connect(window=4)
+    (first, second) = simulator.devices[:2]
+    summary = CommandPipeline.run(link, jsonl(
+        {'target': hex(first.address), 'action': 'luminance', 'luminance': 10},
+        {'target': hex(first.address), 'action': 'luminance', 'luminance': 300},
+        {'target': second.name, 'action': 'rgb', 'rgb': '#102030'},
+        {'target': hex(first.address), 'action': 'luminance', 'luminance': 20},
+        {'target': 'nowhere', 'action': 'status', 'on': False},
+        {'target': 'Zone 3', 'action': 'status', 'on': False},
+    ), batch_size=2)
+    assert (summary.read, summary.invalid, summary.unresolved, summary.coalesced) == (6, 1, 1, 1)
+    assert (summary.sent, summary.failed) == (3, 0)
+    assert first.luminance == 20
+    assert (second.r, second.g, second.b) == (0x10, 0x20, 0x30)
+    assert all(not device.powered for device in simulator.zones[3][1])
+
+
+def test_unencodable_command_does_not_drop_the_batch(connect, simulator):
+    link = connect()
+    devices = link.get_devices()
+    commands = []
+    for i, luminance in enumerate((10, 300, 30)):
+        command = PipelineCommand(i + 1, None, 'luminance', (luminance, 0))
+        command.luminary = devices[simulator.devices[i].address]
+        commands.append(command)
+    summary = PipelineSummary()
+    sent = list(CommandPipeline.send(commands, link, summary))
+    assert [command.error is None for command in sent] == [True, False, True]
+    assert (summary.sent, summary.failed, summary.batches) == (3, 1, 1)
+    assert [device.luminance for device in simulator.devices[:3]] == [10, 100, 30]
+
+
+def test_command_line(simulator, tmp_path, capsys):
+    path = tmp_path / 'commands.csv'
+    device = simulator.devices[4]
+    path.write_text('target,action,luminance\n{},luminance,55\n{},luminance,999\n'.format(device.name, device.name))
+    (host, port) = simulator.address
+    assert main([host, '--port', str(port), 'run', str(path)]) == 1
+    assert device.luminance == 55
+    assert 'read 2 commands, 1 invalid' in capsys.readouterr().out
@@ -0,0 +1,165 @@
+from lightifypy.AsyncLightifyLink import AsyncLightifyLink
+from lightifypy.Command import Command
+from lightifypy.Errors import LightifyException
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.PacketParser import PacketParser
+from lightifypy.Transport import PipelinedTransport
+import asyncio
+import pytest
+import socket
+import struct
+import threading
+import time
+
+
+def request(request_id, command=Command.ZONE_LIST):
+    return struct.pack('<HBBI', 6, 0x02, command.get_id(), request_id)
+
+
+class ReversingGateway(object):
+    """
+    Gateway holding back replies until `count` requests arrived, then answering them in reverse order
+    """
+    def __init__(self, count):
+        self.count = count
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.address = self.server.getsockname()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        (connection, peer) = self.server.accept()
+        request_ids = []
+        data = b''
+        while len(request_ids) < self.count:
+            data += connection.recv(4096)
+            while len(data) >= 2 and len(data) >= 2 + struct.unpack_from('<H', data)[0]:
+                size = struct.unpack_from('<H', data)[0]
+                request_ids.append(PacketParser.packet_request_id(data[:size + 2]))
+                data = data[size + 2:]
+        for request_id in reversed(request_ids):
+            frame = struct.pack('<BBIBI', 0x03, Command.ZONE_LIST.get_id(), request_id, 0, request_id)
+            connection.sendall(struct.pack('<H', len(frame)) + frame)
+        time.sleep(0.2)
+        connection.close()
+        self.server.close()
+
+
+def test_replies_are_matched_by_request_id():
+    gateway = ReversingGateway(4)
+    transport = PipelinedTransport(*gateway.address, window=4)
+    transport.connect()
+    try:
+        results = {}
+
+        def call(request_id):
+            results[request_id] = bytes(transport.request(request(request_id)))
+        threads = [threading.Thread(target=call, args=(request_id,)) for request_id in (11, 12, 13, 14)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(2)
+        assert sorted(results) == [11, 12, 13, 14]
+        for request_id, frame in results.items():
+            assert PacketParser.reply_request_id(frame) == request_id
+            assert struct.unpack_from('<I', frame, 7)[0] == request_id
+    finally:
+        transport.close()
+
+
+def test_request_many_keeps_order_of_packets():
+    gateway = ReversingGateway(3)
+    transport = PipelinedTransport(*gateway.address, window=3)
+    transport.connect()
+    try:
+        frames = transport.request_many([request(request_id) for request_id in (21, 22, 23)])
+        assert [PacketParser.reply_request_id(frame) for frame in frames] == [21, 22, 23]
+    finally:
+        transport.close()
+
+
+def test_pipelined_link_under_concurrent_callers(connect, simulator):
+    link = connect(window=4)
+    devices = link.get_devices()
+    for i, device in enumerate(simulator.devices):
+        device.luminance = i + 1
+    errors = []
+
+    def poll(device):
+        try:
+            for i in range(10):
+                link.update_status(devices[device.address])
+        except LightifyException as e:
+            errors.append(e)
+    threads = [threading.Thread(target=poll, args=(device,)) for device in simulator.devices]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert errors == []
+    assert [devices[device.address].get_luminance() for device in simulator.devices] == \
+        [i + 1 for i in range(len(simulator.devices))]
+
+
+def test_transport_timeout():
+    with GatewaySimulator(devices=2, zones=1, latency=0.5) as simulator:
+        transport = PipelinedTransport(*simulator.address, window=2, timeout=0.05)
+        transport.connect()
+        try:
+            with pytest.raises(LightifyException):
+                transport.request(request(5))
+        finally:
+            transport.close()
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 5))
+
+
+def test_async_link_fails_fast_after_drop(simulator):
+    async def scenario():
+        link = await AsyncLightifyLink.create(*simulator.address)
+        light = next(iter(link.get_devices().values()))
+        await link.set_luminance(light, 0, 30)
+        simulator.drop_connections()
+        await asyncio.sleep(0.1)
+        for attempt in range(2):
+            with pytest.raises(LightifyException):
+                await asyncio.wait_for(link.set_luminance(light, 0, 40), 2)
+        await link.close()
+        # a new connection picks up where the dropped one ended
+        link = await AsyncLightifyLink.create(*simulator.address)
+        light = next(iter(link.get_devices().values()))
+        await link.set_luminance(light, 0, 50)
+        await link.close()
+    run(scenario())
+    assert 50 in [device.luminance for device in simulator.devices]
+
+
+def test_async_close_fails_pending_requests():
+    async def scenario(simulator):
+        link = await AsyncLightifyLink.create(*simulator.address)
+        light = next(iter(link.get_devices().values()))
+        pending = asyncio.ensure_future(link.set_luminance(light, 0, 40))
+        await asyncio.sleep(0.05)
+        await link.close()
+        with pytest.raises(LightifyException):
+            await pending
+        with pytest.raises(LightifyException):
+            await link.set_luminance(light, 0, 40)
+    with GatewaySimulator(devices=4, zones=1, latency=0.3) as simulator:
+        run(scenario(simulator))
+
+
+def test_async_request_timeout():
+    async def scenario(simulator):
+        link = AsyncLightifyLink(*simulator.address, timeout=0.05)
+        start = time.perf_counter()
+        with pytest.raises(LightifyException):
+            await link.connect()
+        assert time.perf_counter() - start < 0.4
+        await link.close()
+    with GatewaySimulator(devices=4, zones=1, latency=0.5) as simulator:
+        run(scenario(simulator))
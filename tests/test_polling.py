@@ -0,0 +1,67 @@
+from lightifypy.Command import Command
+from lightifypy.PollScheduler import PollScheduler
+from lightifypy.RateLimiter import TokenBucket
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_up_to_capacity():
+    clock = Clock()
+    bucket = TokenBucket(2, capacity=3, clock=clock)
+    assert [bucket.try_acquire() for i in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == 0.5
+    clock.now = 10.0
+    assert bucket.tokens() == 3
+    assert bucket.try_acquire(3) and not bucket.try_acquire()
+
+
+def test_due_devices_are_swept_with_one_status_all(connect, simulator):
+    clock = Clock()
+    link = connect()
+    scheduler = PollScheduler(link, interval=10, sweep_threshold=8, budget=4, clock=clock)
+    sent = dict(simulator.requests)
+    clock.now = 10.0
+    assert scheduler.tick() == 10.0
+    assert simulator.requests[Command.STATUS_ALL] == sent[Command.STATUS_ALL] + 1
+    assert simulator.requests[Command.STATUS_SINGLE] == sent[Command.STATUS_SINGLE]
+    assert scheduler.stats()['sweeps'] == 1
+
+
+def test_commanded_device_is_polled_first(connect, simulator):
+    clock = Clock()
+    link = connect()
+    devices = link.get_devices()
+    scheduler = PollScheduler(link, interval=10, sweep_threshold=100, budget=1, clock=clock)
+    clock.now = 5.0
+    target = simulator.devices[7]
+    scheduler.commanded(devices[target.address])
+    clock.now = 10.0
+    scheduler.tick()
+    assert scheduler.stats()['polls'] == 1 and scheduler.stats()['deferred'] == 11
+    assert scheduler.staleness(target.address) == 0.0
+    assert [scheduler.staleness(device.address) for device in simulator.devices].count(None) == 11
+
+
+def test_failed_sweep_falls_back_within_budget(connect, simulator):
+    clock = Clock()
+    link = connect()
+    scheduler = PollScheduler(link, interval=10, sweep_threshold=12, budget=2, clock=clock)
+    changed = simulator.devices[4]
+    changed.luminance = 12
+    clock.now = 10.0
+    scheduler.tick()
+    assert scheduler.stats()['sweeps'] == 1
+    # the sweep saw device 4 change, so it leads the unicast fallback
+    simulator.set_error(Command.STATUS_ALL, 0x0B)
+    sent = simulator.requests[Command.STATUS_SINGLE]
+    clock.now = 20.0
+    scheduler.tick()
+    assert simulator.requests[Command.STATUS_SINGLE] == sent + 1
+    assert scheduler.stats()['errors'] == 1 and scheduler.stats()['deferred'] == 11
+    assert scheduler.staleness(changed.address) == 0.0
@@ -0,0 +1,68 @@
+from lightifypy.Command import Command
+from lightifypy.ConnectionManager import Backoff, ConnectionManager
+from lightifypy.Errors import ConnectionLost, LightifyException
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyLink import LightifyLink
+from lightifypy.Transport import SocketTransport
+import pytest
+import socket
+import struct
+import time
+
+
+def test_backoff_is_jittered_and_capped():
+    backoff = Backoff(initial=0.1, maximum=1.0, factor=2.0, rng=lambda: 1.0)
+    assert [backoff.next() for i in range(6)] == [0.1, 0.2, 0.4, 0.8, 1.0, 1.0]
+    backoff.reset()
+    assert backoff.next() == 0.1
+    assert Backoff(rng=lambda: 0.0).next() == 0.0
+
+
+@pytest.mark.parametrize('window', [1, 4])
+def test_link_reconnects_after_drop(connect, simulator, window):
+    link = connect(window)
+    devices = link.get_devices()
+    for round in range(3):
+        device = simulator.devices[round]
+        simulator.drop_connections()
+        link.set_luminance(devices[device.address], 0, 10 + round)
+        assert device.luminance == 10 + round
+    assert link.get_transport_stats()['reconnects'] >= 1
+    # reads are retried on the new connection as well
+    simulator.drop_connections()
+    assert link.update().is_empty()
+
+
+def test_unreachable_gateway_raises():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    server.close()
+    with pytest.raises((LightifyException, socket.error)):
+        LightifyLink('127.0.0.1', port)
+
+
+def test_keepalive_notices_a_dropped_connection(connect, simulator):
+    link = connect()
+    link.start_keepalive(interval=0.05, timeout=1.0)
+    simulator.drop_connections()
+    deadline = time.monotonic() + 3
+    while link.get_transport_stats()['reconnects'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    link.stop_keepalive()
+    stats = link.get_transport_stats()
+    assert stats['reconnects'] >= 1 and stats['probes'] >= 1
+
+
+def test_gateway_gone_for_good():
+    simulator = GatewaySimulator(devices=2, zones=1)
+    simulator.start()
+    manager = ConnectionManager(SocketTransport(*simulator.address), Backoff(rng=lambda: 0.0), max_attempts=3)
+    manager.connect()
+    packet = struct.pack('<HBBI', 6, 0x02, Command.ZONE_LIST.get_id(), 1)
+    manager.request(packet)
+    simulator.stop()
+    with pytest.raises(ConnectionLost):
+        manager.request(packet)
+    assert manager.stats()['failed_reconnects'] == 3
+    manager.close()
@@ -0,0 +1,69 @@
+from lightifypy.Capability import Capability
+from lightifypy.DeviceType import DeviceType
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyLink import LightifyLink
+import pytest
+import struct
+
+
+@pytest.fixture
+def link():
+    """
+    Link to 12 bulbs in 3 zones, with a plug as device 0 and a motion sensor as device 1
+    """
+    with GatewaySimulator(devices=12, zones=3, seed=1) as simulator:
+        simulator.devices[0].type_id = 16
+        simulator.devices[1].type_id = 32
+        link = LightifyLink(*simulator.address)
+        link.simulator = simulator
+        yield link
+        link.close()
+
+
+def macs(devices):
+    """
+    MAC addresses of simulated devices or of lights
+    """
+    return set(device.address if isinstance(device.address, int) else struct.unpack('<Q', device.address())[0]
+               for device in devices)
+
+
+def test_every_device_is_indexed(link):
+    simulator = link.simulator
+    (plug, sensor) = simulator.devices[:2]
+    registry = link.get_registry()
+    assert len(registry) == 12
+    assert link.query().type(DeviceType.PlugSocket).macs() == {plug.address}
+    assert link.query().capability(Capability.Switching).macs() == {plug.address}
+    assert link.query().type(DeviceType.MotionSensor).macs() == {sensor.address}
+    assert registry.device(plug.address) is None
+    assert registry.macs_named(plug.name) == {plug.address}
+    assert registry.by_name(plug.name) == []
+    assert len(link.query().devices()) == 10
+
+
+def test_queries_combine_indexes_and_filters(link):
+    simulator = link.simulator
+    rgb = [device for device in simulator.devices if device.type_id == 10]
+    assert link.query().capability(Capability.RGB).macs() == macs(rgb)
+    in_zone = [device for device in rgb if device.zone_id == 3]
+    assert macs(link.query().zone('Zone 3').capability(Capability.RGB)) == macs(in_zone)
+    link.set_status(link.get_registry().device(in_zone[0].address), False)
+    assert macs(link.query().zone('zone::3').capability(Capability.RGB).powered(True)) == macs(in_zone[1:])
+    assert link.query().zone('Zone 3').capability(Capability.RGB).powered(False).count() == 1
+    light = link.get_registry().device(in_zone[0].address)
+    assert [zone.get_zone_id() for zone in link.get_registry().zones_of(light)] == [3]
+
+
+def test_removed_devices_leave_the_registry(link):
+    simulator = link.simulator
+    (plug, bulb) = (simulator.devices[0], simulator.devices[5])
+    registry = link.get_registry()
+    simulator.remove_device(plug.address)
+    simulator.remove_device(bulb.address)
+    link.update()
+    assert len(registry) == 10
+    assert registry.device(bulb.address) is None
+    assert registry.device(0x1234) is None
+    assert not link.query().type(DeviceType.PlugSocket).macs()
+    assert bulb.address not in registry.macs_in('Zone {}'.format(bulb.zone_id))
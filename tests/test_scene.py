@@ -0,0 +1,63 @@
+from lightifypy.Command import Command
+import struct
+
+
+def mac_of(light):
+    return struct.unpack('<Q', light.address())[0]
+
+
+def zone(link, zone_id):
+    return link.get_zones()['zone::{}'.format(zone_id)]
+
+
+def test_unchanged_state_sends_nothing(connect):
+    link = connect()
+    scene = link.scene()
+    for light in link.get_devices().values():
+        scene.set(light, luminance=light.get_luminance())
+    plan = link.plan_scene(scene)
+    assert plan.operations == []
+    assert plan.packets() == 0
+    assert plan.saved() == plan.naive
+
+
+def test_shared_target_is_one_zone_command(connect):
+    link = connect()
+    kitchen = zone(link, 1)
+    plan = link.plan_scene(link.scene().set(kitchen, luminance=20))
+    assert plan.operations == [(kitchen, Command.LIGHT_LUMINANCE, 20)]
+    assert plan.naive == len(kitchen.get_lums())
+
+
+def test_outlier_gets_unicast_after_zone_command(connect):
+    link = connect()
+    kitchen = zone(link, 1)
+    members = kitchen.get_lums()
+    outlier = members[0]
+    plan = link.plan_scene(link.scene().set(kitchen, luminance=20).set(outlier, luminance=70))
+    assert plan.operations == [(kitchen, Command.LIGHT_LUMINANCE, 20), (outlier, Command.LIGHT_LUMINANCE, 70)]
+
+
+def test_zone_off_takes_two_packets(connect):
+    link = connect()
+    kitchen = zone(link, 1)
+    plan = link.plan_scene(link.scene().set(kitchen, powered=False))
+    assert plan.operations == [(kitchen, Command.LIGHT_SWITCH, False)]
+    assert plan.packets() == 2
+
+
+def test_applied_scene_reaches_gateway(connect, simulator):
+    link = connect(window=4)
+    kitchen = zone(link, 1)
+    single = next(light for light in link.get_devices().values() if light not in kitchen.get_lums())
+    report = link.apply_scene(link.scene().set(kitchen, luminance=20).set(single, luminance=55))
+    assert report.ok()
+    assert report.sent == 2
+    members = set(mac_of(light) for light in kitchen.get_lums())
+    for device in simulator.devices:
+        if device.address in members:
+            assert device.luminance == 20
+        elif device.address == mac_of(single):
+            assert device.luminance == 55
+    # the cached state is current, applying again sends nothing
+    assert link.plan_scene(link.scene().set(kitchen, luminance=20)).operations == []
@@ -0,0 +1,66 @@
+from lightifypy.Command import Command
+from lightifypy.Errors import LightifyException
+from lightifypy.GatewaySimulator import GatewaySimulator, SimulatedDevice
+from lightifypy.LightifyLink import LightifyLink
+import pytest
+import time
+
+
+@pytest.mark.parametrize('window', [1, 4])
+def test_link_over_fragmented_replies(window):
+    with GatewaySimulator(devices=40, zones=4, fragment=3, seed=1) as simulator:
+        link = LightifyLink(*simulator.address, window=window)
+        try:
+            assert len(link.get_registry()) == 40
+            assert len(link.get_zones()) == 4
+            lights = list(link.get_devices().values())
+            with link.batch() as batch:
+                for light in lights:
+                    batch.set_luminance(light, 0, 42)
+            assert all(device.luminance == 42 for device in simulator.devices)
+            assert link.get_transport_stats()['partial_reads'] > 0
+        finally:
+            link.close()
+
+
+def test_replies_are_delayed_by_latency():
+    with GatewaySimulator(devices=2, zones=1, latency=0.1) as simulator:
+        link = LightifyLink(*simulator.address)
+        try:
+            light = next(iter(link.get_devices().values()))
+            start = time.perf_counter()
+            link.set_luminance(light, 0, 10)
+            assert time.perf_counter() - start >= 0.1
+        finally:
+            link.close()
+
+
+def test_errors_can_be_injected(connect, simulator):
+    link = connect()
+    light = link.get_devices()[simulator.devices[0].address]
+    simulator.set_error(Command.STATUS_SINGLE, 0x0B)
+    with pytest.raises(LightifyException):
+        link.update_status(light)
+    simulator.set_error(Command.STATUS_SINGLE, 0)
+    simulator.devices[0].luminance = 3
+    link.update_status(light)
+    assert light.get_luminance() == 3
+    assert simulator.requests[Command.STATUS_SINGLE] == 2
+
+
+def test_devices_join_and_leave(connect, simulator):
+    link = connect()
+    device = SimulatedDevice(50, 0x84182600000A0050, 10, 1, 'Paired')
+    simulator.add_device(device)
+    assert link.update().added == [device.address]
+    link.set_luminance(link.get_devices()[device.address], 0, 61)
+    assert device.luminance == 61
+    assert device in simulator.zones[1][1]
+    assert simulator.remove_device(device.address) is device
+    assert link.update().removed == [device.address]
+    assert device not in simulator.zones[1][1]
+
+
+def test_base_address():
+    with GatewaySimulator(devices=3, zones=1, base_address=0x1000) as simulator:
+        assert [device.address for device in simulator.devices] == [0x1000, 0x1001, 0x1002]
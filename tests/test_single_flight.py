@@ -0,0 +1,95 @@
+from lightifypy.Command import Command
+from lightifypy.Errors import LightifyException
+from lightifypy.GatewaySimulator import GatewaySimulator
+from lightifypy.LightifyLink import LightifyLink
+from lightifypy.SingleFlight import SingleFlight
+import pytest
+import threading
+import time
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return 'state'
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', work)))
+    leader.start()
+    started.wait(2)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('key', work))) for i in range(5)]
+    for thread in followers:
+        thread.start()
+    while flight.stats()['shared'] < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(2)
+    assert calls == [1]
+    assert results == ['state'] * 6
+    assert flight.stats() == {'executed': 1, 'shared': 5, 'in_flight': 0}
+
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+    with pytest.raises(LightifyException):
+        flight.do('key', lambda: (_ for _ in ()).throw(LightifyException('lost')))
+    assert flight.do('key', lambda: 1) == 1
+
+
+def test_fresh_state_is_served_locally(connect, simulator):
+    link = connect()
+    light = link.get_devices()[simulator.devices[0].address]
+    sent = simulator.requests[Command.STATUS_SINGLE]
+    link.update_status(light, max_age=60)
+    assert simulator.requests[Command.STATUS_SINGLE] == sent
+    assert link.get_state_age(light) < 60
+    link.update_status(light, max_age=0)
+    assert simulator.requests[Command.STATUS_SINGLE] == sent + 1
+    link.update_status(light)
+    assert simulator.requests[Command.STATUS_SINGLE] == sent + 2
+
+
+def test_accepted_command_confirms_state(connect, simulator):
+    link = connect()
+    zone = link.get_zones()['zone::1']
+    time.sleep(0.05)
+    assert link.get_state_age(zone) >= 0.05
+    link.set_luminance(zone, 0, 20)
+    assert link.get_state_age(zone) < 0.05
+    sent = simulator.requests[Command.STATUS_SINGLE]
+    link.update_status(zone, max_age=1)
+    assert simulator.requests[Command.STATUS_SINGLE] == sent
+
+
+def test_refresh_status_skips_recent_search(connect, simulator):
+    link = connect()
+    searches = simulator.requests[Command.STATUS_ALL]
+    assert not link.refresh_status(max_age=60)
+    assert simulator.requests[Command.STATUS_ALL] == searches
+    simulator.devices[1].luminance = 1
+    assert link.refresh_status().changed == {simulator.devices[1].address: {'luminance': (100, 1)}}
+    assert simulator.requests[Command.STATUS_ALL] == searches + 1
+
+
+def test_concurrent_refreshes_share_one_request():
+    with GatewaySimulator(devices=4, zones=1, latency=0.2) as simulator:
+        link = LightifyLink(*simulator.address, window=4)
+        try:
+            light = link.get_devices()[simulator.devices[0].address]
+            sent = simulator.requests[Command.STATUS_SINGLE]
+            threads = [threading.Thread(target=link.update_status, args=(light,)) for i in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(3)
+            assert simulator.requests[Command.STATUS_SINGLE] == sent + 1
+            assert link.get_flight_stats()['shared'] == 4
+        finally:
+            link.close()
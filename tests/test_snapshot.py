@@ -0,0 +1,62 @@
+from lightifypy.GatewaySimulator import SimulatedDevice
+from lightifypy.LightifyLink import LightifyLink
+from lightifypy.TopologySnapshot import TopologySnapshot
+
+
+def requests(simulator):
+    return sum(simulator.requests.values())
+
+
+def test_snapshot_round_trip(connect, simulator, tmp_path):
+    path = str(tmp_path / 'topology')
+    connect().save_snapshot(path)
+    snapshot = TopologySnapshot.load(path)
+    assert snapshot.table.names() == [device.name for device in simulator.devices]
+    assert sorted((zone_id, name, sorted(addresses)) for zone_id, name, addresses in snapshot.zones) == \
+        [(zone_id, name, sorted(device.address for device in members))
+         for zone_id, (name, members) in sorted(simulator.zones.items())]
+    assert snapshot.age() < 5
+
+
+def test_link_starts_from_snapshot_without_requests(simulator, tmp_path):
+    path = str(tmp_path / 'topology')
+    LightifyLink(*simulator.address, snapshot=path).close()
+    sent = requests(simulator)
+    link = LightifyLink(*simulator.address, snapshot=path, revalidate=False)
+    try:
+        assert requests(simulator) == sent
+        assert sorted(light.get_name() for light in link.get_devices().values()) == \
+            sorted(device.name for device in simulator.devices)
+        assert sorted(len(zone.get_lums()) for zone in link.get_zones().values()) == [4, 4, 4]
+        # the connection is opened by the first request
+        link.set_luminance(link.get_devices()[simulator.devices[0].address], 0, 17)
+        assert simulator.devices[0].luminance == 17
+    finally:
+        link.close()
+
+
+def test_revalidation_finds_changes(simulator, tmp_path):
+    path = str(tmp_path / 'topology')
+    LightifyLink(*simulator.address, snapshot=path).close()
+    device = SimulatedDevice(40, 0x84182600000A0040, 2, 1, 'Paired')
+    simulator.add_device(device)
+    link = LightifyLink(*simulator.address, snapshot=path)
+    try:
+        diff = link.wait_revalidated(5)
+        assert diff.added == [device.address]
+        assert device.address in link.get_devices()
+        assert len(TopologySnapshot.load(path).table) == len(simulator.devices)
+    finally:
+        link.close()
+
+
+def test_unreadable_snapshot_falls_back_to_discovery(simulator, tmp_path):
+    path = tmp_path / 'topology'
+    path.write_bytes(b'LFYT\x01garbage')
+    assert TopologySnapshot.load(str(path)) is None
+    link = LightifyLink(*simulator.address, snapshot=str(path), revalidate=False)
+    try:
+        assert len(link.get_devices()) == len(simulator.devices)
+        assert TopologySnapshot.load(str(path)) is not None
+    finally:
+        link.close()
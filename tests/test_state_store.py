@@ -0,0 +1,63 @@
+from lightifypy.StateStore import StateStore, ZoneAggregate
+
+
+def test_zone_aggregate_follows_members():
+    store = StateStore()
+    aggregate = ZoneAggregate()
+    (a, b) = (store.allocate(True), store.allocate(False))
+    for slot in (a, b):
+        store.set_powered(slot, True)
+        store.set_luminance(slot, 40)
+        store.join(slot, aggregate)
+    assert aggregate.is_powered() and aggregate.get_luminance() == 40 and aggregate.rgb_members == 1
+    store.set_luminance(b, 60)
+    assert aggregate.get_luminance() == 100
+    store.set_powered(a, False)
+    assert not aggregate.is_powered()
+    store.leave(a, aggregate)
+    assert aggregate.members == 1 and aggregate.is_powered() and aggregate.get_luminance() == 60
+
+
+def test_released_slot_is_reset_and_reused():
+    store = StateStore()
+    aggregate = ZoneAggregate()
+    slot = store.allocate(True)
+    store.set_luminance(slot, 80)
+    store.set_rgb(slot, 1, 2, 3)
+    store.confirm([slot])
+    store.join(slot, aggregate)
+    store.release(slot)
+    assert len(store) == 0 and aggregate.members == 0
+    assert store.allocate(False) == slot
+    assert store.luminance[slot] == 0 and store.get_rgb(slot) is None and store.age(slot) == float('inf')
+
+
+def test_link_releases_slots_of_removed_devices(connect, simulator):
+    link = connect()
+    store = link.get_state_store()
+    devices = link.get_devices()
+    assert len(store) == len(simulator.devices) + len(simulator.zones)
+    gone = simulator.devices.pop()
+    simulator.zones[gone.zone_id][1].remove(gone)
+    light = devices[gone.address]
+    slot = light.get_slot()
+    zone = link.get_zones()['zone::{}'.format(gone.zone_id)]
+    assert link.update().removed == [gone.address]
+    assert len(store) == len(simulator.devices) + len(simulator.zones)
+    assert light not in zone.get_lums()
+    assert len(zone.get_lums()) == len(simulator.zones[gone.zone_id][1])
+
+    simulator.devices.append(gone)
+    simulator.zones[gone.zone_id][1].append(gone)
+    link.update()
+    assert link.get_devices()[gone.address].get_slot() == slot
+    assert len(zone.get_lums()) == len(simulator.zones[gone.zone_id][1])
+
+
+def test_link_releases_slots_of_removed_zones(connect, simulator):
+    link = connect()
+    store = link.get_state_store()
+    link.get_devices()
+    del simulator.zones[3]
+    assert link.update().zones_removed == ['zone::3']
+    assert len(store) == len(simulator.devices) + len(simulator.zones)
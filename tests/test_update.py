@@ -0,0 +1,72 @@
+from lightifypy.Command import Command
+from lightifypy.GatewaySimulator import GatewaySimulator, SimulatedDevice
+from lightifypy.LightifyLink import LightifyLink
+import pytest
+
+
+def test_update_without_changes(connect, simulator):
+    link = connect()
+    devices = dict(link.get_devices())
+    zones = dict(link.get_zones())
+    infos = simulator.requests[Command.ZONE_INFO]
+    diff = link.update()
+    assert not diff
+    assert simulator.requests[Command.ZONE_INFO] == infos
+    assert all(link.get_devices()[mac] is light for mac, light in devices.items())
+    assert all(link.get_zones()[uid] is zone for uid, zone in zones.items())
+
+
+def test_changed_fields_are_reported(connect, simulator):
+    link = connect()
+    light = link.get_devices()[simulator.devices[2].address]
+    simulator.devices[2].luminance = 33
+    simulator.devices[2].powered = False
+    simulator.devices[5].name = 'Porch'
+    diff = link.update()
+    assert diff.changed == {
+        simulator.devices[2].address: {'powered': (True, False), 'luminance': (100, 33)},
+        simulator.devices[5].address: {'name': ('Bulb 5', 'Porch')},
+    }
+    assert light.get_luminance() == 33 and not light.is_powered()
+    assert link.get_devices()[simulator.devices[5].address].get_name() == 'Porch'
+
+
+def test_added_device_joins_its_zone(connect, simulator):
+    link = connect()
+    link.get_devices()
+    device = SimulatedDevice(99, 0x84182600000A0099, 10, 2, 'New')
+    simulator.devices.append(device)
+    simulator.zones[2][1].append(device)
+    diff = link.update()
+    assert diff.added == [device.address] and not diff.removed
+    assert diff.zones_changed == {'zone::2': {'members': ([device.address], [])}}
+    assert link.get_devices()[device.address] in link.get_zones()['zone::2'].get_lums()
+
+
+def test_renamed_zone(connect, simulator):
+    link = connect()
+    zone = link.get_zones()['zone::1']
+    simulator.zones[1][0] = 'Kitchen'
+    diff = link.update()
+    assert diff.zones_changed['zone::1']['name'] == ('Zone 1', 'Kitchen')
+    assert zone.get_name() == 'Kitchen'
+
+
+@pytest.fixture
+def mixed():
+    """
+    Simulator whose first zone contains a plug, which is not a bulb
+    """
+    with GatewaySimulator(devices=8, zones=2, seed=1) as simulator:
+        simulator.devices[0].type_id = 16
+        yield simulator
+
+
+def test_non_bulb_zone_members_are_skipped(mixed):
+    link = LightifyLink(*mixed.address)
+    try:
+        assert len(link.get_devices()) == 7
+        assert sorted(len(zone.get_lums()) for zone in link.get_zones().values()) == [3, 4]
+        assert not link.update()
+    finally:
+        link.close()